@@ -0,0 +1,187 @@
+# batch_fix.py
+"""
+여러 클라이언트 측위를 한 번에 처리하는 벡터화 연산 (server.py 틱 스케줄러용).
+
+클라이언트마다 Python 함수를 여러 번 부르는 대신, 모든 준비된 윈도우를 한 배열로 합쳐
+(클라이언트, 비콘) 그룹 통계 → Top3 선택 → 삼변측량 → 불확도 → 구역 판정 → 시작 노드를
+NumPy 연산 몇 번으로 끝낸다. 결과는 server.py의 단건 경로(pick_top3_adaptive,
+trilaterate_from_top3, classify_area(strict=False))와 같은 규칙을 따른다.
+"""
+import math
+from typing import Dict, List, Tuple
+import numpy as np
+
+from final import beacon_coords, FLOORS, RSSI_REF_1M, PATH_LOSS_DIV
+
+# 비콘 id → 좌표 조회표 (없는 id는 NaN)
+_BEACON_XY = np.full((max(beacon_coords) + 1, 2), np.nan)
+for _b, _xy in beacon_coords.items():
+    _BEACON_XY[_b] = _xy
+
+# ====== (클라이언트, 비콘) 그룹 강건 통계 ======
+def _group_median(vals: np.ndarray, starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """그룹 순서로 정렬된 vals에서 그룹별 중앙값 (같은 그룹 안은 오름차순이어야 함)"""
+    lo = starts + (counts - 1) // 2
+    hi = starts + counts // 2
+    return (vals[lo] + vals[hi]) / 2.0
+
+def robust_stats_batch(cid: np.ndarray, bid: np.ndarray, val: np.ndarray, hampel_k: float, std_floor: float):
+    """
+    robust_window_stats와 같은 Hampel 필터를 모든 (클라이언트, 비콘) 그룹에 한 번에 적용.
+    return: dict(cid, bid, median, mean, std, count) 각 (G,) 배열
+    """
+    nb = int(bid.max()) + 1 if len(bid) else 1
+    key = cid.astype(np.int64) * nb + bid
+    order = np.lexsort((val, key))
+    key, val = key[order], val[order].astype(float)
+    uk, starts, counts = np.unique(key, return_index=True, return_counts=True)
+    gidx = np.repeat(np.arange(len(uk)), counts)
+
+    med = _group_median(val, starts, counts)
+    dev = np.abs(val - med[gidx])
+    dev_sorted = dev[np.lexsort((dev, gidx))]
+    mad = np.maximum(_group_median(dev_sorted, starts, counts) * 1.4826, std_floor)
+    inl = dev <= hampel_k * mad[gidx]
+
+    n_in = np.bincount(gidx, weights=inl, minlength=len(uk))
+    s1 = np.bincount(gidx, weights=np.where(inl, val, 0.0), minlength=len(uk))
+    s2 = np.bincount(gidx, weights=np.where(inl, val * val, 0.0), minlength=len(uk))
+    mean = s1 / np.maximum(n_in, 1)
+    var = (s2 - n_in * mean * mean) / np.maximum(n_in - 1, 1)
+    std = np.where(n_in > 1, np.sqrt(np.maximum(var, 0.0)), 0.0)
+    return {
+        "cid": (uk // nb).astype(np.int64),
+        "bid": (uk % nb).astype(np.int64),
+        "median": med,
+        "mean": mean,
+        "std": np.maximum(std, std_floor),
+        "count": n_in.astype(np.int64),
+    }
+
+def select_top3_batch(stats: dict, n_clients: int, min_samples: int):
+    """
+    클라이언트별로 count >= min_samples 인 비콘 중 mean 상위 3개.
+    return: (ok (N,), 그룹 인덱스 (N, 3)) — ok가 False면 인덱스 무의미
+    """
+    ok_g = stats["count"] >= min_samples
+    g = np.nonzero(ok_g)[0]
+    order = g[np.lexsort((-stats["mean"][g], stats["cid"][g]))]
+    c = stats["cid"][order]
+    # 클라이언트 내 순위
+    first = np.searchsorted(c, c, side="left")
+    rank = np.arange(len(c)) - first
+    sel = rank < 3
+    idx = np.full((n_clients, 3), -1, dtype=np.int64)
+    idx[c[sel], rank[sel]] = order[sel]
+    return (idx >= 0).all(axis=1), idx
+
+# ====== 삼변측량 / 불확도 ======
+def rssi_to_distance_np(rssi: np.ndarray) -> np.ndarray:
+    return 10 ** ((RSSI_REF_1M - rssi) / PATH_LOSS_DIV)
+
+def beacon_xy(bids: np.ndarray) -> np.ndarray:
+    return _BEACON_XY[bids]
+
+def trilaterate_batch(xy: np.ndarray, d: np.ndarray):
+    """
+    Trilateration 'direct'와 같은 식을 (N, 3) 배치로. 세 원이 서로 교차 가능한 경우만 valid.
+    xy: (N, 3, 2), d: (N, 3) → (x (N,), y (N,), valid (N,))
+    """
+    p1, p2, p3 = xy[:, 0], xy[:, 1], xy[:, 2]
+    r1, r2, r3 = d[:, 0], d[:, 1], d[:, 2]
+
+    def _ok(pa, ra, pb, rb):
+        c = np.linalg.norm(pa - pb, axis=1)
+        return (c <= ra + rb) & (c >= np.abs(ra - rb))
+    valid = _ok(p1, r1, p2, r2) & _ok(p2, r2, p3, r3) & _ok(p1, r1, p3, r3)
+
+    A = 2 * (p2[:, 0] - p1[:, 0]); B = 2 * (p2[:, 1] - p1[:, 1])
+    C = r1**2 - r2**2 - p1[:, 0]**2 + p2[:, 0]**2 - p1[:, 1]**2 + p2[:, 1]**2
+    D = 2 * (p3[:, 0] - p2[:, 0]); E = 2 * (p3[:, 1] - p2[:, 1])
+    F = r2**2 - r3**2 - p2[:, 0]**2 + p3[:, 0]**2 - p2[:, 1]**2 + p3[:, 1]**2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = (F * B - E * C) / (B * D - E * A)
+        y = (F * A - D * C) / (A * E - D * B)
+    valid &= np.isfinite(x) & np.isfinite(y)
+    return x, y, valid
+
+def least_squares_batch(xy: np.ndarray, d: np.ndarray, iters: int = 50, tol: float = 1e-9):
+    """
+    Trilateration 'least_squares' 폴백의 배치판: Σ(‖p − aₖ‖ − dₖ)² 최소화.
+    세 앵커 중심에서 시작하는 Levenberg–Marquardt(2×2 정규방정식)로 scipy 결과와 수 mm 이내.
+    """
+    # 앵커가 일직선이면 중심이 안장점이라 멈추므로 아주 조금 비켜서 시작(scipy 수치미분과 같은 쪽)
+    p = xy.mean(axis=1) + 1e-4                                    # (N, 2)
+    lam = np.full(len(p), 1e-3)
+
+    def _cost(q):
+        r = np.linalg.norm(q[:, None, :] - xy, axis=2) - d
+        return (r * r).sum(axis=1)
+    cost = _cost(p)
+    for _ in range(iters):
+        diff = p[:, None, :] - xy                                 # (N, 3, 2)
+        rng = np.maximum(np.linalg.norm(diff, axis=2), 1e-9)      # (N, 3)
+        r = rng - d
+        J = diff / rng[:, :, None]                                # (N, 3, 2)
+        JtJ = np.einsum("nki,nkj->nij", J, J)
+        g = np.einsum("nki,nk->ni", J, r)
+        A = JtJ + lam[:, None, None] * np.eye(2)
+        det = A[:, 0, 0] * A[:, 1, 1] - A[:, 0, 1] * A[:, 1, 0]
+        det = np.where(np.abs(det) > 1e-12, det, 1e-12)
+        step = np.stack([( A[:, 1, 1] * g[:, 0] - A[:, 0, 1] * g[:, 1]) / det,
+                         (-A[:, 1, 0] * g[:, 0] + A[:, 0, 0] * g[:, 1]) / det], axis=1)
+        cand = p - step
+        c_new = _cost(cand)
+        better = c_new < cost
+        p = np.where(better[:, None], cand, p)
+        lam = np.where(better, lam * 0.3, lam * 10.0)
+        done = np.abs(cost - c_new) <= tol * np.maximum(cost, 1e-12)
+        cost = np.where(better, c_new, cost)
+        if done.all():
+            break
+    return p[:, 0], p[:, 1]
+
+def uncertainty_batch(xy: np.ndarray, d: np.ndarray, std: np.ndarray, count: np.ndarray,
+                      x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """server.fix_uncertainty의 배치판: √trace((JᵀWJ)⁻¹), 특이하면 inf"""
+    sd = d * math.log(10) / PATH_LOSS_DIV * std / np.sqrt(np.maximum(count, 1))
+    dx = x[:, None] - xy[:, :, 0]
+    dy = y[:, None] - xy[:, :, 1]
+    rng = np.hypot(dx, dy)
+    rng = np.where(rng > 0, rng, 1e-6)
+    with np.errstate(divide="ignore", invalid="ignore"):            # 측위 실패 행(NaN)은 inf로 끝남
+        u = np.stack([dx / rng, dy / rng], axis=2)                  # (N, 3, 2)
+        w = 1.0 / np.maximum(sd, 1e-6) ** 2                          # (N, 3)
+        H = np.einsum("nk,nki,nkj->nij", w, u, u)                    # (N, 2, 2)
+        det = H[:, 0, 0] * H[:, 1, 1] - H[:, 0, 1] * H[:, 1, 0]
+        tr = (H[:, 0, 0] + H[:, 1, 1]) / det
+    return np.where((det > 0) & (tr > 0), np.sqrt(np.abs(tr)), np.inf)
+
+# ====== 구역 판정 ======
+_RECTS: Dict[str, Tuple[np.ndarray, np.ndarray, List[str]]] = {}
+
+def _floor_rects(floor: str):
+    """층 view의 rects 섹션(구역 인덱스, xmin, ymin, xmax, ymax)을 그대로 나눠 씀"""
+    if floor not in _RECTS:
+        fv = FLOORS.get(floor)
+        if fv is None:
+            _RECTS[floor] = (np.zeros((0, 4)), np.zeros(0, dtype=np.int64), [])
+        else:
+            _RECTS[floor] = (fv.rects[:, 1:], fv.rects[:, 0].astype(np.int64), fv.areas)
+    return _RECTS[floor]
+
+def classify_batch(floor: str, x: np.ndarray, y: np.ndarray) -> List[str]:
+    """classify_area(strict=False)의 배치판: 점마다 처음 포함되는 구역 이름(없으면 None)"""
+    rects, owner, names = _floor_rects(floor)
+    if not len(rects):
+        return [None] * len(x)
+    inside = ((x[:, None] >= rects[:, 0]) & (x[:, None] <= rects[:, 2]) &
+              (y[:, None] >= rects[:, 1]) & (y[:, None] <= rects[:, 3]))
+    # 구역 정의 순서상 가장 앞의 구역
+    area_idx = np.where(inside, owner[None, :], len(names)).min(axis=1)
+    return [names[i] if i < len(names) else None for i in area_idx.tolist()]
+
+def nearest_nodes_batch(nodes: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """nodes (M, 2)에서 점마다 가장 가까운 노드 인덱스"""
+    d2 = (nodes[None, :, 0] - x[:, None]) ** 2 + (nodes[None, :, 1] - y[:, None]) ** 2
+    return d2.argmin(axis=1)
@@ -0,0 +1,327 @@
+# building.py
+"""
+건물 정의 컴파일러 / mmap 로더.
+
+건물 설명 JSON(기본 building.json, 층 그래프/구역/출구/비콘의 원본 데이터) → 단일 바이너리(.bldg)로
+컴파일하고, 실행 시에는 mmap으로 열어 NumPy view(복사 없음)로 사용한다.
+여러 프로세스가 같은 파일을 열면 페이지 캐시를 공유한다.
+final.py는 import 시 ensure_compiled()로 설명 JSON과 .bldg를 맞춘 뒤 open_building()으로 연다.
+건물 추가/수정은 설명 JSON만 바꾸면 된다(헤더의 source_sha1이 달라지면 다시 컴파일).
+
+파일 구조
+  [0:4]   매직 b"BLDG"
+  [4:8]   버전(uint32 LE)
+  [8:12]  헤더 길이(uint32 LE)
+  [12:..] JSON 헤더(층/구역 이름, 설명 JSON의 source_sha1, 섹션 표: offset/dtype/shape)
+  이후    섹션 데이터(64바이트 정렬, little-endian)
+
+층별 섹션
+  {층}/nodes      int32 (N, 2)   노드 좌표
+  {층}/indptr     int64 (N+1,)   CSR 행 포인터 (방향 그래프, 이웃 순서 보존, csr_graph와 같은 dtype)
+  {층}/indices    int32 (E,)     CSR 이웃 노드 인덱스
+  {층}/exits      int32 (K, 3)   (x, y, 우선순위)
+  {층}/raster     int16 (H, W)   구역 래스터(셀 중심 기준 구역 인덱스, -1 = 없음)
+  {층}/area_node  int32 (A, 2)   구역별 대표 노드 좌표
+  {층}/rects      float64 (R, 5) (구역 인덱스, xmin, ymin, xmax, ymax) — classify_area용 원본 사각형
+  {층}/path       int32 (P, 2)   PATH_SETS 노드
+공통 섹션
+  beacons         int32 (B, 3)   (id, x, y)
+"""
+import os, json, mmap, struct, math, hashlib, argparse
+from typing import Dict, List, Tuple
+import numpy as np
+
+# ====== 포맷 설정 ======
+BLDG_MAGIC    = b"BLDG"
+BLDG_VERSION  = 3       # 2: indptr int64, rects 섹션 / 3: source_sha1 = 설명 JSON 해시
+BLDG_ALIGN    = 64      # 섹션 시작 정렬(바이트)
+RASTER_CELL   = 0.5     # 구역 래스터 셀 크기(m)
+RASTER_MARGIN = 1.0     # 구역 경계 바깥 여유(m)
+
+_PREFIX = struct.Struct("<4sII")
+
+# ====== 설명 JSON ======
+# {"name", "beacons": {id: [x, y]}, "floors": {층: {"graph_num", "graph": {"(x, y)": ["(x, y)", ...]},
+#   "areas": {구역: [[xmin, ymin, xmax, ymax], ...]}, "area_nodes": {구역: [x, y]},
+#   "exits": {우선순위: [[x, y], ...]}, "path": [[x, y], ...]}}}
+def _parse_node(s) -> Tuple[int, int]:
+    if isinstance(s, str):
+        return tuple(map(int, s.strip("()").split(",")))
+    return (int(s[0]), int(s[1]))
+
+def _sha1(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def load_description(path: str) -> dict:
+    """설명 JSON 로드 (source_sha1 = 파일 해시, .bldg가 최신인지 판단)"""
+    with open(path, "r", encoding="utf-8") as f:
+        desc = json.load(f)
+    desc["source_sha1"] = _sha1(path)
+    return desc
+
+# ====== 컴파일 ======
+def _rasterize(areas: Dict[str, list], extra_pts) -> Tuple[np.ndarray, List[float]]:
+    """셀 중심이 속한 첫 구역 인덱스(classify_area(strict=False)와 같은 순서)"""
+    rects = [r for rs in areas.values() for r in rs]
+    xs = [v for r in rects for v in (r[0], r[2])] + [p[0] for p in extra_pts]
+    ys = [v for r in rects for v in (r[1], r[3])] + [p[1] for p in extra_pts]
+    if not xs:
+        return np.full((0, 0), -1, dtype=np.int16), [0.0, 0.0, RASTER_CELL]
+    x0 = math.floor(min(xs) - RASTER_MARGIN)
+    y0 = math.floor(min(ys) - RASTER_MARGIN)
+    w = int(math.ceil((max(xs) + RASTER_MARGIN - x0) / RASTER_CELL))
+    h = int(math.ceil((max(ys) + RASTER_MARGIN - y0) / RASTER_CELL))
+    cx = x0 + (np.arange(w) + 0.5) * RASTER_CELL
+    cy = y0 + (np.arange(h) + 0.5) * RASTER_CELL
+    raster = np.full((h, w), -1, dtype=np.int16)
+    # 뒤 구역부터 칠해서 앞 구역이 우선하도록
+    for idx in range(len(areas) - 1, -1, -1):
+        for xmin, ymin, xmax, ymax in list(areas.values())[idx]:
+            xmin, xmax = min(xmin, xmax), max(xmin, xmax)
+            ymin, ymax = min(ymin, ymax), max(ymin, ymax)
+            cols = (cx >= xmin) & (cx <= xmax)
+            rows = (cy >= ymin) & (cy <= ymax)
+            raster[np.ix_(rows, cols)] = idx
+    return raster, [float(x0), float(y0), RASTER_CELL]
+
+def _compile_floor(fd: dict):
+    graph = {_parse_node(k): [_parse_node(v) for v in vs] for k, vs in fd.get("graph", {}).items()}
+    order = list(graph.keys())
+    for vs in graph.values():            # 키에 없는 이웃도 노드로 포함
+        for v in vs:
+            if v not in graph and v not in order:
+                order.append(v)
+    index = {n: i for i, n in enumerate(order)}
+    indptr = np.zeros(len(order) + 1, dtype=np.int64)
+    indices = []
+    for i, n in enumerate(order):
+        nbrs = graph.get(n, [])
+        indices.extend(index[v] for v in nbrs)
+        indptr[i + 1] = indptr[i] + len(nbrs)
+
+    exits = [(x, y, int(p)) for p, ts in fd.get("exits", {}).items() for x, y in ts]
+    areas = fd.get("areas", {})
+    area_names = list(areas.keys())
+    area_nodes = fd.get("area_nodes", {})
+    raster, origin = _rasterize(areas, order)
+    rects = [[i, *r] for i, rs in enumerate(areas.values()) for r in rs]
+
+    arrays = {
+        "nodes": np.array(order, dtype=np.int32).reshape(-1, 2),
+        "indptr": indptr,
+        "indices": np.array(indices, dtype=np.int32),
+        "exits": np.array(exits, dtype=np.int32).reshape(-1, 3),
+        "raster": raster,
+        # 대표 노드가 없는 구역은 INT32_MIN
+        "area_node": np.array([area_nodes.get(a, [np.iinfo(np.int32).min] * 2) for a in area_names],
+                              dtype=np.int32).reshape(-1, 2),
+        "path": np.array(fd.get("path", []), dtype=np.int32).reshape(-1, 2),
+        "rects": np.array(rects, dtype=np.float64).reshape(-1, 5),
+    }
+    meta = {"graph_num": fd.get("graph_num"), "areas": area_names, "raster_origin": origin}
+    return arrays, meta
+
+def compile_building(desc: dict, out_path: str) -> dict:
+    """건물 설명 → .bldg 파일 (임시 파일에 쓰고 원자적 교체)"""
+    sections: Dict[str, np.ndarray] = {}
+    floors_meta = {}
+    for floor, fd in desc.get("floors", {}).items():
+        arrays, meta = _compile_floor(fd)
+        floors_meta[floor] = meta
+        for k, arr in arrays.items():
+            sections[f"{floor}/{k}"] = arr
+    beacons = [(int(b), xy[0], xy[1]) for b, xy in desc.get("beacons", {}).items()]
+    sections["beacons"] = np.array(beacons, dtype=np.int32).reshape(-1, 3)
+
+    # 헤더 길이가 offset에 영향을 주므로 길이가 바뀌지 않을 때까지 다시 계산
+    table = {k: {"offset": 0, "dtype": arr.dtype.newbyteorder("<").str, "shape": list(arr.shape)}
+             for k, arr in sections.items()}
+    header = {"version": BLDG_VERSION, "name": desc.get("name", ""), "source_sha1": desc.get("source_sha1"),
+              "floors": floors_meta, "sections": table}
+    hdr = b""
+    while True:
+        pos = _PREFIX.size + len(hdr)
+        for k, arr in sections.items():
+            pos = -(-pos // BLDG_ALIGN) * BLDG_ALIGN
+            table[k]["offset"] = pos
+            pos += arr.nbytes
+        new = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        if len(new) == len(hdr):
+            hdr = new
+            break
+        hdr = new
+
+    tmp = f"{out_path}.{os.getpid()}.tmp"   # 워커 여러 개가 동시에 컴파일해도 서로 덮지 않게
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(BLDG_MAGIC, BLDG_VERSION, len(hdr)))
+        f.write(hdr)
+        for k, arr in sections.items():
+            f.write(b"\0" * (table[k]["offset"] - f.tell()))
+            f.write(np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder("<")).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, out_path)
+    print(f"[Building] compiled {desc.get('name', '')} → {out_path} "
+          f"({os.path.getsize(out_path)} bytes, floors={list(floors_meta)})")
+    return header
+
+# ====== 실행 시 로더 ======
+class FloorView:
+    """한 층의 배열 view 묶음 (모두 읽기 전용, mmap 공유)"""
+    def __init__(self, name: str, meta: dict, arrays: Dict[str, np.ndarray]):
+        self.name = name
+        self.graph_num = meta.get("graph_num")
+        self.areas: List[str] = meta["areas"]
+        self.raster_origin = meta["raster_origin"]
+        for k, arr in arrays.items():
+            setattr(self, k, arr)
+        self._index = None
+
+    def node_index(self, node) -> int:
+        """좌표 → 노드 인덱스 (-1 = 없음)"""
+        if self._index is None:
+            self._index = {tuple(n): i for i, n in enumerate(self.nodes.tolist())}
+        return self._index.get(tuple(node), -1)
+
+    def neighbors(self, i: int) -> np.ndarray:
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def graph_dict(self) -> Dict[Tuple[int, int], List[Tuple[int, int]]]:
+        """load_graph()와 같은 dict 그래프 (BFS 등 기존 함수에 그대로 사용)"""
+        nodes = [tuple(n) for n in self.nodes.tolist()]
+        ip, ix = self.indptr.tolist(), self.indices.tolist()
+        return {nodes[i]: [nodes[j] for j in ix[ip[i]:ip[i + 1]]] for i in range(len(nodes))}
+
+    def targets(self) -> Dict[int, List[Tuple[int, int]]]:
+        """TARGETS_MAP 형식의 {우선순위: [노드]}"""
+        out: Dict[int, List[Tuple[int, int]]] = {}
+        for x, y, p in self.exits.tolist():
+            out.setdefault(p, []).append((x, y))
+        return out
+
+    def classify(self, pt):
+        """래스터 조회로 구역 이름 (classify_area(strict=False) 근사, 셀 크기 RASTER_CELL)"""
+        x0, y0, cell = self.raster_origin
+        r = int((pt[1] - y0) // cell)
+        c = int((pt[0] - x0) // cell)
+        h, w = self.raster.shape
+        if not (0 <= r < h and 0 <= c < w):
+            return None
+        idx = int(self.raster[r, c])
+        return self.areas[idx] if idx >= 0 else None
+
+    def area_node(self, area_name):
+        try:
+            n = self.area_node_arr[self.areas.index(area_name)]
+        except ValueError:
+            return None
+        return None if n[0] == np.iinfo(np.int32).min else (int(n[0]), int(n[1]))
+
+    def areas_at(self, pt) -> List[str]:
+        """rects 섹션의 원본 사각형(경계 포함)으로 pt가 속한 구역 이름들 (구역 정의 순서)"""
+        x, y = pt
+        r = self.rects
+        inside = (r[:, 1] <= x) & (x <= r[:, 3]) & (r[:, 2] <= y) & (y <= r[:, 4])
+        return [self.areas[i] for i in np.unique(r[inside, 0].astype(np.int64)).tolist()]
+
+    def nearest_node(self, pt) -> Tuple[int, int]:
+        d = ((self.nodes - np.asarray(pt, dtype=float)) ** 2).sum(axis=1)
+        return tuple(int(v) for v in self.nodes[int(np.argmin(d))])
+
+class Building:
+    """mmap으로 연 .bldg 파일. 섹션은 np.frombuffer view (복사 없음)"""
+    def __init__(self, path: str):
+        self.path = os.path.realpath(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, hlen = _PREFIX.unpack_from(self._mm, 0)
+        if magic != BLDG_MAGIC:
+            raise ValueError(f"건물 파일이 아닙니다: {path}")
+        if version != BLDG_VERSION:
+            raise ValueError(f"지원하지 않는 버전 {version}: {path}")
+        self.header = json.loads(bytes(self._mm[_PREFIX.size:_PREFIX.size + hlen]).decode("utf-8"))
+        self.name = self.header.get("name", "")
+
+        self._sections: Dict[str, np.ndarray] = {}
+        for k, s in self.header["sections"].items():
+            dt = np.dtype(s["dtype"])
+            count = int(np.prod(s["shape"])) if s["shape"] else 1
+            self._sections[k] = np.frombuffer(self._mm, dtype=dt, count=count,
+                                              offset=s["offset"]).reshape(s["shape"])
+
+        self.beacons = {int(b): (int(x), int(y)) for b, x, y in self._sections["beacons"].tolist()}
+        self.floors: Dict[str, FloorView] = {}
+        for floor, meta in self.header["floors"].items():
+            arrays = {k.split("/", 1)[1]: v for k, v in self._sections.items() if k.startswith(floor + "/")}
+            arrays["area_node_arr"] = arrays.pop("area_node")
+            self.floors[floor] = FloorView(floor, meta, arrays)
+
+    def floor(self, name: str) -> FloorView:
+        if name not in self.floors:
+            raise ValueError(f"unknown floor: {name}")
+        return self.floors[name]
+
+    def section(self, key: str) -> np.ndarray:
+        return self._sections[key]
+
+    def close(self):
+        # view가 남아 있으면 mmap을 닫을 수 없으므로 참조부터 정리
+        self._sections.clear()
+        self.floors.clear()
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+
+# 한 프로세스에서 여러 건물 제공: 경로별 1회만 open
+_BUILDINGS: Dict[str, Building] = {}
+
+def open_building(path: str) -> Building:
+    key = os.path.realpath(path)
+    b = _BUILDINGS.get(key)
+    if b is None:
+        b = _BUILDINGS[key] = Building(key)
+    return b
+
+def _compiled_sha1(path: str):
+    try:
+        with open(path, "rb") as f:
+            magic, version, hlen = _PREFIX.unpack(f.read(_PREFIX.size))
+            if magic != BLDG_MAGIC or version != BLDG_VERSION:
+                return None
+            return json.loads(f.read(hlen).decode("utf-8")).get("source_sha1")
+    except (OSError, ValueError, struct.error):
+        return None
+
+def ensure_compiled(desc_path: str, out_path: str) -> str:
+    """설명 JSON이 있고 .bldg가 없거나 다른 설명에서 컴파일됐으면 다시 컴파일. return: out_path
+    (설명 JSON 없이 .bldg만 배포한 경우 그대로 사용)"""
+    if desc_path and os.path.exists(desc_path) and _compiled_sha1(out_path) != _sha1(desc_path):
+        compile_building(load_description(desc_path), out_path)
+    if not os.path.exists(out_path):
+        raise FileNotFoundError(f"건물 파일 없음: {out_path} (설명 JSON: {desc_path})")
+    return out_path
+
+# ====== CLI ======
+def main():
+    parser = argparse.ArgumentParser(description="건물 정의 컴파일러")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("compile", help="설명 JSON → .bldg")
+    p.add_argument("desc", help="설명 JSON 경로 (예: building.json)")
+    p.add_argument("out")
+    p = sub.add_parser("info", help=".bldg 요약 출력")
+    p.add_argument("path")
+    args = parser.parse_args()
+
+    if args.cmd == "compile":
+        compile_building(load_description(args.desc), args.out)
+    elif args.cmd == "info":
+        b = open_building(args.path)
+        print(f"[Building] {b.name} ({os.path.getsize(b.path)} bytes), beacons={len(b.beacons)}")
+        for name, fv in b.floors.items():
+            print(f"  {name}: nodes={len(fv.nodes)}, edges={len(fv.indices)}, exits={len(fv.exits)}, "
+                  f"areas={len(fv.areas)}, raster={fv.raster.shape}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+# csr_graph.py
+"""
+정수 인덱스 CSR 그래프 (경로 계산용).
+
+dict[(x, y)] → [(x, y), ...] 대신
+  nodes   int32 (N, 2)   노드 좌표 (노드 id = 행 번호)
+  indptr  int64 (N+1,)   CSR 행 포인터 (방향 그래프, 이웃 순서 보존)
+  indices int32 (E,)     이웃 노드 id
+  alive   bool  (N,)     삭제 여부 비트마스크 (remove_node = O(1), 배열은 그대로)
+building.py(.bldg)의 nodes/indptr/indices와 같은 배치라 FloorView에서 복사 없이 만들 수 있다.
+
+- BFS는 레벨 단위 frontier 배열 연산. 같은 레벨 안 방문 순서를 deque BFS와 같게 맞춰
+  final.bfs_shortest_path와 같은 경로(동률일 때 같은 부모)를 돌려준다
+- exit_field: 우선순위마다 그 출구들에서 역방향 다중 출발 BFS 1회 → 모든 노드의 (우선순위, 거리,
+  다음 노드, 도착 출구). 경로 조회는 다음 노드를 따라가기만 하면 되므로 그래프가 바뀔 때만 다시 계산
+  (server/GraphJournal/evac_sim/evac_flow가 이 그래프와 경로장을 쓴다)
+- find_best_path는 final.find_best_path와 같은 규칙(우선순위, 최단 거리, stair_cost)으로 exit_field를 조회.
+  같은 거리의 경로/출구가 여럿이면 다른 쪽을 고를 수 있다(거리와 우선순위는 같음)
+- distance_field: 여러 출발점(예: 출구)에서의 홉 거리 배열, reverse=True면 '그 노드까지' 거리
+"""
+import os, sys, json, math, time, argparse
+from typing import Dict, List, Tuple, Optional
+import numpy as np
+
+Node = Tuple[int, int]
+
+def _parse(s: str) -> Node:
+    return tuple(map(int, s.strip("()").split(",")))
+
+class CSRGraph:
+    def __init__(self, nodes: np.ndarray, indptr: np.ndarray, indices: np.ndarray, alive: np.ndarray = None):
+        self.nodes = nodes
+        self.indptr = indptr
+        self.indices = indices
+        self.alive = np.ones(len(nodes), dtype=bool) if alive is None else alive
+        self._index: Optional[Dict[Node, int]] = None
+        self._rev: Optional["CSRGraph"] = None
+
+    # ---- 변환 ----
+    @classmethod
+    def from_dict(cls, graph: Dict[Node, List[Node]]) -> "CSRGraph":
+        order = list(graph.keys())
+        index = {n: i for i, n in enumerate(order)}
+        for vs in graph.values():            # 키에 없는 이웃도 노드로 포함(building.py와 동일)
+            for v in vs:
+                if v not in index:
+                    index[v] = len(order)
+                    order.append(v)
+        counts = np.fromiter((len(graph.get(n, ())) for n in order), dtype=np.int64, count=len(order))
+        indptr = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        indices = np.fromiter((index[v] for n in order for v in graph.get(n, ())), dtype=np.int32,
+                              count=int(indptr[-1]))
+        g = cls(np.array(order, dtype=np.int32).reshape(-1, 2), indptr, indices)
+        g._index = index
+        return g
+
+    @classmethod
+    def from_json(cls, path: str) -> "CSRGraph":
+        """graph_dataN.json / original_graphN.json ("(x, y)" 문자열 키) → CSR. 같은 문자열은 한 번만 파싱"""
+        with open(path, "r", encoding="utf-8") as f:
+            raw: Dict[str, List[str]] = json.load(f)
+        ids: Dict[str, int] = {}
+        order: List[str] = []
+        for k in raw:
+            ids[k] = len(order)
+            order.append(k)
+        indptr = np.zeros(len(raw) + 1, dtype=np.int64)
+        flat: List[int] = []
+        for i, vs in enumerate(raw.values()):
+            for v in vs:
+                j = ids.get(v)
+                if j is None:
+                    j = ids[v] = len(order)
+                    order.append(v)
+                flat.append(j)
+            indptr[i + 1] = len(flat)
+        indptr = np.concatenate([indptr, np.full(len(order) - len(raw), indptr[-1], dtype=np.int64)])
+        nodes = np.array([_parse(s) for s in order], dtype=np.int32).reshape(-1, 2)
+        return cls(nodes, indptr, np.array(flat, dtype=np.int32))
+
+    @classmethod
+    def from_floor_view(cls, fv) -> "CSRGraph":
+        """building.FloorView(mmap) 배열을 그대로 사용 (alive만 새로 할당)"""
+        return cls(fv.nodes, fv.indptr, fv.indices)
+
+    def to_dict(self) -> Dict[Node, List[Node]]:
+        """load_graph()와 같은 dict (삭제 노드와 그 노드로 가는 간선 제외)"""
+        nodes = [tuple(n) for n in self.nodes.tolist()]
+        ip, ix, alive = self.indptr.tolist(), self.indices.tolist(), self.alive.tolist()
+        return {nodes[i]: [nodes[j] for j in ix[ip[i]:ip[i + 1]] if alive[j]]
+                for i in range(len(nodes)) if alive[i]}
+
+    def to_json(self, path: str):
+        """save_graph()와 같은 JSON 형식으로 원자적 저장"""
+        names = [f"({x}, {y})" for x, y in self.nodes.tolist()]
+        ip, ix, alive = self.indptr.tolist(), self.indices.tolist(), self.alive.tolist()
+        data = {names[i]: [names[j] for j in ix[ip[i]:ip[i + 1]] if alive[j]]
+                for i in range(len(names)) if alive[i]}
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    # ---- 조회/변경 ----
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.nodes.nbytes + self.indptr.nbytes + self.indices.nbytes + self.alive.nbytes
+
+    def node_id(self, node) -> int:
+        """좌표 → 노드 id (-1 = 없음)"""
+        if self._index is None:
+            self._index = {tuple(n): i for i, n in enumerate(self.nodes.tolist())}
+        return self._index.get((int(node[0]), int(node[1])), -1)
+
+    def coord(self, i: int) -> Node:
+        return (int(self.nodes[i, 0]), int(self.nodes[i, 1]))
+
+    def neighbors(self, i: int) -> np.ndarray:
+        nb = self.indices[self.indptr[i]:self.indptr[i + 1]]
+        return nb[self.alive[nb]]
+
+    def __contains__(self, node) -> bool:
+        i = self.node_id(node)
+        return i >= 0 and bool(self.alive[i])
+
+    def alive_ids(self) -> np.ndarray:
+        return np.nonzero(self.alive)[0]
+
+    def nearest(self, pt) -> int:
+        """살아 있는 노드 중 pt에 가장 가까운 노드 id (final.nearest_graph_node와 같은 동률 처리, -1 = 없음)"""
+        ids = self.alive_ids()
+        if not ids.size:
+            return -1
+        d = ((self.nodes[ids] - np.asarray(pt, dtype=float)) ** 2).sum(axis=1)
+        return int(ids[int(np.argmin(d))])
+
+    def remove_node(self, node) -> bool:
+        i = self.node_id(node)
+        if i < 0 or not self.alive[i]:
+            return False
+        self.alive[i] = False
+        return True
+
+    def restore_node(self, node) -> bool:
+        """삭제 표시 해제 (간선은 CSR을 만든 원본 기준)"""
+        i = self.node_id(node)
+        if i < 0 or self.alive[i]:
+            return False
+        self.alive[i] = True
+        return True
+
+    def reset(self, dead=()):
+        """원본 상태로 되돌리되 dead 노드는 삭제 상태 유지 (alive는 제자리 갱신 → reversed()와 공유 유지)"""
+        self.alive[:] = True
+        for n in dead:
+            i = self.node_id(n)
+            if i >= 0:
+                self.alive[i] = False
+
+    def dead_nodes(self) -> List[Node]:
+        return [tuple(n) for n in self.nodes[~self.alive].tolist()]
+
+    def reversed(self) -> "CSRGraph":
+        """간선 방향을 뒤집은 그래프 (alive 배열 공유, 한 번 만든 뒤 재사용)"""
+        if self._rev is None:
+            n = len(self.nodes)
+            src = np.repeat(np.arange(n, dtype=np.int32), np.diff(self.indptr))
+            order = np.argsort(self.indices, kind="stable")
+            indptr = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.indices, minlength=n), out=indptr[1:])
+            self._rev = CSRGraph(self.nodes, indptr, src[order], self.alive)
+            self._rev._index = self._index
+        return self._rev
+
+    # ---- 탐색 ----
+    def _expand(self, frontier: np.ndarray):
+        """frontier 각 노드의 이웃을 frontier 순서·이웃 순서대로 펼침 → (이웃, 부모)"""
+        starts = self.indptr[frontier]
+        lens = self.indptr[frontier + 1] - starts
+        total = int(lens.sum())
+        if total == 0:
+            return np.empty(0, np.int32), np.empty(0, np.int32)
+        seg = np.repeat(starts - (np.cumsum(lens) - lens), lens)
+        nb = self.indices[np.arange(total) + seg]
+        return nb, np.repeat(frontier, lens)
+
+    def bfs(self, sources, max_depth: int = None):
+        """
+        다중 출발 BFS. return: (dist int32 (N,), -1 = 도달 불가, parent int32 (N,), -1 = 없음)
+        같은 레벨 안 발견 순서를 deque BFS와 동일하게 유지
+        """
+        dist, parent, _ = self._bfs(sources, max_depth=max_depth)
+        return dist, parent
+
+    def _bfs(self, sources, offsets=None, max_depth: int = None):
+        """
+        bfs + 출발점별 시작 거리(offsets, 정수 홉) + 도착 출발점(root).
+        offset이 d인 출발점은 레벨 d에서 (그때까지 방문되지 않았으면) frontier 앞에 들어온다
+        """
+        n = len(self.nodes)
+        dist = np.full(n, -1, dtype=np.int32)
+        parent = np.full(n, -1, dtype=np.int32)
+        root = np.full(n, -1, dtype=np.int32)
+        src = np.asarray(sources, dtype=np.int32).reshape(-1)
+        off = np.zeros(len(src), dtype=np.int64) if offsets is None else np.asarray(offsets, dtype=np.int64)
+        keep = self.alive[src]
+        src, off = src[keep], off[keep]
+        order = np.argsort(off, kind="stable")
+        src, off = src[order], off[order]
+        empty = np.empty(0, dtype=np.int32)
+        frontier, d, k = empty, 0, 0
+        while frontier.size or k < len(src):
+            if frontier.size:
+                nb, par = self._expand(frontier)
+                keep = self.alive[nb] & (dist[nb] < 0)
+                nb, par = nb[keep], par[keep]
+                u, first = np.unique(nb, return_index=True)
+                o = np.argsort(first, kind="stable")
+                nb, par = u[o], par[first[o]]
+                d += 1
+            else:
+                nb, par = empty, empty
+                d = int(off[k])              # 다음 출발점까지 빈 레벨은 건너뜀
+            if max_depth is not None and d > max_depth:
+                break
+            j = k
+            while j < len(src) and off[j] <= d:
+                j += 1
+            new, k = src[k:j], j
+            new = new[dist[new] < 0]
+            if new.size:
+                _, first = np.unique(new, return_index=True)
+                new = new[np.sort(first)]
+                keep = ~np.isin(nb, new)
+                nb, par = nb[keep], par[keep]
+                dist[new] = d
+                root[new] = new
+            dist[nb] = d
+            parent[nb] = par
+            root[nb] = root[par]
+            frontier = np.concatenate([new, nb]) if new.size else nb
+        return dist, parent, root
+
+    def exit_field(self, targets: Dict[int, List[Node]], stair_cost=None) -> "ExitField":
+        """
+        targets(TARGETS_MAP[file_key] 형식)의 출구 경로장. 우선순위 순서대로 그 출구들에서
+        역방향 다중 출발 BFS 1회 → 아직 출구가 없는 노드에 (우선순위, 거리, 다음 노드, 출구) 기록.
+        stair_cost가 있으면 2순위 이하 출구는 그 비용(홉)을 시작 거리로, inf면 제외
+        """
+        n = len(self.nodes)
+        pri = np.full(n, -1, dtype=np.int32)
+        dist = np.full(n, -1, dtype=np.int64)
+        nxt = np.full(n, -1, dtype=np.int32)
+        tgt = np.full(n, -1, dtype=np.int32)
+        rev = self.reversed()
+        for priority in sorted(targets):
+            ids, offs = [], []
+            for t in targets[priority]:
+                i = self.node_id(t)
+                if i < 0 or not self.alive[i]:
+                    continue
+                extra = 0
+                if stair_cost is not None and priority > 1:
+                    extra = stair_cost.get(t, 0)
+                    if extra == math.inf:
+                        continue
+                ids.append(i)
+                offs.append(int(extra))
+            if not ids:
+                continue
+            d, par, root = rev._bfs(ids, offs)
+            new = (d >= 0) & (pri < 0)
+            pri[new], dist[new], nxt[new], tgt[new] = priority, d[new], par[new], root[new]
+        return ExitField(self, pri, dist, nxt, tgt)
+
+    def distance_field(self, sources, reverse: bool = False) -> np.ndarray:
+        """
+        sources(노드 id 또는 좌표)에서의 홉 거리 (float, 도달 불가 inf).
+        reverse=True면 각 노드에서 sources까지의 거리(출구 거리장)
+        """
+        ids = [s if isinstance(s, (int, np.integer)) else self.node_id(s) for s in sources]
+        ids = [i for i in ids if i >= 0]
+        g = self.reversed() if reverse else self
+        dist, _ = g.bfs(ids)
+        out = dist.astype(float)
+        out[dist < 0] = math.inf
+        return out
+
+    def path_to(self, parent: np.ndarray, target: int) -> List[Node]:
+        path = []
+        i = target
+        while i >= 0:
+            path.append(self.coord(i))
+            i = int(parent[i])
+        path.reverse()
+        return path
+
+    def shortest_path(self, start, target):
+        """final.bfs_shortest_path와 같은 (거리, [좌표 경로])"""
+        s, t = self.node_id(start), self.node_id(target)
+        if s < 0 or t < 0 or not self.alive[s] or not self.alive[t]:
+            return math.inf, []
+        dist, parent = self.bfs([s])
+        if dist[t] < 0:
+            return math.inf, []
+        return int(dist[t]), self.path_to(parent, t)
+
+    def find_best_path(self, start_node, targets: Dict[int, List[Node]], stair_cost=None):
+        """
+        final.find_best_path와 같은 반환값 (best_path, found_target, priority_used, best_dist).
+        한 번만 물을 때용. 여러 시작 노드는 exit_field()를 한 번 만들어 path()로 조회
+        """
+        return self.exit_field(targets, stair_cost).path(start_node)
+
+class ExitField:
+    """exit_field 결과: 노드별 우선순위/거리(홉 + 계단 비용)/출구 쪽 다음 노드/도착 출구 (-1 = 없음)"""
+    __slots__ = ("graph", "priority", "dist", "nxt", "target")
+
+    def __init__(self, graph: CSRGraph, priority: np.ndarray, dist: np.ndarray, nxt: np.ndarray, target: np.ndarray):
+        self.graph = graph
+        self.priority = priority
+        self.dist = dist
+        self.nxt = nxt
+        self.target = target
+
+    def path_ids(self, i: int) -> List[int]:
+        """노드 id i에서 출구까지 노드 id 경로 (출구가 없으면 [])"""
+        if i < 0 or self.priority[i] < 0:
+            return []
+        out = [int(i)]
+        while self.nxt[out[-1]] >= 0:
+            out.append(int(self.nxt[out[-1]]))
+        return out
+
+    def path(self, start_node):
+        """final.find_best_path와 같은 (best_path, found_target, priority_used, best_dist)"""
+        g = self.graph
+        i = g.node_id(start_node)
+        if i < 0 or not g.alive[i] or self.priority[i] < 0:
+            return [], None, None, math.inf
+        return ([g.coord(j) for j in self.path_ids(i)], g.coord(int(self.target[i])),
+                int(self.priority[i]), int(self.dist[i]))
+
+# ====== 검증 / 벤치마크 ======
+def _grid_graph(side: int) -> Dict[Node, List[Node]]:
+    """side×side 격자(4방향) dict 그래프"""
+    g = {}
+    for x in range(side):
+        for y in range(side):
+            g[(x, y)] = [(x + dx, y + dy) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+                         if 0 <= x + dx < side and 0 <= y + dy < side]
+    return g
+
+def _valid_path(csr: CSRGraph, path: List[Node]) -> bool:
+    ids = [csr.node_id(p) for p in path]
+    return all(i >= 0 and csr.alive[i] for i in ids) and \
+        all(b in csr.neighbors(a).tolist() for a, b in zip(ids, ids[1:]))
+
+def check_floors(trials: int = 50, seed: int = 0) -> bool:
+    """
+    final.py 층 그래프에서 무작위 노드 삭제(alive)마다 모든 시작 노드의 경로장 결과를
+    dict 기준 final.find_best_path와 비교: 우선순위/거리는 같아야 하고, 경로가 다르면 같은 거리의 유효한 경로여야 함
+    """
+    import copy, random
+    from final import ORIGINAL_GRAPHS, TARGETS_MAP, find_best_path, remove_node
+    rng = random.Random(seed)
+    ok = True
+    for key, graph in ORIGINAL_GRAPHS.items():
+        targets = TARGETS_MAP.get(key, {})
+        csr = CSRGraph.from_dict(graph)
+        assert csr.to_dict() == graph, key
+        mism = alt = 0
+        for trial in range(trials):
+            dead = rng.sample(list(graph), rng.randint(0, len(graph) // 3)) if trial else []
+            g = copy.deepcopy(graph)
+            csr.reset(dead)
+            for n in dead:
+                remove_node(g, n)
+            field = csr.exit_field(targets)
+            for start in graph:
+                a = find_best_path(g, start, key) if start in g else ([], None, None, math.inf)
+                b = field.path(start)
+                if a[2:] != b[2:] or (b[0] and not _valid_path(csr, b[0])):
+                    mism += 1
+                elif a != b:
+                    alt += 1
+        csr.reset()
+        print(f"[CSR] {key}: nodes={len(csr)}, edges={len(csr.indices)}, "
+              f"mismatch={mism}, equal_cost_alternatives={alt}")
+        ok &= mism == 0
+    return ok
+
+def bench(side: int, repeat: int = 5, starts: int = 200):
+    """
+    격자에서 서버와 같은 사용 패턴 비교: 그래프 버전 하나 동안 starts명의 경로 요청.
+    dict = 요청마다 final.find_best_path(목표마다 BFS), csr = exit_field 1회 + 요청마다 path()
+    """
+    import random, tracemalloc
+    from final import find_best_path, TARGETS_MAP
+    tracemalloc.start()
+    g = _grid_graph(side)
+    dict_mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    csr = CSRGraph.from_dict(g)
+    corners = [(side - 1, side - 1), (0, side - 1), (side - 1, 0)]
+    targets = {1: corners[:2], 2: corners[2:]}
+    rng = random.Random(0)
+    pts = [rng.choice(list(g)) for _ in range(starts)]
+    key = "__bench__"                       # final.find_best_path는 TARGETS_MAP에서 목표를 읽음
+    TARGETS_MAP[key] = targets
+    try:
+        field = csr.exit_field(targets)
+        for p in pts[:20]:
+            assert find_best_path(g, p, key)[2:] == field.path(p)[2:]
+        t0 = time.perf_counter()
+        for p in pts:
+            find_best_path(g, p, key)
+        t_dict = time.perf_counter() - t0
+    finally:
+        TARGETS_MAP.pop(key, None)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        field = csr.exit_field(targets)
+    t_field = (time.perf_counter() - t0) / repeat
+    t0 = time.perf_counter()
+    for p in pts:
+        field.path(p)
+    t_path = time.perf_counter() - t0
+    t_csr = t_field + t_path
+    print(f"[CSR] grid {side}x{side}: nodes={len(csr)}, edges={len(csr.indices)}, requests={starts}")
+    print(f"  memory: dict={dict_mem/1e6:.1f}MB, csr={csr.nbytes/1e6:.2f}MB")
+    print(f"  routing: dict find_best_path={t_dict*1000:.1f}ms, "
+          f"csr exit_field={t_field*1000:.1f}ms + path={t_path*1000:.1f}ms ({t_dict/t_csr:.1f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description="CSR 그래프 검증/벤치마크")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("check", help="final.py 층 그래프(무작위 삭제 포함)로 find_best_path 결과 비교")
+    p = sub.add_parser("bench", help="격자 그래프로 dict find_best_path와 경로 요청 비용 비교")
+    p.add_argument("--side", type=int, default=150)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--starts", type=int, default=200)
+    args = parser.parse_args()
+    if args.cmd == "check":
+        sys.exit(0 if check_floors() else 1)
+    bench(args.side, args.repeat, args.starts)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# evac_flow.py
+"""
+혼잡 고려 대피 경로 배정 (층 단위 일괄 계산).
+
+find_best_path는 사람마다 가장 가까운 1순위 출구로 보내므로 인원이 많으면
+모두 같은 복도/출구로 몰린다. 여기서는 층의 전체 점유 인원(시작 노드별 인원)을
+ASSIGN_STEPS 조각으로 나눠 점증 배정(incremental assignment)한다.
+- 조각마다 현재 부하를 반영한 간선/출구 비용으로 출구→역방향 Dijkstra 1회
+- 간선 비용 = 보행 시간 + 이미 배정된 인원의 통과 대기(부하/용량)
+- 출구 비용 = 출구 대기(부하/용량)
+- 우선순위(TARGETS_MAP)는 유지: 1순위 출구에 도달할 수 없는 인원만 2순위로
+목표는 개인 홉 수가 아니라 층 전체 대피 완료 시간(가장 늦은 사람) 최소화.
+그래프는 CSRGraph(삭제 노드 = alive 마스크)를 역방향 CSR 배열 그대로 순회한다.
+"""
+import math, heapq
+from typing import Dict, List, Tuple, Hashable
+
+from csr_graph import CSRGraph
+
+# ====== 대피 모델 설정 ======
+WALK_SPEED    = 1.2     # 보행 속도(m/s)
+EDGE_CAPACITY = 1.3     # 복도 통과 유량(명/s), 폭 1m 기준
+EXIT_CAPACITY = 1.0     # 출구/계단 진입 유량(명/s)
+ASSIGN_STEPS  = 8       # 점증 배정 조각 수(클수록 균형↑, 계산량∝)
+
+Node = Tuple[int, int]
+
+def _edge_len(a: Node, b: Node) -> float:
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+def _reverse(graph: CSRGraph):
+    """역방향 CSR을 순회용 파이썬 리스트로 (좌표, indptr, indices, alive)"""
+    rev = graph.reversed()
+    pts = [tuple(n) for n in rev.nodes.tolist()]
+    return pts, rev.indptr.tolist(), rev.indices.tolist(), rev.alive.tolist()
+
+def _dijkstra_to_exits(rev, exits, edge_load, exit_load):
+    """출구들(노드 id)에서 역방향으로 비용/다음 노드 계산 (간선 u→v 비용은 부하 반영)"""
+    pts, ip, ix, alive = rev
+    dist = [math.inf] * len(pts)
+    nxt = [-1] * len(pts)
+    heap = []
+    for t in exits:
+        d0 = exit_load.get(pts[t], 0.0) / EXIT_CAPACITY
+        if d0 < dist[t]:
+            dist[t] = d0
+            heapq.heappush(heap, (d0, t))
+    while heap:
+        d, v = heapq.heappop(heap)
+        if d > dist[v]:
+            continue
+        for u in ix[ip[v]:ip[v + 1]]:
+            if not alive[u]:
+                continue
+            w = _edge_len(pts[u], pts[v]) / WALK_SPEED + edge_load.get((pts[u], pts[v]), 0.0) / EDGE_CAPACITY
+            nd = d + w
+            if nd < dist[u]:
+                dist[u] = nd
+                nxt[u] = v
+                heapq.heappush(heap, (nd, u))
+    return dist, nxt
+
+def _follow(start: int, nxt: List[int], exits, pts) -> List[Node]:
+    path = [start]
+    while path[-1] not in exits:
+        path.append(nxt[path[-1]])
+    return [pts[i] for i in path]
+
+def route_eta(path: List[Node], edge_load, exit_load) -> float:
+    """경로 완주 예상 시간 = 보행 시간 + 경로상 최대 병목 대기"""
+    walk = sum(_edge_len(a, b) for a, b in zip(path, path[1:])) / WALK_SPEED
+    queue = exit_load.get(path[-1], 0.0) / EXIT_CAPACITY
+    for a, b in zip(path, path[1:]):
+        queue = max(queue, edge_load.get((a, b), 0.0) / EDGE_CAPACITY)
+    return walk + queue
+
+def _load_path(path: List[Node], n: float, edge_load, exit_load):
+    for a, b in zip(path, path[1:]):
+        edge_load[(a, b)] = edge_load.get((a, b), 0.0) + n
+    exit_load[path[-1]] = exit_load.get(path[-1], 0.0) + n
+
+def assign_routes(graph: CSRGraph, occupants: Dict[Hashable, Node],
+                  targets: Dict[int, List[Node]], steps: int = ASSIGN_STEPS):
+    """
+    graph: CSRGraph (load_graph 형식 dict도 허용)
+    occupants: {점유자 키: 시작 노드}
+    targets: TARGETS_MAP 형식 {우선순위: [출구 노드]}
+    return: ({점유자 키: (경로, 예상 완료 시간 s)}, 층 전체 예상 대피 시간 s)
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph.from_dict(graph)
+    rev = _reverse(graph)
+    groups: Dict[Node, List[Hashable]] = {}
+    for key, node in occupants.items():
+        if node in graph:
+            groups.setdefault(node, []).append(key)
+
+    edge_load: Dict[Tuple[Node, Node], float] = {}
+    exit_load: Dict[Node, float] = {}
+    # 시작 노드별로 조각마다 배정된 (경로, 인원)
+    plans: Dict[Node, List[Tuple[List[Node], int]]] = {n: [] for n in groups}
+    remaining = {n: len(keys) for n, keys in groups.items()}
+
+    for step in range(steps):
+        pending = {n: math.ceil(r / (steps - step)) for n, r in remaining.items() if r > 0}
+        if not pending:
+            break
+        for priority in sorted(targets):
+            exits = {graph.node_id(t) for t in targets[priority] if t in graph}
+            if not exits or not pending:
+                continue
+            dist, nxt = _dijkstra_to_exits(rev, exits, edge_load, exit_load)
+            for start in list(pending):
+                s = graph.node_id(start)
+                if dist[s] == math.inf:
+                    continue            # 이 우선순위로는 도달 불가 → 다음 우선순위
+                n = pending.pop(start)
+                path = _follow(s, nxt, exits, rev[0])
+                _load_path(path, n, edge_load, exit_load)
+                plans[start].append((path, n))
+                remaining[start] -= n
+        for start in pending:           # 어느 출구로도 도달 불가
+            remaining[start] = 0
+
+    out = {}
+    worst = 0.0
+    for start, keys in groups.items():
+        i = 0
+        for path, n in plans[start]:
+            eta = route_eta(path, edge_load, exit_load)
+            worst = max(worst, eta)
+            for key in keys[i:i + n]:
+                out[key] = (path, eta)
+            i += n
+        for key in keys[i:]:
+            out[key] = ([], math.inf)
+    return out, worst
+
+def paths_eta(paths: Dict[Hashable, List[Node]]) -> float:
+    """비교용: 주어진 경로(예: find_best_path)대로 모두 이동할 때의 층 전체 예상 대피 시간"""
+    edge_load: Dict[Tuple[Node, Node], float] = {}
+    exit_load: Dict[Node, float] = {}
+    for key, path in paths.items():
+        if path:
+            _load_path(path, 1, edge_load, exit_load)
+    return max((route_eta(p, edge_load, exit_load) for p in paths.values() if p), default=0.0)
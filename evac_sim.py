@@ -0,0 +1,410 @@
+# evac_sim.py
+"""
+에이전트 기반 대피 시뮬레이터 (훈련 전 경로 변경/서버 용량 검증용, 실제 폰 없이).
+
+final.py의 층 그래프/구역 대표 노드/출구(TARGETS_MAP)를 그대로 읽어
+NODES_BY_AREA 지점에 가상 인원 수천 명을 배치하고 SIM_TICK_SEC 단위로 진행한다.
+- 인원 상태는 NumPy 배열(현재 노드, 경로 id, 경로 내 위치, 간선 진행 거리)이고
+  이동/도착/정원 판정은 틱마다 배열 연산 한 번 (사람 수만큼 파이썬 루프를 돌지 않음)
+- 경로는 탈출구 경로장(CSRGraph.exit_field, --routing best) 또는 evac_flow.assign_routes
+  (--routing assign)로 만들고, 같은 출발 노드끼리 공유. 경로장은 그래프가 바뀔 때만 역방향 BFS
+  한 번으로 다시 구하고, 인원별 경로는 다음 노드 배열을 따라가기만 한다
+- 노드 정원: 다음 노드의 인원이 NODE_CAPACITY에 차 있으면 간선 끝에서 대기
+- 배치도 정원을 지킨다: 구역 노드마다 NODE_CAPACITY명까지만 그래프에 올리고 나머지는
+  그 구역 안(그래프 밖)에서 대기(staged) → 노드에 빈자리가 나는 만큼 틱마다 진입
+- 출구 유량: 출구마다 틱당 EXIT_CAPACITY·dt 명만 통과
+- 화재 이벤트(--fire 시각:구역,...)는 진행 중에 그래프 alive 마스크에서 노드를 지우고,
+  남은 경로에 그 노드가 있는 인원만 현재 위치에서 다시 경로를 받는다
+결과: 대피 완료 시간(T50/T90/T100), 틱별 이동/경로 계산 비용,
+      같은 인원이 폰으로 접속했을 때 서버 측 측위+경로 계산 예산(코어 수 환산)
+"""
+import json, math, time, argparse
+from typing import Dict, List, Tuple
+import numpy as np
+
+from final import (FLOORS, TARGETS_MAP, NODES_BY_AREA, FLOOR_TO_GRAPH_MAP, beacon_coords,
+                   original_filename, trilaterate_from_top3, classify_area, map_area_to_node)
+from evac_flow import WALK_SPEED, EXIT_CAPACITY, assign_routes
+from csr_graph import CSRGraph
+
+# ====== 시뮬레이션 설정 ======
+SIM_TICK_SEC     = 0.5     # 시뮬레이션 틱(초)
+SIM_MAX_SEC      = 900.0   # 이 시간까지 못 나간 인원은 미완료로 집계(초)
+NODE_CAPACITY    = 16      # 노드(약 4m 복도 구간) 최대 동시 인원
+SPEED_SD         = 0.15    # 개인 보행 속도 편차(WALK_SPEED 대비 비율)
+SIM_FIX_RATE_HZ  = 1 / 0.3 # 폰 1대당 측위 요청 빈도(server.FIX_MIN_INTERVAL 기준)
+FIX_COST_SAMPLES = 200     # 서버 측위 비용 측정 표본 수
+
+Node = Tuple[int, int]
+
+def _rank(keys: np.ndarray) -> np.ndarray:
+    """같은 key 안에서의 순번(0부터, 입력 순서 유지)"""
+    order = np.argsort(keys, kind="stable")
+    s = keys[order]
+    first = np.searchsorted(s, s, side="left")
+    r = np.empty(len(keys), dtype=np.int64)
+    r[order] = np.arange(len(keys)) - first
+    return r
+
+class EvacSim:
+    def __init__(self, floor: str, agents: int, *, routing: str = "best", seed: int = 0,
+                 tick: float = SIM_TICK_SEC, capacity: int = NODE_CAPACITY):
+        if floor not in FLOOR_TO_GRAPH_MAP:
+            raise ValueError(f"unknown floor: {floor}")
+        if routing not in ("best", "assign"):
+            raise ValueError(f"알 수 없는 경로 방식: {routing}")
+        self.floor, self.routing, self.tick, self.capacity = floor, routing, tick, capacity
+        self.file_key = original_filename(FLOOR_TO_GRAPH_MAP[floor])
+        self.targets = TARGETS_MAP.get(self.file_key, {})
+        self.graph = CSRGraph.from_floor_view(FLOORS[floor])   # 화재 시 remove_node 대상
+        self.nodes: List[Node] = [tuple(n) for n in self.graph.nodes.tolist()]
+        self.node_idx = {n: i for i, n in enumerate(self.nodes)}
+        self.xy = self.graph.nodes.astype(np.float64)
+        self.alive = self.graph.alive                       # 그래프와 공유, remove_node된 노드는 False
+        self.field = None                                   # 탈출구 경로장 (화재 때마다 무효화)
+        self.exits = np.zeros(len(self.nodes), dtype=bool)
+        for ts in self.targets.values():
+            for t in ts:
+                if t in self.node_idx:
+                    self.exits[self.node_idx[t]] = True
+        self.credit = np.zeros(len(self.nodes))   # 출구별 이번 틱 통과 가능 인원
+
+        # ---- 인원 배치 ----
+        self.rng = np.random.default_rng(seed)
+        spawn = [self.node_idx[p] for p in NODES_BY_AREA.get(floor, {}).values() if p in self.node_idx]
+        if not spawn:
+            raise RuntimeError(f"{floor}: 배치할 구역 노드가 없습니다.")
+        self.n = agents
+        self.cur = np.asarray(spawn, dtype=np.int32)[self.rng.integers(0, len(spawn), agents)]
+        self.speed = WALK_SPEED * np.clip(self.rng.normal(1.0, SPEED_SD, agents), 0.5, 1.5)
+        self.prog = np.zeros(agents)                 # 현재 간선에서 간 거리(m)
+        self.rid = np.zeros(agents, dtype=np.int32)  # 경로 id (self.routes 행)
+        self.pos = np.zeros(agents, dtype=np.int32)  # 경로 안에서 cur의 위치
+        self.done = np.zeros(agents, dtype=bool)
+        self.trapped = np.zeros(agents, dtype=bool)
+        self.t_out = np.full(agents, np.nan)
+        # 정원을 넘는 인원은 구역 안에서 대기하다가 빈자리가 나면 노드로 진입
+        perm = self.rng.permutation(agents)
+        self.staged = np.zeros(agents, dtype=bool)
+        self.staged[perm] = _rank(self.cur[perm]) >= capacity
+        self.staged_init = int(self.staged.sum())
+        self.staged_clear_t = None           # 마지막 대기 인원이 그래프에 올라온 시각
+
+        # ---- 경로표: 행마다 노드 id, 남는 칸은 -1 ----
+        self.routes: List[np.ndarray] = []
+        self.route_cache: Dict[Tuple[int, int], int] = {}   # (앞 노드, 출발 노드) → 경로 id
+        self.table = np.full((1, 1), -1, dtype=np.int32)
+        self.rlen = np.zeros(1, dtype=np.int32)
+
+        self.t = 0.0
+        self.route_calls = 0
+        self.route_ms: List[float] = []      # 경로 계산이 있었던 틱의 소요 시간
+        self.step_ms: List[float] = []       # 틱별 이동/정원 판정 소요 시간
+        self.peak_occ = 0
+        self.blocked = np.zeros(len(self.nodes), dtype=np.int64)   # 노드별 정원 초과로 막힌 인원·틱
+        self.swaps = 0                       # 정원이 찬 두 노드 사이 맞교환 통과 수
+        self.events: List[Tuple[float, List[Node]]] = []
+
+    # ---- 경로 ----
+    def _add_route(self, path_ids: List[int]) -> int:
+        self.routes.append(np.asarray(path_ids, dtype=np.int32))
+        return len(self.routes) - 1
+
+    def _rebuild_table(self):
+        width = max(len(r) for r in self.routes)
+        self.table = np.full((len(self.routes), width), -1, dtype=np.int32)
+        for i, r in enumerate(self.routes):
+            self.table[i, :len(r)] = r
+        self.rlen = np.array([len(r) for r in self.routes], dtype=np.int32)
+
+    def _next(self) -> np.ndarray:
+        """인원별 다음 노드 id (경로 끝이면 -1)"""
+        nxt_pos = self.pos + 1
+        ok = nxt_pos < self.rlen[self.rid]
+        return np.where(ok, self.table[self.rid, np.minimum(nxt_pos, self.table.shape[1] - 1)], -1)
+
+    def _origins(self, ids: np.ndarray):
+        """재경로 출발점: 살아 있는 다음 노드로 가던 중이면 그 노드(앞에 현재 노드를 붙임),
+        아니면 현재 노드. 현재 노드가 불탔으면 가장 가까운 살아 있는 노드로 빠져나간다"""
+        nxt = self._next()[ids]
+        cur = self.cur[ids]
+        going = (self.prog[ids] > 0) & (nxt >= 0) & self.alive[np.maximum(nxt, 0)]
+        origin = np.where(going, nxt, cur)
+        self.prog[ids[~going]] = 0.0
+        for k in np.nonzero(~going & ~self.alive[cur])[0]:
+            i = self.graph.nearest(self.nodes[cur[k]])
+            if i >= 0:
+                origin[k] = i
+        prefix = np.where(origin != cur, cur, -1)
+        return prefix, origin
+
+    def _route_best(self, ids: np.ndarray):
+        prefix, origin = self._origins(ids)
+        pairs = np.stack([prefix, origin], axis=1)
+        uniq, inv = np.unique(pairs, axis=0, return_inverse=True)
+        rids = np.empty(len(uniq), dtype=np.int32)
+        if self.field is None:
+            self.field = self.graph.exit_field(self.targets)
+        for u, (pre, org) in enumerate(uniq):
+            key = (int(pre), int(org))
+            if key not in self.route_cache:
+                path = self.field.path_ids(int(org))
+                self.route_calls += 1
+                ids_path = ([key[0]] if pre >= 0 else []) + path
+                self.route_cache[key] = self._add_route(ids_path) if path else -1
+            rids[u] = self.route_cache[key]
+        return rids[inv.ravel()]
+
+    def _route_assign(self, ids: np.ndarray):
+        prefix, origin = self._origins(ids)
+        occupants = {k: self.nodes[o] for k, o in enumerate(origin)}
+        plan, _ = assign_routes(self.graph, occupants, self.targets)
+        self.route_calls += 1
+        out = np.full(len(ids), -1, dtype=np.int32)
+        seen: Dict[Tuple[int, ...], int] = {}
+        for k, o in enumerate(origin):
+            path = plan.get(k, ([], math.inf))[0]
+            if not path:
+                continue
+            ids_path = ([int(prefix[k])] if prefix[k] >= 0 else []) + [self.node_idx[p] for p in path]
+            key = tuple(ids_path)
+            if key not in seen:
+                seen[key] = self._add_route(ids_path)
+            out[k] = seen[key]
+        return out
+
+    def reroute(self, ids: np.ndarray):
+        """ids 인원에게 현재 위치 기준 경로 배정. 출구까지 길이 없으면 trapped"""
+        if len(ids) == 0:
+            return
+        t0 = time.perf_counter()
+        rids = self._route_best(ids) if self.routing == "best" else self._route_assign(ids)
+        self._rebuild_table()
+        lost = rids < 0
+        self.trapped[ids[lost]] = True
+        ok = ids[~lost]
+        self.rid[ok] = rids[~lost]
+        self.pos[ok] = 0
+        self.cur[ok] = self.table[self.rid[ok], 0]
+        return (time.perf_counter() - t0) * 1000
+
+    # ---- 화재 ----
+    def add_fire(self, at: float, nodes: List[Node]):
+        self.events.append((at, list(nodes)))
+        self.events.sort(key=lambda e: e[0])
+
+    def _apply_fire(self, nodes: List[Node]) -> float:
+        for n in nodes:
+            self.graph.remove_node(n)
+        dead = np.array([self.node_idx[n] for n in nodes if n in self.node_idx], dtype=np.int32)
+        self.field = None
+        self.route_cache.clear()
+        # 불탄 노드 구역에서 아직 나오지 못한 대기 인원은 고립
+        burned = self.staged & ~self.done & np.isin(self.cur, dead)
+        self.trapped[burned] = True
+        act = ~self.done & ~self.trapped
+        # 경로마다 불탄 노드가 처음 나오는 위치 → 아직 지나지 않았으면 재경로
+        hit = np.isin(self.table, dead)
+        first = np.where(hit.any(axis=1), hit.argmax(axis=1), -1)
+        affected = np.nonzero(act & (first[self.rid] >= self.pos))[0]
+        print(f"[Sim] t={self.t:.1f}s 화재: 노드 {len(dead)}개 제거, 재경로 {len(affected)}명")
+        return self.reroute(affected) or 0.0
+
+    # ---- 진행 ----
+    def step(self):
+        dt = self.tick
+        t0 = time.perf_counter()
+        act = ~self.done & ~self.trapped
+        waiting = act & self.staged
+        act &= ~self.staged
+        nxt = self._next()
+        occ = np.bincount(self.cur[act], minlength=len(self.nodes))
+        self.credit = np.where(self.exits, np.minimum(self.credit + EXIT_CAPACITY * dt,
+                                                      max(1.0, EXIT_CAPACITY * dt)), 0.0)
+
+        moving = act & (nxt >= 0)
+        self.prog[moving] += self.speed[moving] * dt
+        seg = np.zeros(self.n)
+        mv = np.nonzero(moving)[0]
+        seg[mv] = np.hypot(*(self.xy[self.cur[mv]] - self.xy[nxt[mv]]).T)
+        # 후보: 다음 노드에 닿은 인원 + 출구 노드에서 나가기를 기다리는 인원
+        arrived = moving & (self.prog >= seg)
+        at_exit = act & (nxt < 0)
+        cand = np.nonzero(arrived | at_exit)[0]
+        cand = cand[self.rng.permutation(len(cand))]       # 같은 틱 도착자 간 순서는 무작위
+        tgt = np.where(nxt[cand] >= 0, nxt[cand], self.cur[cand])
+        leaving = (self.pos[cand] + 1 >= self.rlen[self.rid[cand]] - 1)   # 다음 노드가 경로 끝(출구)
+        rank = _rank(tgt)
+        allow = np.where(leaving, np.floor(self.credit[tgt]), self.capacity - occ[tgt])
+        ok = rank < allow
+        # 맞흐름 교착 방지: A→B, B→A로 막힌 인원은 서로 자리를 바꿔 통과(양쪽 인원 수 불변)
+        stuck = np.nonzero(~ok & ~leaving)[0]
+        if len(stuck):
+            n = len(self.nodes)
+            a, b = self.cur[cand[stuck]].astype(np.int64), tgt[stuck].astype(np.int64)
+            pair, back = a * n + b, b * n + a
+            keys, cnt = np.unique(pair, return_counts=True)
+            j = np.minimum(np.searchsorted(keys, back), len(keys) - 1)
+            rev = np.where(keys[j] == back, cnt[j], 0)
+            swap = stuck[_rank(pair) < rev]
+            ok[swap] = True
+            self.swaps += len(swap)
+
+        out = cand[ok & leaving]
+        self.done[out] = True
+        self.t_out[out] = self.t + dt
+        np.subtract.at(self.credit, tgt[ok & leaving], 1.0)
+        go = cand[ok & ~leaving]
+        self.prog[go] -= seg[go]
+        self.cur[go] = nxt[go]
+        self.pos[go] += 1
+        wait = cand[~ok]
+        wait_m = wait[nxt[wait] >= 0]
+        self.prog[wait_m] = seg[wait_m]
+        np.add.at(self.blocked, tgt[~ok], 1)
+
+        # 대기 인원 진입: 이번 틱 이동 후 빈자리만큼
+        occ = np.bincount(self.cur[~self.done & ~self.trapped & ~self.staged], minlength=len(self.nodes))
+        st = np.nonzero(waiting)[0]
+        if len(st):
+            enter = st[_rank(self.cur[st]) < self.capacity - occ[self.cur[st]]]
+            self.staged[enter] = False
+            np.add.at(occ, self.cur[enter], 1)
+            if len(enter) == len(st):
+                self.staged_clear_t = self.t + dt
+        # 틱이 끝난 뒤의 노드 인원으로 최대 밀집도 측정
+        self.peak_occ = max(self.peak_occ, int(occ.max()) if len(occ) else 0)
+        self.t += dt
+        self.step_ms.append((time.perf_counter() - t0) * 1000)
+
+    def run(self, max_sec: float = SIM_MAX_SEC) -> dict:
+        self.route_ms.append(self.reroute(np.arange(self.n)))
+        events = list(self.events)
+        while self.t < max_sec and (~self.done & ~self.trapped).any():
+            ms = 0.0
+            while events and events[0][0] <= self.t:
+                ms += self._apply_fire(events.pop(0)[1])
+            if ms:
+                self.route_ms.append(ms)
+            self.step()
+        return self.report()
+
+    # ---- 결과 ----
+    def report(self) -> dict:
+        t = np.sort(self.t_out[self.done])
+        pct = lambda q: round(float(t[min(len(t) - 1, int(math.ceil(q * len(t))) - 1)]), 1) if len(t) else None
+        step = np.array(self.step_ms) if self.step_ms else np.zeros(1)
+        top = np.argsort(self.blocked)[::-1][:5]
+        return {
+            "floor": self.floor, "routing": self.routing, "agents": self.n,
+            "evacuated": int(self.done.sum()), "trapped": int(self.trapped.sum()),
+            "unfinished": int((~self.done & ~self.trapped).sum()),
+            "t50_s": pct(0.5), "t90_s": pct(0.9), "t100_s": pct(1.0),
+            "ticks": len(self.step_ms), "tick_s": self.tick,
+            "step_ms": {"mean": round(float(step.mean()), 3), "p95": round(float(np.percentile(step, 95)), 3),
+                        "max": round(float(step.max()), 3)},
+            "route_ms": [round(m, 2) for m in self.route_ms], "route_calls": self.route_calls,
+            "peak_node_occupancy": self.peak_occ, "node_capacity": self.capacity, "swaps": self.swaps,
+            "staged": self.staged_init, "staged_clear_s": self.staged_clear_t,
+            "bottlenecks": [{"node": list(self.nodes[i]), "blocked_agent_ticks": int(self.blocked[i])}
+                            for i in top if self.blocked[i] > 0],
+        }
+
+# ====== 서버 측 예산 ======
+def fix_cost_ms(floor: str, samples: int = FIX_COST_SAMPLES, seed: int = 0) -> float:
+    """폰 1건 측위 처리 비용(ms) 추정: 삼변측량 + 구역 판정 + 경로 조회(경로 캐시 미적중 가정,
+    탈출구 경로장은 서버처럼 그래프 버전당 한 번 계산해 두고 재사용)"""
+    rng = np.random.default_rng(seed)
+    file_key = original_filename(FLOOR_TO_GRAPH_MAP[floor])
+    graph = CSRGraph.from_floor_view(FLOORS[floor])
+    field = graph.exit_field(TARGETS_MAP.get(file_key, {}))
+    pts = list(NODES_BY_AREA.get(floor, {}).values()) or [tuple(n) for n in graph.nodes.tolist()]
+    anchors = np.array(list(beacon_coords.values()), dtype=np.float64)
+    ids = list(beacon_coords.keys())
+    t0 = time.perf_counter()
+    for k in range(samples):
+        x, y = np.array(pts[k % len(pts)], dtype=np.float64) + rng.uniform(-1.5, 1.5, 2)
+        d = np.hypot(anchors[:, 0] - x, anchors[:, 1] - y)
+        top3 = [{"id": ids[i], "distance": float(d[i])} for i in np.argsort(d)[:3]]
+        try:
+            fx, fy, _ = trilaterate_from_top3(top3)
+        except Exception:
+            fx, fy = x, y
+        try:
+            area = classify_area((fx, fy), floor, strict=True)
+        except ValueError:
+            area = classify_area((fx, fy), floor, strict=False)
+        node = map_area_to_node(area, floor) if area else None
+        start = node if node and node in graph else graph.coord(graph.nearest((fx, fy)))
+        field.path(start)
+    return (time.perf_counter() - t0) * 1000 / samples
+
+def server_budget(rep: dict, per_fix_ms: float) -> dict:
+    """같은 인원이 폰으로 접속했을 때 서버가 써야 하는 CPU(ms/s, 코어 환산)"""
+    fixes = rep["agents"] * SIM_FIX_RATE_HZ
+    cpu = fixes * per_fix_ms
+    burst = max(rep["route_ms"][1:], default=0.0)
+    return {"fix_ms": round(per_fix_ms, 3), "fixes_per_s": round(fixes, 1),
+            "cpu_ms_per_s": round(cpu, 1), "cores": round(cpu / 1000, 2),
+            "fire_reroute_burst_ms": round(burst, 2)}
+
+# ====== CLI ======
+def _parse_fire(spec: str, floor: str):
+    """'시각:구역[,구역...]' → (시각, [노드]). 구역은 NODES_BY_AREA 이름 또는 'x;y' 좌표"""
+    at, _, names = spec.partition(":")
+    nodes = []
+    for name in filter(None, names.split(",")):
+        if ";" in name:
+            nodes.append(tuple(int(v) for v in name.split(";")))
+        else:
+            node = map_area_to_node(name.strip(), floor)
+            if node is None:
+                raise SystemExit(f"알 수 없는 구역: {name}")
+            nodes.append(node)
+    return float(at), nodes
+
+def main():
+    parser = argparse.ArgumentParser(description="에이전트 기반 대피 시뮬레이션")
+    parser.add_argument("--floor", default="B1", choices=sorted(FLOOR_TO_GRAPH_MAP))
+    parser.add_argument("--agents", type=int, default=3000)
+    parser.add_argument("--routing", default="best", choices=["best", "assign"])
+    parser.add_argument("--fire", action="append", default=[], metavar="T:AREA[,AREA...]",
+                        help="T초에 구역 대표 노드 제거 (여러 번 지정 가능)")
+    parser.add_argument("--tick", type=float, default=SIM_TICK_SEC)
+    parser.add_argument("--capacity", type=int, default=NODE_CAPACITY)
+    parser.add_argument("--max-sec", type=float, default=SIM_MAX_SEC)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = parser.parse_args()
+
+    sim = EvacSim(args.floor, args.agents, routing=args.routing, seed=args.seed,
+                  tick=args.tick, capacity=args.capacity)
+    for spec in args.fire:
+        sim.add_fire(*_parse_fire(spec, args.floor))
+    t0 = time.perf_counter()
+    rep = sim.run(args.max_sec)
+    rep["wall_s"] = round(time.perf_counter() - t0, 2)
+    rep["server"] = server_budget(rep, fix_cost_ms(args.floor))
+
+    s = rep["server"]
+    print(f"[Sim] {rep['floor']} {rep['routing']}: {rep['agents']}명 → 대피 {rep['evacuated']}, "
+          f"고립 {rep['trapped']}, 미완료 {rep['unfinished']}")
+    print(f"  대피 시간: T50={rep['t50_s']}s, T90={rep['t90_s']}s, T100={rep['t100_s']}s "
+          f"(틱 {rep['ticks']}회, 노드 최대 {rep['peak_node_occupancy']}명, "
+          f"맞교환 {rep['swaps']}회)")
+    if rep["staged"]:
+        clear = rep["staged_clear_s"]
+        print(f"  구역 대기: {rep['staged']}명 (정원 {rep['node_capacity']}명 초과분), "
+              f"모두 진입 {'미완료' if clear is None else f't={clear}s'}")
+    print(f"  틱 비용: 이동 mean={rep['step_ms']['mean']}ms p95={rep['step_ms']['p95']}ms, "
+          f"경로 계산 {rep['route_calls']}회 {rep['route_ms']}ms (실행 {rep['wall_s']}s)")
+    print(f"  서버 예산: 측위 1건 {s['fix_ms']}ms × {s['fixes_per_s']}건/s = {s['cpu_ms_per_s']}ms/s "
+          f"(≈{s['cores']}코어), 화재 재경로 최대 {s['fire_reroute_burst_ms']}ms")
+    for b in rep["bottlenecks"]:
+        print(f"  병목 {tuple(b['node'])}: 대기 {b['blocked_agent_ticks']}명·틱")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rep, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
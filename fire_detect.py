@@ -1,7 +1,11 @@
 # fire_detect.py
-import glob, os, asyncio, base64, json
+import glob, os, sys, asyncio, base64, json, time, threading, queue, math, argparse, uuid
+_BOOT_T0 = time.perf_counter()   # 콜드 스타트 측정 기준(인터프리터 기동 제외)
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from ultralytics import YOLO
+from typing import Dict
+import numpy as np
 import cv2
 import websockets
 
@@ -9,45 +13,490 @@ import websockets
 WS_CANDIDATES = [
     "ws://172.20.6.45:8000",    # IPv4 주소 수정
 ]
+UPLINK_OPEN_TIMEOUT   = 5      # 연결 시도 타임아웃(초)
+UPLINK_PING_INTERVAL  = 10     # keepalive ping 주기(초)
+UPLINK_PING_TIMEOUT   = 10     # pong 대기 한도(초), 넘으면 끊고 재연결
+UPLINK_BACKOFF_MIN    = 0.5    # 재연결 대기 시작값(초)
+UPLINK_BACKOFF_MAX    = 10.0   # 재연결 대기 상한(초)
+UPLINK_QUEUE_MAX      = 1000   # 끊긴 동안 보관할 최대 메시지 수(초과 시 오래된 것부터 버림)
+UPLINK_FLUSH_TIMEOUT  = 5.0    # 종료 시 남은 메시지 전송 대기 한도(초)
+UPLINK_ACK_BATCH      = 32     # ping 1회로 수신 확인할 최대 메시지 수
+UPLINK_PATH           = "/detector"   # 서버가 감지기 연결로 구분하는 경로(server.DETECTOR_PATH)
+
+# ====== 알림 이미지 전송 방식 ======
+# "thumb" : 축소 JPEG를 base64로 JSON에 포함
+# "binary": JSON에는 image_id만, JPEG는 별도 바이너리 프레임(FIRE_IMAGE_MAGIC + id 16B + JPEG)
+# "full"  : 원본 해상도 base64 (이전 방식), "none": 이미지 없음
+ALERT_IMAGE_MODE    = "thumb"
+THUMB_MAX_SIDE      = 320      # 썸네일 긴 변 픽셀
+THUMB_JPEG_QUALITY  = 70
+BINARY_MAX_SIDE     = 1280     # 바이너리 프레임 긴 변 상한(None이면 원본)
+BINARY_JPEG_QUALITY = 85
+FIRE_IMAGE_MAGIC    = b"FIMG"  # server.py와 동일해야 함
 # ====== 노트북 환경에 맞추어 설정 ======
 MODEL_PATH = r"C:\Users\kimsu\Downloads\tamhwadan\tamhwadan\best_retrained.pt"
 IMAGE_GLOB = r"C:\Users\kimsu\Downloads\tamhwadan\tamhwadan\test_images\*.jpg"
 CLASS_NAMES = ['fire', 'smoke']
 
-# ====== 모델 로드 ======
-model = YOLO(MODEL_PATH)
+# ====== 추론 백엔드 ======
+# "torch": ultralytics YOLO(.pt) / "onnx": onnxruntime CPU (torch 없이 numpy 전/후처리)
+BACKEND      = "torch"
+ONNX_PATH    = None      # None이면 MODEL_PATH 옆 <stem>.onnx (없으면 export)
+ONNX_INT8    = False     # True면 ONNX 모델 옆 <stem>.int8.onnx(동적 int8 양자화, 없으면 생성) 사용
+INPUT_SIZE   = 640       # 추론 입력 한 변 픽셀(작을수록 빠르고 작은 불꽃은 놓치기 쉬움)
+WARMUP_RUNS  = 2         # 로드 직후 더미 추론 횟수(첫 프레임 지연 제거)
+ORT_THREADS  = 0         # onnxruntime intra-op 스레드 수(0이면 자동)
+DET_CONF_MIN = 0.25      # 후처리에서 남길 최소 conf (ultralytics 기본값과 동일)
+NMS_IOU      = 0.45
+
+# ====== 파이프라인 설정 ======
+BATCH_SIZE     = 4       # model([...]) 한 번에 넣을 프레임 수
+BATCH_WAIT     = 0.02    # 배치가 덜 찼을 때 추가 프레임을 기다리는 최대 시간(초)
+DECODE_WORKERS = 4       # cv2.imread 디코딩 스레드 수
+QUEUE_MAX      = 16      # 단계 간 큐 최대 길이(메모리 상한/역압)
+FIRE_CONF_TH   = 0.5     # fire 판정 confidence 하한
+
+# ====== 스트림(동영상/카메라) 설정 ======
+VIDEO_SOURCE      = None   # None이면 IMAGE_GLOB 사용. 동영상 경로, RTSP URL 또는 장치 번호("0")
+FRAME_QUEUE_MAX   = 2      # 대기 프레임 최대 개수(가득 차면 오래된 것부터 버림)
+MAX_FRAME_SKIP    = 30     # 추론이 아무리 느려도 한 번에 건너뛸 최대 프레임 수
+LATENCY_EMA_ALPHA = 0.3    # 추론 지연 EMA 계수
+STREAM_SAVE_ALL   = False  # 스트림 모드에서 화재 프레임만 저장(False) / 모든 처리 프레임 저장(True)
+
+# ====== 추론 전 색상/움직임 필터(cascade, 스트림/다중 카메라 모드) ======
+# 축소 프레임에서 불꽃색·연기색 화소 중 '움직이는' 비율을 보고 통과한 프레임만 모델로 보낸다.
+# 정지 이미지 목록(run_pipeline)은 프레임 간 움직임이 의미 없어 적용하지 않음
+PREFILTER             = True
+PREFILTER_SIDE        = 160    # 검사용 축소 긴 변 픽셀
+FLAME_HUE_MAX         = 35     # 불꽃색 H 범위: H <= 이 값 또는 H >= FLAME_HUE_WRAP (OpenCV H 0~179)
+FLAME_HUE_WRAP        = 170
+FLAME_SAT_MIN         = 100
+FLAME_VAL_MIN         = 150
+SMOKE_SAT_MAX         = 40     # 연기색: 채도 낮고 너무 어둡거나 밝지 않은 화소
+SMOKE_VAL_RANGE       = (80, 230)
+MOTION_DIFF_TH        = 20     # 배경(이동 평균)과 밝기 차 이상이면 움직임 화소
+BG_ALPHA              = 0.05   # 배경 갱신 계수
+FLAME_RATIO_MIN       = 0.002  # 움직이는 불꽃색 화소 비율 하한
+SMOKE_RATIO_MIN       = 0.02   # 움직이는 연기색 화소 비율 하한
+PREFILTER_HOLD        = 15     # 한 번 통과하면 이후 이 프레임 수만큼 무조건 추론(디바운스 해제 판정용)
+PREFILTER_FORCE_EVERY = 30     # 걸러지는 중에도 이 프레임마다 1번은 강제 추론(안전장치)
+
+# ====== 시간축 알림 디바운스 ======
+DEFAULT_CAMERA_ID  = "cam0"
+RAISE_N            = 3      # 최근 RAISE_M 프레임 중 RAISE_N개 이상 FIRE_CONF_TH 초과 시 화재 발생
+RAISE_M            = 5
+CLEAR_CONF_TH      = 0.3    # 해제 판정 conf 상한(발생 기준보다 낮게 → 히스테리시스)
+CLEAR_FRAMES       = 15     # CLEAR_CONF_TH 이하가 이만큼 연속되면 해제
+CONF_EMA_ALPHA     = 0.3    # conf EMA 계수
+UPDATE_INTERVAL    = 10.0   # 화재 지속 중 conf 갱신 전송 주기(초)
+
+# ====== 다중 카메라 ======
+CAMERA_REGISTRY  = str(Path(__file__).with_name("cameras.json"))  # 카메라 id → 층/노드/입력 매핑
+INFER_WORKERS    = 2       # 추론 워커 수(워커마다 모델 인스턴스 1개)
+SCHED_IDLE_SLEEP = 0.005   # 준비된 프레임이 없을 때 스케줄러 대기(초)
+KNOWN_FLOORS     = ("B2", "B1", "1F", "4F")
+
+# ====== 추론 백엔드 구현 ======
+class TorchBackend:
+    """ultralytics YOLO(.pt) 그대로 사용"""
+    name = "torch"
+    def __init__(self, model_path: str = MODEL_PATH, imgsz: int = INPUT_SIZE):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.imgsz = imgsz
+
+    def __call__(self, frames):
+        return self.model(frames, imgsz=self.imgsz, verbose=False)
+
+    def run_timed(self, frames):
+        """return: (results, {"preprocess","inference","postprocess"} 초, 배치 전체)"""
+        results = self.model(frames, imgsz=self.imgsz, verbose=False)
+        # ultralytics는 프레임당 ms를 results[i].speed에 기록
+        speed = results[0].speed if results else {}
+        n = len(frames)
+        return results, {k: speed.get(k, 0.0) * n / 1000.0 for k in ("preprocess", "inference", "postprocess")}
+
+class _OnnxBox:
+    __slots__ = ("xyxy", "conf", "cls")
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy, self.conf, self.cls = xyxy, conf, cls
+
+class _OnnxBoxes:
+    """ultralytics Boxes와 같은 모양(xyxy/conf/cls 배열, 박스 단위 순회)"""
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy, self.conf, self.cls = xyxy, conf, cls
+    def __len__(self):
+        return len(self.conf)
+    def __iter__(self):
+        for i in range(len(self.conf)):
+            yield _OnnxBox(self.xyxy[i], self.conf[i], self.cls[i])
+
+class OnnxResults:
+    def __init__(self, orig_img, boxes: _OnnxBoxes):
+        self.orig_img = orig_img
+        self.boxes = boxes
+
+    def plot(self):
+        img = self.orig_img.copy()
+        for (x1, y1, x2, y2), conf, cls_id in zip(self.boxes.xyxy.astype(int), self.boxes.conf, self.boxes.cls):
+            label = CLASS_NAMES[cls_id] if 0 <= cls_id < len(CLASS_NAMES) else str(cls_id)
+            color = (0, 0, 255) if label == "fire" else (160, 160, 160)
+            cv2.rectangle(img, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(img, f"{label} {conf:.2f}", (x1, max(12, y1 - 4)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+        return img
+
+def export_onnx(model_path: str = MODEL_PATH, imgsz: int = INPUT_SIZE, int8: bool = ONNX_INT8) -> str:
+    """.pt → .onnx(동적 배치) 변환, int8이면 가중치 동적 양자화까지. return: 사용할 onnx 경로"""
+    onnx_path = str(Path(model_path).with_suffix(".onnx"))
+    if not os.path.exists(onnx_path):
+        from ultralytics import YOLO
+        onnx_path = YOLO(model_path).export(format="onnx", imgsz=imgsz, dynamic=True)
+        print(f"[Backend] exported {onnx_path}")
+    return quantize_onnx(onnx_path) if int8 else onnx_path
+
+def quantize_onnx(onnx_path: str) -> str:
+    """<stem>.onnx → 같은 폴더의 <stem>.int8.onnx(가중치 동적 양자화, 이미 있으면 재사용). return: int8 경로"""
+    if onnx_path.endswith(".int8.onnx"):
+        return onnx_path
+    int8_path = str(Path(onnx_path).with_suffix(".int8.onnx"))
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+        print(f"[Backend] quantized {int8_path}")
+    return int8_path
+
+class OnnxBackend:
+    """onnxruntime CPU 추론. 레터박스/NMS는 numpy·cv2로 처리해 torch를 올리지 않는다"""
+    name = "onnx"
+    def __init__(self, onnx_path: str = None, imgsz: int = INPUT_SIZE, int8: bool = ONNX_INT8):
+        import onnxruntime as ort
+        if onnx_path is None:
+            onnx_path = export_onnx(MODEL_PATH, imgsz, int8)
+        elif int8:
+            onnx_path = quantize_onnx(onnx_path)   # ONNX_PATH를 지정해도 ONNX_INT8이 적용되도록
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ORT_THREADS:
+            opts.intra_op_num_threads = ORT_THREADS
+        self.sess = ort.InferenceSession(onnx_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        inp = self.sess.get_inputs()[0]
+        self.input_name = inp.name
+        # 고정 배치(1)로 export된 모델이면 프레임 단위로 돈다
+        self.dynamic_batch = not isinstance(inp.shape[0], int)
+        self.imgsz = imgsz
+        self.path = onnx_path
+
+    def _letterbox(self, img):
+        h, w = img.shape[:2]
+        r = min(self.imgsz / h, self.imgsz / w)
+        nw, nh = int(round(w * r)), int(round(h * r))
+        resized = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR) if (nw, nh) != (w, h) else img
+        top, left = (self.imgsz - nh) // 2, (self.imgsz - nw) // 2
+        canvas = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+        canvas[top:top + nh, left:left + nw] = resized
+        return canvas, r, left, top
+
+    def preprocess(self, frames):
+        metas, tensors = [], []
+        for img in frames:
+            canvas, r, left, top = self._letterbox(img)
+            tensors.append(canvas[:, :, ::-1].transpose(2, 0, 1))   # BGR→RGB, HWC→CHW
+            metas.append((r, left, top, img.shape[:2]))
+        blob = np.ascontiguousarray(np.stack(tensors), dtype=np.float32) / 255.0
+        return blob, metas
+
+    def postprocess(self, pred, meta):
+        """pred: (4+nc, N) [cx,cy,w,h, 클래스 점수...] → 원본 좌표계 박스"""
+        n_ch = 4 + len(CLASS_NAMES)
+        if pred.shape[0] != n_ch and pred.shape[1] == n_ch:
+            pred = pred.T
+        scores = pred[4:]
+        cls = scores.argmax(axis=0)
+        conf = scores[cls, np.arange(scores.shape[1])]
+        keep = conf > DET_CONF_MIN
+        cx, cy, bw, bh = pred[:4, keep]
+        cls, conf = cls[keep], conf[keep]
+        xywh = np.stack([cx - bw / 2, cy - bh / 2, bw, bh], axis=1)
 
-def encode_jpg_b64(img_bgr) -> str:
-    ok, buf = cv2.imencode(".jpg", img_bgr)
-    if not ok:
+        idx = []
+        if len(conf):
+            # 클래스별 NMS: 클래스마다 좌표를 띄워 한 번에 처리
+            offset = cls[:, None].astype(np.float32) * (self.imgsz * 2)
+            shifted = xywh.copy()
+            shifted[:, :2] += offset
+            idx = cv2.dnn.NMSBoxes(shifted.tolist(), conf.tolist(), DET_CONF_MIN, NMS_IOU)
+            idx = np.array(idx, dtype=int).reshape(-1)
+
+        r, left, top, (h, w) = meta
+        xywh, conf, cls = xywh[idx], conf[idx], cls[idx]
+        xyxy = np.empty((len(idx), 4), dtype=np.float32)
+        xyxy[:, 0] = (xywh[:, 0] - left) / r
+        xyxy[:, 1] = (xywh[:, 1] - top) / r
+        xyxy[:, 2] = (xywh[:, 0] + xywh[:, 2] - left) / r
+        xyxy[:, 3] = (xywh[:, 1] + xywh[:, 3] - top) / r
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+        return _OnnxBoxes(xyxy, conf.astype(np.float32), cls.astype(int))
+
+    def infer(self, blob):
+        if self.dynamic_batch:
+            return self.sess.run(None, {self.input_name: blob})[0]
+        return np.concatenate([self.sess.run(None, {self.input_name: blob[i:i + 1]})[0]
+                               for i in range(len(blob))])
+
+    def __call__(self, frames):
+        blob, metas = self.preprocess(frames)
+        out = self.infer(blob)
+        return [OnnxResults(img, self.postprocess(out[i], metas[i])) for i, img in enumerate(frames)]
+
+    def run_timed(self, frames):
+        t0 = time.perf_counter()
+        blob, metas = self.preprocess(frames)
+        t1 = time.perf_counter()
+        out = self.infer(blob)
+        t2 = time.perf_counter()
+        results = [OnnxResults(img, self.postprocess(out[i], metas[i])) for i, img in enumerate(frames)]
+        t3 = time.perf_counter()
+        return results, {"preprocess": t1 - t0, "inference": t2 - t1, "postprocess": t3 - t2}
+
+def load_backend(name: str = None, imgsz: int = None, warmup: int = WARMUP_RUNS):
+    """BACKEND 설정대로 추론기를 만들고 더미 프레임으로 warm-up"""
+    name = name or BACKEND
+    imgsz = imgsz or INPUT_SIZE
+    if name == "torch":
+        backend = TorchBackend(MODEL_PATH, imgsz)
+    elif name == "onnx":
+        backend = OnnxBackend(ONNX_PATH, imgsz, ONNX_INT8)
+    else:
+        raise ValueError(f"알 수 없는 BACKEND: {name}")
+    dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    t0 = time.perf_counter()
+    for _ in range(warmup):
+        backend([dummy])
+    print(f"[Backend] {name} ready (imgsz={imgsz}, warmup={warmup}회 {time.perf_counter() - t0:.2f}s)")
+    return backend
+
+# ====== 모델 로드(지연) ======
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """기본 추론기를 처음 필요할 때 한 번만 로드 (import만으로는 모델을 읽지 않음)"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_backend()
+    return _model
+
+def encode_jpg(img_bgr, max_side=None, quality: int = 95) -> bytes:
+    """긴 변을 max_side 이하로 줄여 JPEG 인코딩. 실패 시 빈 bytes"""
+    if max_side:
+        h, w = img_bgr.shape[:2]
+        scale = max_side / float(max(h, w))
+        if scale < 1.0:
+            img_bgr = cv2.resize(img_bgr, (max(1, int(w * scale)), max(1, int(h * scale))),
+                                 interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", img_bgr, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+    return buf.tobytes() if ok else b""
+
+def encode_jpg_b64(img_bgr, max_side=None, quality: int = 95) -> str:
+    jpg = encode_jpg(img_bgr, max_side, quality)
+    if not jpg:
         return ""
-    b64 = base64.b64encode(buf.tobytes()).decode("ascii")
+    b64 = base64.b64encode(jpg).decode("ascii")
     return f"data:image/jpeg;base64,{b64}"
 
-async def send_ws_fire_any(conf: float, floor="B1", image_bgr=None):
-    """여러 후보 WS 주소 중 하나로 전송 시도"""
+def attach_alert_image(payload: dict, image_bgr, mode=None) -> list:
+    """
+    ALERT_IMAGE_MODE에 따라 fire_alert payload에 이미지를 붙인다.
+    return: payload 뒤에 이어 보낼 바이너리 프레임 목록(binary 모드에서만 1개)
+    """
+    mode = mode or ALERT_IMAGE_MODE
+    if image_bgr is None or mode == "none":
+        return []
+    if mode == "binary":
+        jpg = encode_jpg(image_bgr, BINARY_MAX_SIDE, BINARY_JPEG_QUALITY)
+        if not jpg:
+            return []
+        image_id = uuid.uuid4()
+        payload["image_id"] = image_id.hex
+        return [FIRE_IMAGE_MAGIC + image_id.bytes + jpg]
+    if mode == "thumb":
+        img64 = encode_jpg_b64(image_bgr, THUMB_MAX_SIDE, THUMB_JPEG_QUALITY)
+    else:
+        img64 = encode_jpg_b64(image_bgr)
+    if img64:
+        payload["image"] = img64
+    return []
+
+# ====== 감지기 업링크(장기 연결) ======
+class DetectorUplink:
+    """
+    감지기 → 서버 WS 연결 하나를 계속 유지한다.
+    - 전용 스레드의 이벤트 루프에서 동작, keepalive ping으로 죽은 연결 감지
+    - 끊기면 WS_CANDIDATES를 순서대로 시도, 전부 실패하면 지수 백오프 후 재시도
+    - 송신 큐는 재연결 사이에도 유지된다. 보낸 메시지는 inflight에 두었다가 뒤이은 ping의
+      pong이 오면(= 서버가 그 앞 프레임까지 받음) 지우고, send 실패/연결 끊김이면 큐 앞에 되돌린다
+      (at-least-once: 끊기는 순간에는 같은 메시지가 한 번 더 갈 수 있음)
+    """
+    def __init__(self, urls=None, maxlen: int = UPLINK_QUEUE_MAX):
+        self.urls = list(urls or WS_CANDIDATES)
+        self.maxlen = maxlen
+        self.pending = deque()       # 송신 대기(업링크 스레드만 변경, 다른 스레드는 _enqueue를 예약)
+        self.inflight = deque()      # 보냈지만 pong으로 확인되지 않은 메시지(업링크 스레드만 변경)
+        self.loop = asyncio.new_event_loop()
+        self._wake = asyncio.Event()
+        self._stop = asyncio.Event()
+        self.connected_url = None
+        self.sent = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self._thread = threading.Thread(target=self._run, name="uplink", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    # ---- 다른 스레드에서 호출 ----
+    def send(self, payload):
+        self.send_many([payload])
+
+    def send_many(self, payloads):
+        # str/bytes는 그대로(bytes는 바이너리 프레임), dict는 JSON 텍스트로. 직렬화는 호출 스레드에서,
+        # 큐 추가/넘침 정리는 _pump와 섞이지 않게 업링크 루프에서
+        texts = [p if isinstance(p, (str, bytes)) else json.dumps(p, ensure_ascii=False) for p in payloads]
+        self.loop.call_soon_threadsafe(self._enqueue, texts)
+
+    def close(self, timeout: float = UPLINK_FLUSH_TIMEOUT):
+        """남은 메시지를 timeout 동안 전송 시도 후 종료 (끊겨 있어도 재연결을 기다림)"""
+        deadline = time.perf_counter() + timeout
+        # 앞서 예약된 _enqueue가 모두 실행된 뒤부터 pending을 본다(콜백은 예약 순서대로 실행)
+        queued = threading.Event()
+        self.loop.call_soon_threadsafe(queued.set)
+        queued.wait(timeout)
+        while (self.pending or self.inflight) and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        left = len(self.pending) + len(self.inflight)
+        if left:
+            print(f"[Uplink] 미확인 {left}건을 남기고 종료")
+        # 한 번에 예약: 첫 콜백에서 루프가 끝나 닫히면 두 번째 예약이 실패함
+        self.loop.call_soon_threadsafe(lambda: (self._stop.set(), self._wake.set()))
+        self._thread.join(timeout=max(0.0, deadline - time.perf_counter()) + 1.0)
+
+    # ---- 업링크 스레드 ----
+    def _enqueue(self, texts):
+        for text in texts:
+            while len(self.pending) >= self.maxlen:
+                self.pending.popleft()
+                self.dropped += 1
+            self.pending.append(text)
+        self._wake.set()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._main())
+        finally:
+            self.loop.close()
+
+    async def _main(self):
+        backoff = UPLINK_BACKOFF_MIN
+        while not self._stop.is_set():
+            for url in self.urls:
+                if self._stop.is_set():
+                    break
+                try:
+                    async with websockets.connect(
+                        url.rstrip("/") + UPLINK_PATH,
+                        open_timeout=UPLINK_OPEN_TIMEOUT,
+                        ping_interval=UPLINK_PING_INTERVAL,
+                        ping_timeout=UPLINK_PING_TIMEOUT,
+                    ) as ws:
+                        self.connected_url = url
+                        backoff = UPLINK_BACKOFF_MIN
+                        print(f"[Uplink] connected: {url} (pending={len(self.pending)})")
+                        await self._pump(ws)
+                except Exception as e:
+                    print(f"[Uplink] {url} 연결 실패/끊김: {e}")
+                finally:
+                    self.connected_url = None
+            if self._stop.is_set():
+                break
+            self.reconnects += 1
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, UPLINK_BACKOFF_MAX)
+
+    async def _drain(self, ws):
+        # 서버가 보내는 graph_ack 등을 읽어 버린다(읽지 않으면 서버 쪽 송신이 막힘)
+        async for _ in ws:
+            pass
+
+    async def _pump(self, ws):
+        reader = asyncio.ensure_future(self._drain(ws))
+        try:
+            while True:
+                while self.pending:
+                    while self.pending and len(self.inflight) < UPLINK_ACK_BATCH:
+                        self.inflight.append(self.pending.popleft())
+                    for text in self.inflight:
+                        await ws.send(text)
+                    pong = await ws.ping()
+                    await asyncio.wait_for(pong, UPLINK_PING_TIMEOUT)
+                    self.sent += len(self.inflight)
+                    self.inflight.clear()
+                if self._stop.is_set():
+                    return
+                self._wake.clear()
+                if self.pending:
+                    continue
+                waker = asyncio.ensure_future(self._wake.wait())
+                done, _ = await asyncio.wait({waker, reader}, return_when=asyncio.FIRST_COMPLETED)
+                if reader in done:
+                    waker.cancel()
+                    reader.result()
+                    raise ConnectionError("server closed connection")
+        finally:
+            reader.cancel()
+            if self.inflight:
+                # 확인 못 받은 메시지는 순서 그대로 큐 앞으로
+                self.pending.extendleft(reversed(self.inflight))
+                self.inflight.clear()
+
+_uplink = None
+_uplink_lock = threading.Lock()
+
+def get_uplink() -> DetectorUplink:
+    """프로세스 공용 업링크(처음 호출 시 연결 시작)"""
+    global _uplink
+    with _uplink_lock:
+        if _uplink is None:
+            _uplink = DetectorUplink().start()
+        return _uplink
+
+def close_uplink(timeout: float = UPLINK_FLUSH_TIMEOUT):
+    global _uplink
+    with _uplink_lock:
+        up, _uplink = _uplink, None
+    if up is not None:
+        up.close(timeout)
+        print(f"[Uplink] sent={up.sent}, dropped={up.dropped}, reconnects={up.reconnects}")
+
+def send_ws_fire_any(conf: float, floor="B1", image_bgr=None):
+    """fire_alert 하나를 업링크 큐에 넣는다 (연결은 재사용)"""
     payload = {
         "kind": "fire_alert",
         "floor": floor,
         "confidence": round(float(conf), 3),
     }
-    if image_bgr is not None:
-        payload["image"] = encode_jpg_b64(image_bgr)
+    frames = attach_alert_image(payload, image_bgr)
 
-    text = json.dumps(payload, ensure_ascii=False)
-
-    last_error = None
-    for url in WS_CANDIDATES:
-        try:
-            async with websockets.connect(url, open_timeout=5, ping_interval=None) as ws:
-                await ws.send(text)
-                print(f"📤 fire_alert sent to {url}")
-                return True
-        except Exception as e:
-            print(f"WS send failed to {url}: {e}")
-            last_error = e
-    print("WS send failed to all candidates.", last_error)
-    return False
+    get_uplink().send_many([payload] + frames)
+    return True
 
 def safe_show_or_save(title: str, img, image_path: str):
     """GUI 없으면 저장으로 fallback"""
@@ -58,68 +507,968 @@ def safe_show_or_save(title: str, img, image_path: str):
     cv2.imwrite(str(out_file), img)
     print(f"(GUI 없음) 결과 이미지를 저장했습니다: {out_file}")
 
-async def broadcast_fire_at_node(floor: str, node_xy=(-18,-19), conf=0.0, image_bgr=None):
-    """fire_alert + hazard(표시용) + delete_node(경로차단) 세트 전송"""
-    def b64(img):
-        ok, buf = cv2.imencode(".jpg", img)
-        return "data:image/jpeg;base64," + base64.b64encode(buf.tobytes()).decode("ascii") if ok else None
+def broadcast_fire_at_node(floor: str, node_xy=(-18,-19), conf=0.0, image_bgr=None, incident_id=None):
+    """fire_alert + hazard(표시용) + delete_node(경로차단) 세트를 업링크 큐에 넣는다"""
+    return broadcast_fire_at_nodes(floor, [node_xy], conf, image_bgr, incident_id)
 
-    payloads = [
-        {"kind": "fire_alert", "floor": floor, "confidence": round(float(conf), 3)},
-        {"kind": "hazard", "floor": floor, "node": list(node_xy), "active": True},   # 앱이 아이콘 표시
-        {"kind": "delete_node", "floor": floor, "node": list(node_xy)},             # 경로 엔진이 노드 제거
-    ]
-    if image_bgr is not None:
-        img64 = b64(image_bgr)
-        if img64:
-            payloads[0]["image"] = img64
+def broadcast_fire_at_nodes(floor: str, nodes, conf=0.0, image_bgr=None, incident_id=None):
+    """fire_alert 1건 + 노드마다 hazard/delete_node (카메라 하나가 여러 노드를 볼 때)"""
+    payloads = [{"kind": "fire_alert", "floor": floor, "confidence": round(float(conf), 3), "incident_id": incident_id}]
+    for node_xy in nodes:
+        payloads.append({"kind": "hazard", "floor": floor, "node": list(node_xy), "active": True})   # 앱이 아이콘 표시
+        payloads.append({"kind": "delete_node", "floor": floor, "node": list(node_xy)})             # 경로 엔진이 노드 제거
+    frames = attach_alert_image(payloads[0], image_bgr)
+
+    # JSON 알림을 먼저 보내고 큰 이미지 프레임은 맨 뒤에
+    get_uplink().send_many(payloads + frames)
+    print(f"📤 fire@{floor}{list(nodes)} queued (uplink={get_uplink().connected_url})")
+    return True
+
+def send_fire_status(kind: str, floor: str, conf: float, incident_id: str, camera_id: str):
+    """진행 중 사건의 conf 갱신(fire_update) / 해제(fire_clear) 통지. 그래프는 건드리지 않는다"""
+    get_uplink().send({
+        "kind": kind, "floor": floor, "confidence": round(float(conf), 3),
+        "incident_id": incident_id, "camera": camera_id,
+    })
+    print(f"📤 {kind} {incident_id} conf={conf:.2f}")
+
+def fire_confidence(results, th: float = 0.0) -> float:
+    """한 프레임 결과에서 th를 넘는 fire 박스의 최고 conf (없으면 0.0)"""
+    high_conf = 0.0
+    for box in results.boxes:
+        cls_id = int(box.cls.item())
+        conf = float(box.conf.item())
+        label = CLASS_NAMES[cls_id] if 0 <= cls_id < len(CLASS_NAMES) else str(cls_id)
+        if label.lower() == 'fire' and conf > th:
+            high_conf = max(high_conf, conf)
+    return high_conf
+
+# ====== 카메라별 화재 상태머신 ======
+class _CamFireState:
+    __slots__ = ("hits", "ema", "active", "below_run", "last_update", "incident_id")
+    def __init__(self):
+        self.hits = deque(maxlen=RAISE_M)
+        self.ema = None
+        self.active = False
+        self.below_run = 0
+        self.last_update = 0.0
+        self.incident_id = None
+
+class FireDebouncer:
+    """
+    프레임마다 알림을 보내지 않고 카메라별로 사건 단위 이벤트만 만든다.
+    - IDLE  : 최근 RAISE_M 프레임 중 RAISE_N개가 FIRE_CONF_TH 초과 → "raise" (사건당 1회)
+    - ACTIVE: UPDATE_INTERVAL마다 conf EMA로 "update"
+              CLEAR_CONF_TH 이하가 CLEAR_FRAMES번 연속 → "clear" 후 IDLE
+    """
+    def __init__(self):
+        self.cams: Dict[str, _CamFireState] = {}
+
+    def update(self, camera_id: str, conf: float, now: float = None):
+        """return: None 또는 (event, conf, incident_id)"""
+        now = time.time() if now is None else now
+        st = self.cams.get(camera_id)
+        if st is None:
+            st = self.cams[camera_id] = _CamFireState()
+
+        st.ema = conf if st.ema is None else st.ema + CONF_EMA_ALPHA * (conf - st.ema)
+        st.hits.append(conf > FIRE_CONF_TH)
+
+        if not st.active:
+            if sum(st.hits) >= RAISE_N:
+                st.active = True
+                st.below_run = 0
+                st.last_update = now
+                st.incident_id = f"{camera_id}-{int(now * 1000)}"
+                return ("raise", conf, st.incident_id)
+            return None
+
+        st.below_run = st.below_run + 1 if conf <= CLEAR_CONF_TH else 0
+        if st.below_run >= CLEAR_FRAMES:
+            incident_id = st.incident_id
+            st.active = False
+            st.hits.clear()
+            st.incident_id = None
+            return ("clear", st.ema, incident_id)
+        if now - st.last_update >= UPDATE_INTERVAL:
+            st.last_update = now
+            return ("update", st.ema, st.incident_id)
+        return None
+
+# ====== 추론 전 필터 ======
+class FramePrefilter:
+    """
+    카메라 1대용 cascade 1단계. check(frame)이 True인 프레임만 추론한다.
+    - 불꽃: HSV 불꽃색 & 움직임(깜빡임) 화소 비율 ≥ FLAME_RATIO_MIN
+    - 연기: 저채도 & 움직임 화소 비율 ≥ SMOKE_RATIO_MIN
+    - 통과 후 PREFILTER_HOLD 프레임 유지, 그 외에도 PREFILTER_FORCE_EVERY마다 강제 통과
+    """
+    __slots__ = ("bg", "hold", "since_infer", "passed", "skipped", "forced")
+    def __init__(self):
+        self.bg = None
+        self.hold = 0
+        self.since_infer = 0
+        self.passed = 0
+        self.skipped = 0
+        self.forced = 0
+
+    def scores(self, frame):
+        """return: (움직이는 불꽃색 비율, 움직이는 연기색 비율). 첫 프레임은 (1.0, 1.0)"""
+        h, w = frame.shape[:2]
+        scale = PREFILTER_SIDE / max(h, w)
+        small = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA) \
+            if scale < 1 else frame
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+        if self.bg is None or self.bg.shape != gray.shape:
+            self.bg = gray
+            return 1.0, 1.0
+        moving = cv2.absdiff(gray, self.bg) > MOTION_DIFF_TH
+        cv2.accumulateWeighted(gray, self.bg, BG_ALPHA)
 
-    text_list = [json.dumps(p, ensure_ascii=False) for p in payloads]
+        hue, sat, val = cv2.split(cv2.cvtColor(small, cv2.COLOR_BGR2HSV))
+        flame = ((hue <= FLAME_HUE_MAX) | (hue >= FLAME_HUE_WRAP)) & (sat >= FLAME_SAT_MIN) & (val >= FLAME_VAL_MIN)
+        smoke = (sat <= SMOKE_SAT_MAX) & (val >= SMOKE_VAL_RANGE[0]) & (val <= SMOKE_VAL_RANGE[1])
+        n = moving.size
+        return float(np.count_nonzero(flame & moving)) / n, float(np.count_nonzero(smoke & moving)) / n
 
-    for url in WS_CANDIDATES:
+    def check(self, frame) -> bool:
+        flame, smoke = self.scores(frame)
+        if flame >= FLAME_RATIO_MIN or smoke >= SMOKE_RATIO_MIN:
+            self.hold = PREFILTER_HOLD
+        elif self.hold > 0:
+            self.hold -= 1
+        elif self.since_infer + 1 >= PREFILTER_FORCE_EVERY:
+            self.forced += 1
+        else:
+            self.since_infer += 1
+            self.skipped += 1
+            return False
+        self.since_infer = 0
+        self.passed += 1
+        return True
+
+    def summary(self) -> str:
+        total = self.passed + self.skipped
+        return (f"passed={self.passed}/{total} ({self.passed / total * 100 if total else 0:.0f}%), "
+                f"forced={self.forced}")
+
+# ====== 카메라 레지스트리 ======
+class CameraConfig:
+    __slots__ = ("id", "floor", "nodes", "source")
+    def __init__(self, cam_id: str, floor: str, nodes, source=None):
+        self.id = cam_id
+        self.floor = floor
+        self.nodes = [tuple(n) for n in nodes]
+        self.source = source
+
+    def __repr__(self):
+        return f"CameraConfig({self.id!r}, floor={self.floor!r}, nodes={self.nodes}, source={self.source!r})"
+
+# 레지스트리에 없는 카메라(단일 이미지/스트림 모드)의 기본 매핑
+DEFAULT_CAMERA = CameraConfig(DEFAULT_CAMERA_ID, "B1", [(-18,-19)])
+
+def load_camera_registry(path: str = CAMERA_REGISTRY) -> Dict[str, CameraConfig]:
+    """
+    cameras.json 형식:
+      {"cameras": [{"id": "b1_cam01", "floor": "B1", "nodes": [[-18,-19]], "source": "test_images/*.jpg"}, ...]}
+    - source: 이미지 glob, 동영상 경로, RTSP URL 또는 장치 번호. 상대 경로는 파일 위치 기준
+    - nodes가 해당 층 원본 그래프에 없으면 경고(delete_node 대상이 틀리지 않도록)
+    """
+    from final import FLOORS
+
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+
+    base = Path(path).resolve().parent
+    cams: Dict[str, CameraConfig] = {}
+    for entry in raw.get("cameras", []):
+        cam_id = str(entry["id"])
+        floor = entry["floor"]
+        if floor not in KNOWN_FLOORS:
+            raise ValueError(f"[Camera] {cam_id}: 알 수 없는 층 {floor!r}")
+        if cam_id in cams:
+            raise ValueError(f"[Camera] 중복 id: {cam_id}")
+        nodes = [(int(n[0]), int(n[1])) for n in entry.get("nodes", [])]
+        if not nodes:
+            raise ValueError(f"[Camera] {cam_id}: nodes가 비어 있습니다")
+
+        fv = FLOORS.get(floor)
+        for n in nodes:
+            if fv is None or fv.node_index(n) < 0:
+                print(f"[Camera] 경고: {cam_id} 노드 {n} 는 {floor} 그래프에 없습니다")
+
+        source = entry.get("source")
+        if isinstance(source, str) and not source.isdigit() and "://" not in source \
+                and not os.path.isabs(source):
+            source = str(base / source)
+        cams[cam_id] = CameraConfig(cam_id, floor, nodes, source)
+    return cams
+
+# ====== 파이프라인 단계 ======
+# decode(스레드 풀) → infer(배치) → post(plot/판정) → save / alert
+# 단계 사이는 크기 제한 Queue로 연결하고, 종료는 _STOP 센티넬을 흘려보낸다.
+# 단계가 예외로 죽어도 _STOP은 finally에서 항상 하류로 보내고(_stage_thread가 입력 큐도 비움),
+# 예외는 모아 두었다가 run_* 호출자에게 다시 던진다.
+_STOP = object()
+
+def _stage_thread(name: str, errors: list, stop_event: threading.Event, in_q, target, *args) -> threading.Thread:
+    def run():
         try:
-            async with websockets.connect(url, open_timeout=5, ping_interval=None) as ws:
-                for t in text_list:
-                    await ws.send(t)
-                print(f"📤 fire@{node_xy} broadcast to {url}")
-                return True
+            target(*args)
         except Exception as e:
-            print(f"WS send failed to {url}: {e}")
-    return False
-    
-def main():
-    image_paths = glob.glob(IMAGE_GLOB)
-    if not image_paths:
-        print("테스트 이미지가 없습니다:", IMAGE_GLOB)
-        return
+            errors.append((name, e))
+            print(f"[Pipeline] {name} 단계 오류: {e!r}")
+            stop_event.set()                 # 상류가 입력을 그만 만들게
+            if in_q is not None:             # 상류가 put에서 막히지 않게 _STOP까지 비움
+                while in_q.get() is not _STOP:
+                    pass
+    return threading.Thread(target=run, name=name, daemon=True)
+
+def _raise_stage_error(errors: list):
+    if errors:
+        name, e = errors[0]
+        raise RuntimeError(f"파이프라인 {name} 단계 실패: {e!r}") from e
+
+def _decode_stage(image_paths, out_q: queue.Queue, workers: int = DECODE_WORKERS,
+                  stop_event: threading.Event = None):
+    """imread를 스레드 풀에서 병렬 실행. 입력 순서는 유지, 선행 제출은 workers*2개로 제한"""
+    pending = deque()
 
-    for image_path in image_paths:
-        image = cv2.imread(image_path)
+    def flush_one():
+        path, fut = pending.popleft()
+        image = fut.result()
         if image is None:
-            print("skip unreadable:", image_path)
+            print("skip unreadable:", path)
+            return
+        out_q.put((path, image))
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode") as pool:
+            for path in image_paths:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                pending.append((path, pool.submit(cv2.imread, path)))
+                if len(pending) >= workers * 2:
+                    flush_one()
+            while pending:
+                flush_one()
+    finally:
+        out_q.put(_STOP)
+
+def _infer_stage(in_q: queue.Queue, out_q: queue.Queue, batch_size: int = BATCH_SIZE,
+                 camera_id: str = DEFAULT_CAMERA_ID):
+    """큐에서 최대 batch_size개를 모아 model([...]) 한 번으로 추론"""
+    done = False
+    try:
+        while not done:
+            item = in_q.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.perf_counter() + BATCH_WAIT
+            while len(batch) < batch_size:
+                remain = deadline - time.perf_counter()
+                try:
+                    item = in_q.get(timeout=max(remain, 0.0)) if remain > 0 else in_q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    done = True
+                    break
+                batch.append(item)
+
+            results = get_model()([img for _, img in batch])
+            for (path, img), r in zip(batch, results):
+                out_q.put((camera_id, path, img, r))
+    except Exception:
+        if done:                             # 입력의 _STOP은 이미 받았으므로 더 비울 것이 없음
+            in_q.put(_STOP)
+        raise
+    finally:
+        out_q.put(_STOP)
+
+def _post_stage(in_q: queue.Queue, save_q: queue.Queue, alert_q: queue.Queue, stats: dict,
+                save_all: bool = True):
+    """결과 시각화 + fire 판정(카메라별 디바운스). 저장/알림은 각 큐로 넘기고 기다리지 않는다."""
+    debouncer = FireDebouncer()
+    try:
+        while True:
+            item = in_q.get()
+            if item is _STOP:
+                break
+            camera_id, path, _img, results = item
+            stats["frames"] += 1
+            annotated = results.plot()
+            conf = fire_confidence(results)
+            is_fire = conf > FIRE_CONF_TH
+            if is_fire:
+                print(f"[🔥] {os.path.basename(path)}: 화재 감지 (conf={conf:.2f})")
+            event = debouncer.update(camera_id, conf)
+            if event is not None:
+                kind, ev_conf, incident_id = event
+                # raise에만 이미지 첨부(사건당 1회)
+                alert_q.put((kind, camera_id, ev_conf, incident_id, annotated if kind == "raise" else None))
+            if save_all or is_fire:
+                save_q.put((path, annotated))
+    finally:
+        save_q.put(_STOP)
+        alert_q.put(_STOP)
+
+def _save_stage(in_q: queue.Queue):
+    while True:
+        item = in_q.get()
+        if item is _STOP:
+            break
+        path, annotated = item
+        safe_show_or_save("Result", annotated, path)
+
+def _alert_stage(in_q: queue.Queue, cameras: Dict[str, CameraConfig] = None):
+    """이미지 인코딩 후 업링크 큐에 넣기 (추론 스레드와 분리). 층/노드는 카메라 레지스트리 기준"""
+    cameras = cameras or {}
+    while True:
+        item = in_q.get()
+        if item is _STOP:
+            break
+        kind, camera_id, conf, incident_id, annotated = item
+        cam = cameras.get(camera_id, DEFAULT_CAMERA)
+        if kind == "raise":
+            # 앱으로 화재 알림 전송 (ALERT_IMAGE_MODE에 따른 이미지 포함)
+            broadcast_fire_at_nodes(cam.floor, cam.nodes, conf=conf, image_bgr=annotated,
+                                    incident_id=incident_id)
+        else:
+            send_fire_status(f"fire_{kind}", cam.floor, conf, incident_id, camera_id)
+
+def run_pipeline(image_paths, batch_size: int = BATCH_SIZE, decode_workers: int = DECODE_WORKERS):
+    """이미지 목록을 파이프라인으로 처리. return: (처리 프레임 수, 경과 시간 초)"""
+    decoded_q = queue.Queue(maxsize=QUEUE_MAX)
+    infer_q   = queue.Queue(maxsize=QUEUE_MAX)
+    save_q    = queue.Queue(maxsize=QUEUE_MAX)
+    alert_q   = queue.Queue(maxsize=QUEUE_MAX)
+
+    stats = {"frames": 0}
+    errors = []
+    stop = threading.Event()
+
+    t0 = time.perf_counter()
+    threads = [
+        _stage_thread("decode", errors, stop, None, _decode_stage, image_paths, decoded_q, decode_workers, stop),
+        _stage_thread("infer", errors, stop, decoded_q, _infer_stage, decoded_q, infer_q, batch_size),
+        _stage_thread("post", errors, stop, infer_q, _post_stage, infer_q, save_q, alert_q, stats),
+        _stage_thread("save", errors, stop, save_q, _save_stage, save_q),
+        _stage_thread("alert", errors, stop, alert_q, _alert_stage, alert_q),
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    _raise_stage_error(errors)
+    return stats["frames"], time.perf_counter() - t0
+
+# ====== 스트림 입력 ======
+class FrameSource:
+    """
+    cv2.VideoCapture 기반 스트림 입력.
+    - 별도 스레드가 계속 읽고, 최신 FRAME_QUEUE_MAX개만 보관(초과분은 오래된 것부터 버림)
+    - 추론 지연(EMA) × 원본 fps 만큼 grab()으로 건너뛰어 디코딩 비용도 줄인다
+    - 동영상 파일은 원본 fps 속도로 재생해 카메라와 같은 조건을 만든다
+    """
+    def __init__(self, source, maxlen: int = FRAME_QUEUE_MAX):
+        if isinstance(source, str) and source.isdigit():
+            source = int(source)
+        self.source = source
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"스트림을 열 수 없습니다: {source}")
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frames = deque(maxlen=maxlen)
+        self.cond = threading.Condition()
+        self.ended = False
+        self.stop_event = threading.Event()
+        self.infer_latency = 0.0
+        self.read_count = 0
+        self.skipped = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="grab", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self._thread.join(timeout=2.0)
+        self.cap.release()
+
+    def report_latency(self, seconds: float):
+        """추론 단계가 프레임당 소요 시간을 알려주면 건너뛰기 폭이 조정된다"""
+        if self.infer_latency <= 0.0:
+            self.infer_latency = seconds
+        else:
+            self.infer_latency += LATENCY_EMA_ALPHA * (seconds - self.infer_latency)
+
+    def skip_count(self) -> int:
+        return min(MAX_FRAME_SKIP, max(0, math.ceil(self.infer_latency * self.fps) - 1))
+
+    def _run(self):
+        period = 1.0 / self.fps
+        next_t = time.perf_counter()
+        try:
+            while not self.stop_event.is_set():
+                skip = self.skip_count()
+                for _ in range(skip):
+                    if not self.cap.grab():
+                        return
+                    self.read_count += 1
+                    self.skipped += 1
+                ok, frame = self.cap.read()
+                if not ok:
+                    return
+                self.read_count += 1
+                with self.cond:
+                    if len(self.frames) == self.frames.maxlen:
+                        self.dropped += 1
+                    self.frames.append((self.read_count, time.perf_counter(), frame))
+                    self.cond.notify()
+                if self.is_file:
+                    next_t += period * (skip + 1)
+                    delay = next_t - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_t = time.perf_counter()
+        finally:
+            with self.cond:
+                self.ended = True
+                self.cond.notify_all()
+
+    def latest(self, timeout: float = 1.0):
+        """가장 최신 프레임 하나를 꺼내고 나머지는 버림. 스트림 종료 시 None"""
+        with self.cond:
+            while not self.frames:
+                if self.ended:
+                    return None
+                self.cond.wait(timeout)
+            item = self.frames.pop()
+            self.dropped += len(self.frames)
+            self.frames.clear()
+            return item
+
+    def poll(self):
+        """기다리지 않는 latest(). 준비된 프레임이 없으면 None"""
+        with self.cond:
+            if not self.frames:
+                return None
+            item = self.frames.pop()
+            self.dropped += len(self.frames)
+            self.frames.clear()
+            return item
+
+    @property
+    def exhausted(self) -> bool:
+        return self.ended and not self.frames
+
+class ImageListSource:
+    """정지 이미지 목록을 FrameSource와 같은 인터페이스로 제공(버리지 않고 순서대로)"""
+    def __init__(self, image_paths, maxlen: int = FRAME_QUEUE_MAX):
+        self.paths = list(image_paths)
+        self.frames = deque()
+        self.maxlen = maxlen
+        self.cond = threading.Condition()
+        self.ended = False
+        self.stop_event = threading.Event()
+        self.infer_latency = 0.0
+        self.read_count = 0
+        self.skipped = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="imread", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+        self._thread.join(timeout=2.0)
+
+    def report_latency(self, seconds: float):
+        self.infer_latency = seconds
+
+    def _run(self):
+        try:
+            for path in self.paths:
+                image = cv2.imread(path)
+                if image is None:
+                    print("skip unreadable:", path)
+                    continue
+                self.read_count += 1
+                with self.cond:
+                    while len(self.frames) >= self.maxlen and not self.stop_event.is_set():
+                        self.cond.wait(0.5)
+                    if self.stop_event.is_set():
+                        return
+                    self.frames.append((self.read_count, time.perf_counter(), image))
+        finally:
+            with self.cond:
+                self.ended = True
+
+    def poll(self):
+        with self.cond:
+            if not self.frames:
+                return None
+            item = self.frames.popleft()
+            self.cond.notify_all()
+            return item
+
+    @property
+    def exhausted(self) -> bool:
+        return self.ended and not self.frames
+
+def open_source(source):
+    """이미지 glob이면 ImageListSource, 아니면 FrameSource"""
+    if isinstance(source, str) and any(ch in source for ch in "*?["):
+        return ImageListSource(sorted(glob.glob(source)))
+    return FrameSource(source)
+
+def _stream_infer_stage(src: FrameSource, out_q: queue.Queue, name: str, gate: FramePrefilter = None):
+    """최신 프레임만 추론. 지연을 FrameSource에 되돌려 건너뛰기 폭을 맞춘다"""
+    try:
+        while not src.stop_event.is_set():
+            item = src.latest()
+            if item is None:
+                break
+            idx, grabbed_at, frame = item
+            t0 = time.perf_counter()
+            if gate is not None and not gate.check(frame):
+                src.report_latency(time.perf_counter() - t0)
+                continue
+            results = get_model()([frame])[0]
+            src.report_latency(time.perf_counter() - t0)
+            out_q.put((name, f"{name}_{idx:06d}.jpg", frame, results))
+    finally:
+        out_q.put(_STOP)
+
+def run_stream(source, save_all: bool = STREAM_SAVE_ALL):
+    """동영상/카메라 스트림 처리. return: (처리 프레임 수, 경과 시간 초, FrameSource)"""
+    src = FrameSource(source).start()
+    name = Path(str(source)).stem if src.is_file else f"cam{source}"
+    infer_q = queue.Queue(maxsize=QUEUE_MAX)
+    save_q  = queue.Queue(maxsize=QUEUE_MAX)
+    alert_q = queue.Queue(maxsize=QUEUE_MAX)
+    stats = {"frames": 0}
+    gate = FramePrefilter() if PREFILTER else None
+
+    errors = []
+    stop = src.stop_event
+
+    t0 = time.perf_counter()
+    threads = [
+        _stage_thread("infer", errors, stop, None, _stream_infer_stage, src, infer_q, name, gate),
+        _stage_thread("post", errors, stop, infer_q, _post_stage, infer_q, save_q, alert_q, stats, save_all),
+        _stage_thread("save", errors, stop, save_q, _save_stage, save_q),
+        _stage_thread("alert", errors, stop, alert_q, _alert_stage, alert_q),
+    ]
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(timeout=0.5)
+    except KeyboardInterrupt:
+        print("[Stream] 중지 요청")
+        src.stop_event.set()
+        for t in threads:
+            t.join()
+    finally:
+        src.stop()
+    if gate is not None:
+        print(f"[Prefilter] {name}: {gate.summary()}")
+    _raise_stage_error(errors)
+    return stats["frames"], time.perf_counter() - t0, src
+
+# ====== 다중 카메라 스케줄러 ======
+class _CamSlot:
+    __slots__ = ("cfg", "source", "busy", "gate")
+    def __init__(self, cfg: CameraConfig, source):
+        self.cfg = cfg
+        self.source = source
+        self.busy = False   # 추론 중인 프레임이 있으면 True (카메라당 최대 1프레임 in-flight)
+        self.gate = FramePrefilter() if PREFILTER else None
+
+def _schedule_stage(slots, work_q: queue.Queue, batch_size: int, workers: int, stop_event: threading.Event):
+    """
+    라운드로빈으로 카메라마다 최신 프레임 1장씩 모아 배치를 만든다.
+    - 한 배치에 같은 카메라는 한 번만 → 카메라 수가 많아도 공정
+    - 추론 중인 카메라는 건너뛰어 오래된 프레임이 쌓이지 않는다
+    - 필터(FramePrefilter)에서 걸러진 프레임은 배치에 넣지 않음 → 추론량이 카메라 수가 아닌 활동량에 비례
+    """
+    n = len(slots)
+    rr = 0
+    try:
+        while not stop_event.is_set():
+            batch = []
+            for k in range(n):
+                slot = slots[(rr + k) % n]
+                if slot.busy:
+                    continue
+                item = slot.source.poll()
+                if item is None:
+                    continue
+                if slot.gate is not None and not slot.gate.check(item[2]):
+                    continue
+                slot.busy = True
+                batch.append((slot, item))
+                if len(batch) >= batch_size:
+                    break
+            rr = (rr + 1) % n
+
+            if batch:
+                work_q.put(batch)
+            elif all(s.source.exhausted and not s.busy for s in slots):
+                break
+            else:
+                time.sleep(SCHED_IDLE_SLEEP)
+    finally:
+        for _ in range(workers):
+            work_q.put(_STOP)
+
+def _camera_worker(idx: int, work_q: queue.Queue, out_q: queue.Queue, done_counter: dict, lock: threading.Lock):
+    # 모델 객체는 스레드 간 공유하지 않는다(워커마다 인스턴스)
+    try:
+        worker_model = get_model() if idx == 0 else load_backend()
+        while True:
+            batch = work_q.get()
+            if batch is _STOP:
+                break
+            t0 = time.perf_counter()
+            results = worker_model([frame for _, (_, _, frame) in batch])
+            elapsed = time.perf_counter() - t0
+            for (slot, (fidx, _ts, frame)), r in zip(batch, results):
+                slot.source.report_latency(elapsed)
+                slot.busy = False
+                out_q.put((slot.cfg.id, f"{slot.cfg.id}_{fidx:06d}.jpg", frame, r))
+    finally:
+        # 마지막으로 끝난 워커(예외 포함)가 하류에 _STOP
+        with lock:
+            done_counter["n"] += 1
+            if done_counter["n"] == done_counter["total"]:
+                out_q.put(_STOP)
+
+def run_cameras(cameras: Dict[str, CameraConfig], workers: int = INFER_WORKERS,
+                batch_size: int = BATCH_SIZE, save_all: bool = STREAM_SAVE_ALL):
+    """레지스트리의 모든 카메라를 공유 워커 풀로 처리. return: (처리 프레임 수, 경과 시간 초)"""
+    slots = []
+    for cfg in cameras.values():
+        if cfg.source is None:
             continue
+        try:
+            slots.append(_CamSlot(cfg, open_source(cfg.source).start()))
+        except Exception as e:
+            print(f"[Camera] {cfg.id} 입력 열기 실패, 제외: {e}")
+    if not slots:
+        print("[Camera] 사용할 수 있는 카메라가 없습니다")
+        return 0, 0.0
+    print(f"[Camera] cameras={len(slots)}, workers={workers}, batch={batch_size}")
 
-        results = model(image)[0]
-        annotated = results.plot()
+    stop_event = threading.Event()
+    work_q  = queue.Queue(maxsize=workers)   # 워커 수만큼만 선행 → 배치가 늘 최신 프레임
+    infer_q = queue.Queue(maxsize=QUEUE_MAX)
+    save_q  = queue.Queue(maxsize=QUEUE_MAX)
+    alert_q = queue.Queue(maxsize=QUEUE_MAX)
+    stats = {"frames": 0}
+    done_counter = {"n": 0, "total": workers}
+    lock = threading.Lock()
 
-        # fire 판정
-        fire_detected = False
-        high_conf = 0.0
-        for box in results.boxes:
-            cls_id = int(box.cls.item())
-            conf = float(box.conf.item())
-            label = CLASS_NAMES[cls_id] if 0 <= cls_id < len(CLASS_NAMES) else str(cls_id)
-            if label.lower() == 'fire' and conf > 0.5:
-                fire_detected = True
-                high_conf = max(high_conf, conf)
+    errors = []
+
+    t0 = time.perf_counter()
+    threads = [_stage_thread("sched", errors, stop_event, None,
+                             _schedule_stage, slots, work_q, batch_size, workers, stop_event)]
+    threads += [_stage_thread(f"infer-{i}", errors, stop_event, work_q,
+                              _camera_worker, i, work_q, infer_q, done_counter, lock) for i in range(workers)]
+    threads += [
+        _stage_thread("post", errors, stop_event, infer_q, _post_stage, infer_q, save_q, alert_q, stats, save_all),
+        _stage_thread("save", errors, stop_event, save_q, _save_stage, save_q),
+        _stage_thread("alert", errors, stop_event, alert_q, _alert_stage, alert_q, cameras),
+    ]
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(timeout=0.5)
+    except KeyboardInterrupt:
+        print("[Camera] 중지 요청")
+        stop_event.set()
+        for t in threads:
+            t.join()
+    finally:
+        for slot in slots:
+            slot.source.stop()
+            if slot.gate is not None:
+                print(f"[Prefilter] {slot.cfg.id}: {slot.gate.summary()}")
+    _raise_stage_error(errors)
+    return stats["frames"], time.perf_counter() - t0
+
+# ====== 벤치마크 ======
+BENCH_WARMUP     = 3                 # 측정 전 반복 수
+BENCH_ITERS      = 10                # 측정 반복 수(반복마다 전체 프레임 세트 1회)
+BENCH_BATCHES    = (1, 2, 4, 8)
+BENCH_SIZES      = (320, 480, 640)
+BENCH_SYNTH_SIZE = (720, 1280)       # 합성 프레임 (h, w)
+BENCH_STAGES     = ("decode", "preprocess", "inference", "postprocess", "plot", "encode")
+BENCH_RSS_INTERVAL = 0.01            # 조합별 최대 RSS 샘플링 주기(초)
+
+def _current_rss_mb():
+    """현재 RSS(MB). 측정 불가 환경이면 None
+    (ru_maxrss는 프로세스 전체 최대값이라 조합이 여러 개면 앞 조합의 최대가 계속 찍힘)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+class _RssPeak:
+    """with 구간 동안 현재 RSS를 주기적으로 재서 구간 최대/시작값을 기록"""
+    def __init__(self, interval: float = BENCH_RSS_INTERVAL):
+        self.interval = interval
+        self.start_mb = self.peak_mb = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        v = _current_rss_mb()
+        if v is not None:
+            self.peak_mb = v if self.peak_mb is None else max(self.peak_mb, v)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start_mb = _current_rss_mb()
+        self._sample()
+        self._thread = threading.Thread(target=self._loop, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
 
-        if fire_detected:
-            print(f"[🔥] {os.path.basename(image_path)}: 화재 감지 (conf={high_conf:.2f})")
-            # 앱으로 화재 알림 전송 (Base64 이미지 포함)
-            asyncio.run(broadcast_fire_at_node(floor="B1", node_xy=(-18,-19), conf=high_conf, image_bgr=annotated))
+def _bench_inputs(image_glob: str = None, synthetic: int = 0):
+    """디스크 I/O를 빼고 디코딩만 재기 위해 JPEG 바이트를 메모리에 올려둔다"""
+    if synthetic:
+        rng = np.random.default_rng(0)
+        h, w = BENCH_SYNTH_SIZE
+        frames = []
+        for _ in range(synthetic):
+            img = rng.integers(0, 255, (h, w, 3), dtype=np.uint8)
+            frames.append(encode_jpg(img, quality=90))
+        return frames
+    frames = []
+    for path in sorted(glob.glob(image_glob or IMAGE_GLOB)):
+        with open(path, "rb") as f:
+            frames.append(f.read())
+    return frames
+
+def _fmt_mb(v):
+    return "n/a" if v is None else f"{v:.0f}MB"
+
+def _percentile(values, q):
+    return float(np.percentile(np.asarray(values), q)) if values else 0.0
+
+def bench_config(backend, jpegs, batch_size: int, warmup: int = BENCH_WARMUP, iters: int = BENCH_ITERS):
+    """한 (백엔드, 입력 크기, 배치) 조합 측정. 지연은 배치 하나가 디코딩~인코딩을 마치는 시간"""
+    stage_tot = {k: 0.0 for k in BENCH_STAGES}
+    latencies = []
+    frames_done = 0
+    wall = 0.0
+    with _RssPeak() as rss:
+        for it in range(warmup + iters):
+            measure = it >= warmup
+            t_iter = time.perf_counter()
+            for i in range(0, len(jpegs), batch_size):
+                chunk = jpegs[i:i + batch_size]
+                t0 = time.perf_counter()
+                imgs = [cv2.imdecode(np.frombuffer(b, np.uint8), cv2.IMREAD_COLOR) for b in chunk]
+                t1 = time.perf_counter()
+                results, timing = backend.run_timed(imgs)
+                t2 = time.perf_counter()
+                annotated = [r.plot() for r in results]
+                for r in results:
+                    fire_confidence(r)
+                t3 = time.perf_counter()
+                for a in annotated:
+                    encode_jpg(a)
+                t4 = time.perf_counter()
+                if measure:
+                    stage_tot["decode"] += t1 - t0
+                    for k, v in timing.items():
+                        stage_tot[k] += v
+                    stage_tot["plot"] += t3 - t2
+                    stage_tot["encode"] += t4 - t3
+                    latencies.append(t4 - t0)
+                    frames_done += len(chunk)
+            if measure:
+                wall += time.perf_counter() - t_iter
+    per_frame = {k: (v / frames_done * 1000.0 if frames_done else 0.0) for k, v in stage_tot.items()}
+    return {
+        "batch": batch_size,
+        "frames": frames_done,
+        "fps": frames_done / wall if wall > 0 else 0.0,
+        "latency_ms_p50": _percentile(latencies, 50) * 1000.0,
+        "latency_ms_p99": _percentile(latencies, 99) * 1000.0,
+        "stage_ms_per_frame": per_frame,
+        # 이 조합 실행 중 최대 RSS와 시작 대비 증가분(이전 조합의 최대값이 섞이지 않음)
+        "peak_rss_mb": rss.peak_mb,
+        "rss_delta_mb": (rss.peak_mb - rss.start_mb) if rss.peak_mb is not None and rss.start_mb is not None else None,
+    }
+
+def run_benchmark(backend_name: str = None, image_glob: str = None, synthetic: int = 0,
+                  batches=BENCH_BATCHES, sizes=BENCH_SIZES, warmup: int = BENCH_WARMUP,
+                  iters: int = BENCH_ITERS, out_path: str = None):
+    """입력 크기 × 배치 크기 조합을 측정해 JSON으로 저장. return: 결과 dict"""
+    backend_name = backend_name or BACKEND
+    jpegs = _bench_inputs(image_glob, synthetic)
+    if not jpegs:
+        raise RuntimeError("벤치마크 입력이 없습니다")
+    report = {
+        "backend": backend_name,
+        "int8": ONNX_INT8 if backend_name == "onnx" else False,
+        "inputs": "synthetic" if synthetic else (image_glob or IMAGE_GLOB),
+        "n_frames": len(jpegs),
+        "warmup": warmup, "iters": iters,
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": [],
+    }
+    for imgsz in sizes:
+        backend = load_backend(backend_name, imgsz)
+        for bs in batches:
+            row = bench_config(backend, jpegs, bs, warmup, iters)
+            row["imgsz"] = imgsz
+            report["runs"].append(row)
+            print(f"[Bench] {backend_name} imgsz={imgsz} batch={bs}: fps={row['fps']:.2f}, "
+                  f"p50={row['latency_ms_p50']:.1f}ms, p99={row['latency_ms_p99']:.1f}ms, "
+                  f"infer={row['stage_ms_per_frame']['inference']:.1f}ms/f, "
+                  f"rss={_fmt_mb(row['peak_rss_mb'])} (+{_fmt_mb(row['rss_delta_mb'])})")
+    if out_path is None:
+        out_path = str(Path(__file__).with_name(f"fire_bench_{backend_name}_{time.strftime('%Y%m%d_%H%M%S')}.json"))
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[Bench] saved {out_path}")
+    return report
+
+# ====== 백엔드 일치 검사 ======
+def boxes_np(results):
+    """torch/onnx 결과 공통: (xyxy[N,4], conf[N], cls[N]) numpy 배열"""
+    b = results.boxes
+    to_np = lambda x: x.cpu().numpy() if hasattr(x, "cpu") else np.asarray(x)
+    return to_np(b.xyxy).reshape(-1, 4), to_np(b.conf).reshape(-1), to_np(b.cls).reshape(-1).astype(int)
+
+def _iou(a, b):
+    x1, y1 = np.maximum(a[0], b[:, 0]), np.maximum(a[1], b[:, 1])
+    x2, y2 = np.minimum(a[2], b[:, 2]), np.minimum(a[3], b[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = lambda r: (r[..., 2] - r[..., 0]) * (r[..., 3] - r[..., 1])
+    return inter / (area(a) + area(b) - inter + 1e-9)
+
+def parity_check(image_glob: str = IMAGE_GLOB, candidate: str = "onnx", iou_th: float = 0.5):
+    """
+    torch 결과를 기준으로 candidate 백엔드를 test_images에서 비교.
+    - 박스 매칭: 같은 클래스 + IoU ≥ iou_th
+    - 화재 판정(fire_confidence > FIRE_CONF_TH) 일치 여부와 최대 fire conf 차이
+    """
+    ref, cand = load_backend("torch"), load_backend(candidate)
+    paths = sorted(glob.glob(image_glob))
+    matched = total = agree = 0
+    max_dconf = 0.0
+    for path in paths:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        r_ref, r_cand = ref([img])[0], cand([img])[0]
+        rx, rc, rk = boxes_np(r_ref)
+        cx, cc, ck = boxes_np(r_cand)
+        for i in range(len(rc)):
+            total += 1
+            same = ck == rk[i]
+            if same.any() and (_iou(rx[i], cx[same]) >= iou_th).any():
+                matched += 1
+        f_ref, f_cand = fire_confidence(r_ref), fire_confidence(r_cand)
+        agree += (f_ref > FIRE_CONF_TH) == (f_cand > FIRE_CONF_TH)
+        max_dconf = max(max_dconf, abs(f_ref - f_cand))
+        print(f"[Parity] {os.path.basename(path)}: torch={len(rc)} boxes fire={f_ref:.3f} | "
+              f"{candidate}={len(cc)} boxes fire={f_cand:.3f}")
+    report = {
+        "images": len(paths), "box_recall": matched / total if total else 1.0,
+        "fire_decision_agree": agree / len(paths) if paths else 1.0, "max_fire_conf_diff": max_dconf,
+    }
+    print("[Parity]", json.dumps(report))
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="YOLO 화재 감지")
+    parser.add_argument("--source", default=VIDEO_SOURCE,
+                        help="동영상 경로/RTSP URL/장치 번호. 생략 시 IMAGE_GLOB 이미지 처리")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="배치 크기")
+    parser.add_argument("--cameras", nargs="?", const=CAMERA_REGISTRY, default=None,
+                        help="카메라 레지스트리(json)로 다중 카메라 실행")
+    parser.add_argument("--workers", type=int, default=INFER_WORKERS, help="다중 카메라 추론 워커 수")
+    parser.add_argument("--parity", action="store_true", help="torch 대비 onnx 백엔드 결과 비교 후 종료")
+    parser.add_argument("--bench", action="store_true", help="벤치마크 실행 후 종료")
+    parser.add_argument("--backend", default=None, help="벤치마크 백엔드(torch/onnx), 기본 BACKEND")
+    parser.add_argument("--bench-batches", default=",".join(map(str, BENCH_BATCHES)))
+    parser.add_argument("--bench-sizes", default=",".join(map(str, BENCH_SIZES)))
+    parser.add_argument("--bench-iters", type=int, default=BENCH_ITERS)
+    parser.add_argument("--bench-warmup", type=int, default=BENCH_WARMUP)
+    parser.add_argument("--bench-out", default=None, help="결과 JSON 경로")
+    parser.add_argument("--synthetic", type=int, default=0, help="test_images 대신 합성 프레임 N장 사용")
+    args = parser.parse_args()
+
+    if args.parity:
+        parity_check(IMAGE_GLOB, "onnx")
+        return
+    if args.bench:
+        run_benchmark(args.backend, IMAGE_GLOB, args.synthetic,
+                      batches=[int(x) for x in args.bench_batches.split(",")],
+                      sizes=[int(x) for x in args.bench_sizes.split(",")],
+                      warmup=args.bench_warmup, iters=args.bench_iters, out_path=args.bench_out)
+        return
+
+    get_uplink()  # 첫 알림 전에 미리 연결(백그라운드) → 그동안 모델 로드
+    get_model()
+    print(f"[Startup] cold start {time.perf_counter() - _BOOT_T0:.2f}s")
+
+    try:
+        if args.cameras:
+            cameras = load_camera_registry(args.cameras)
+            n, elapsed = run_cameras(cameras, workers=args.workers, batch_size=args.batch)
+            fps = n / elapsed if elapsed > 0 else 0.0
+            print(f"[Camera] frames={n}, elapsed={elapsed:.2f}s, fps={fps:.2f}")
+        elif args.source is not None:
+            n, elapsed, src = run_stream(args.source)
+            fps = n / elapsed if elapsed > 0 else 0.0
+            print(f"[Stream] processed={n}, read={src.read_count}, skipped={src.skipped}, "
+                  f"dropped={src.dropped}, latency={src.infer_latency*1000:.1f}ms, fps={fps:.2f}")
+        else:
+            image_paths = glob.glob(IMAGE_GLOB)
+            if not image_paths:
+                print("테스트 이미지가 없습니다:", IMAGE_GLOB)
+                return
 
-        # 결과 표시
-        safe_show_or_save("Result", annotated, image_path)
+            n, elapsed = run_pipeline(image_paths, batch_size=args.batch)
+            fps = n / elapsed if elapsed > 0 else 0.0
+            print(f"[Pipeline] frames={n}, batch={args.batch}, elapsed={elapsed:.2f}s, fps={fps:.2f}")
+    finally:
+        close_uplink()   # 단계 오류로 끝나도 남은 알림은 보냄
 
     try:
         cv2.destroyAllWindows()
@@ -0,0 +1,242 @@
+# graph_journal.py
+"""
+그래프 변경 저널: append-only 로그 + 주기적 스냅샷.
+
+- 변경(삭제/복구/위험구역/화재)은 JSON 한 줄로 append → O(1) 기록
+- write-ahead: 저널 append(+fsync)가 끝난 뒤에 메모리 상태에 적용 → 적용 후 중단돼도 재생으로 복원
+- record()는 코루틴. fsync와 스냅샷 파일 쓰기는 asyncio.to_thread로 이벤트 루프 밖에서 하고,
+  기록 순서 = 적용 순서가 되도록 lock으로 한 번에 하나씩 처리
+- 층 그래프는 원본 CSR(csr_graph.CSRGraph) + alive 마스크: 삭제/복구/전체 복구는 마스크만 바꾸고,
+  스냅샷에는 삭제된 노드 목록만 남긴다
+- JOURNAL_SNAPSHOT_EVERY 건마다 전체 상태를 스냅샷으로 원자적 교체(tmp → fsync → os.replace)
+  후 저널을 비움(compaction)
+- graph_dataN.json(compute_best_path 등 파일을 읽는 쪽)은 그래프 op가 적용될 때마다 그 층만 다시 씀
+  (루프에서 삭제 목록을 복사하고 파일 쓰기는 스레드에서, lock 안이라 쓰는 순서 = 적용 순서)
+- FLOOR_TO_GRAPH_MAP에 없는 층의 op는 기록하지 않고, 재생 때도 건너뜀
+- 시작 시 스냅샷 + 저널 꼬리를 재생해 그래프/FIRE_BLOCKED_NODES/HAZARDS/RECENT_FIRE_TS 복원
+- 저널 각 줄에 seq가 있어 스냅샷 교체 직후 중단돼도 이미 반영된 줄은 건너뜀
+- 마지막 줄이 잘려 있으면(기록 중 중단) 그 줄만 버리고 이어서 기록
+"""
+import os, json, time, asyncio
+from typing import Dict
+
+from final import (
+    FLOOR_TO_GRAPH_MAP, FLOORS,
+    graph_filename,
+    load_graph, BASE_DIR,
+)
+from csr_graph import CSRGraph
+
+# ====== 저널 설정 ======
+JOURNAL_FILE           = "graph_journal.log"    # append-only 변경 로그
+SNAPSHOT_FILE          = "graph_snapshot.json"  # 전체 상태 스냅샷
+JOURNAL_SNAPSHOT_EVERY = 100     # 이 건수마다 스냅샷 + 저널 비우기
+JOURNAL_FSYNC          = True    # append마다 fsync (정전 시에도 유실 없음)
+
+def _node(s) -> tuple:
+    return tuple(map(int, s.strip("()").split(",")))
+
+def _base_graph(floor: str) -> CSRGraph:
+    """층 원본 그래프 CSR (건물 파일 mmap 배열 그대로, alive만 새로 할당)"""
+    return CSRGraph.from_floor_view(FLOORS[floor])
+
+def _missing(graph: CSRGraph, keys) -> list:
+    """이전 형식 dict 그래프(keys)에 없는 원본 노드 = 삭제된 노드"""
+    return [n for n in map(tuple, graph.nodes.tolist()) if n not in keys]
+
+def _write_atomic(path: str, data: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class GraphJournal:
+    """
+    층별 현재 그래프(CSRGraph, 원본 + alive 마스크) + 화재/위험 상태를 메모리에 들고, 변경은 저널로 남긴다.
+    blocked/hazards/fire_ts는 호출 측(server) 전역 dict를 그대로 받아 제자리에서 갱신.
+    """
+    def __init__(self, blocked: Dict[str, set], hazards: Dict[str, set], fire_ts: Dict[str, float],
+                 journal_path: str = None, snapshot_path: str = None):
+        self.graphs: Dict[str, CSRGraph] = {}
+        self.blocked = blocked
+        self.hazards = hazards
+        self.fire_ts = fire_ts
+        self.journal_path = journal_path or os.path.join(BASE_DIR, JOURNAL_FILE)
+        self.snapshot_path = snapshot_path or os.path.join(BASE_DIR, SNAPSHOT_FILE)
+        self.seq = 0            # 마지막으로 적용한 변경 번호
+        self.snap_seq = 0       # 스냅샷에 포함된 마지막 변경 번호
+        self._fh = None
+        self._lock = asyncio.Lock()
+
+    # ---- 상태 적용(재생과 실시간 기록이 같은 코드를 탄다) ----
+    def apply(self, op: dict) -> bool:
+        kind, floor = op["op"], op.get("floor")
+        if kind == "fire":
+            self.fire_ts[floor] = float(op["ts"])
+            return True
+        if kind == "hazard":
+            s = self.hazards.setdefault(floor, set())
+            node = tuple(op["node"])
+            if op.get("active", True):
+                s.add(node)
+            else:
+                s.discard(node)
+            return True
+
+        graph = self.graphs.get(floor)
+        if graph is None:
+            return False
+        if kind == "delete":
+            node = tuple(op["node"])
+            graph.remove_node(node)
+            if op.get("block"):
+                self.blocked.setdefault(floor, set()).add(node)
+            return True
+        if kind == "restore_all":
+            # 원본으로 되돌리되 화재 차단 노드는 제외
+            graph.reset(self.blocked.get(floor, set()))
+            return True
+        if kind == "restore_node":
+            # 원본 간선(방향 그대로)이 살아 있는 이웃과 다시 이어진다
+            node = tuple(op["node"])
+            if node in self.blocked.get(floor, set()) or graph.node_id(node) < 0:
+                return False
+            graph.restore_node(node)
+            return True
+        raise ValueError(f"알 수 없는 저널 op: {kind}")
+
+    # ---- 기록 ----
+    async def record(self, op: dict) -> bool:
+        """저널에 한 줄 append(+fsync)한 뒤 상태에 적용(write-ahead). 필요하면 스냅샷/압축.
+        알 수 없는 층이면 기록/적용 없이 False"""
+        if op.get("floor") not in FLOOR_TO_GRAPH_MAP:
+            print(f"[Journal] 알 수 없는 층 op 무시: {op}")
+            return False
+        async with self._lock:
+            seq = self.seq + 1
+            line = json.dumps({"seq": seq, **op}, ensure_ascii=False)
+            if self._fh is None:
+                self._fh = open(self.journal_path, "a", encoding="utf-8")
+            self._fh.write(line + "\n")
+            self._fh.flush()
+            if JOURNAL_FSYNC:
+                await asyncio.to_thread(os.fsync, self._fh.fileno())
+            self.seq = seq
+            ok = self.apply(op)
+            if ok and op["op"] in ("delete", "restore_all", "restore_node"):
+                floor = op["floor"]
+                await asyncio.to_thread(self._export_graph, floor, self.graphs[floor].dead_nodes())
+            if self.seq - self.snap_seq >= JOURNAL_SNAPSHOT_EVERY:
+                # 상태 복사는 루프에서(이후 변경과 섞이지 않게), 파일 쓰기는 스레드에서
+                state = self._state()
+                await asyncio.to_thread(self._write_snapshot, state)
+            return ok
+
+    # ---- 스냅샷/압축 ----
+    def _state(self) -> dict:
+        return {
+            "seq": self.seq,
+            "ts": time.time(),
+            "dead": {f: [list(n) for n in g.dead_nodes()] for f, g in self.graphs.items()},
+            "fire_blocked": {f: [list(n) for n in s] for f, s in self.blocked.items()},
+            "hazards": {f: [list(n) for n in s] for f, s in self.hazards.items()},
+            "recent_fire_ts": dict(self.fire_ts),
+        }
+
+    def _write_snapshot(self, state: dict):
+        t0 = time.perf_counter()
+        _write_atomic(self.snapshot_path, json.dumps(state, ensure_ascii=False))
+        # 복원 직후에도 graph_dataN.json이 메모리 그래프와 같도록 전 층 내보냄
+        for floor, dead in state["dead"].items():
+            self._export_graph(floor, dead)
+        # 스냅샷에 모두 반영됐으므로 저널 비우기(교체 전 중단돼도 seq로 중복 재생 방지)
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        _write_atomic(self.journal_path, "")
+        self.snap_seq = state["seq"]
+        print(f"[Journal] snapshot seq={state['seq']} ({(time.perf_counter()-t0)*1000:.1f}ms)")
+
+    def _export_graph(self, floor: str, dead):
+        """graph_dataN.json 갱신. 루프의 alive 마스크와 섞이지 않게 별도 마스크 view로 씀"""
+        g = self.graphs[floor]
+        view = CSRGraph(g.nodes, g.indptr, g.indices, g.alive.copy())
+        view._index = g._index
+        view.reset(tuple(n) for n in dead)
+        view.to_json(os.path.join(BASE_DIR, graph_filename(FLOOR_TO_GRAPH_MAP[floor])))
+
+    def snapshot(self):
+        """동기 스냅샷 (시작 복원/종료 시에만 사용)"""
+        self._write_snapshot(self._state())
+
+    # ---- 복원 ----
+    def recover(self) -> int:
+        """스냅샷 + 저널 꼬리 재생. return: 재생한 변경 수"""
+        for d in (self.blocked, self.hazards):
+            for s in d.values():
+                s.clear()
+        self.graphs = {f: _base_graph(f) for f in FLOOR_TO_GRAPH_MAP}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            if "dead" in snap:
+                for f, nodes in snap["dead"].items():
+                    if f in self.graphs:
+                        self.graphs[f].reset(tuple(n) for n in nodes)
+            else:
+                # 이전 형식(층별 dict 그래프): 원본에서 빠진 노드를 삭제 상태로
+                for f, g in snap.get("graphs", {}).items():
+                    if f in self.graphs:
+                        self.graphs[f].reset(_missing(self.graphs[f], {_node(k) for k in g}))
+            for f, nodes in snap.get("fire_blocked", {}).items():
+                self.blocked.setdefault(f, set()).update(tuple(n) for n in nodes)
+            for f, nodes in snap.get("hazards", {}).items():
+                self.hazards.setdefault(f, set()).update(tuple(n) for n in nodes)
+            self.fire_ts.update(snap.get("recent_fire_ts", {}))
+            self.seq = self.snap_seq = int(snap.get("seq", 0))
+        else:
+            # 첫 실행: 현재 graph_dataN.json에서 빠진 노드를 삭제 상태로
+            for f, n in FLOOR_TO_GRAPH_MAP.items():
+                try:
+                    keys = load_graph(graph_filename(n))
+                except (OSError, ValueError):
+                    continue
+                self.graphs[f].reset(_missing(self.graphs[f], keys))
+
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            good = 0
+            with open(self.journal_path, "rb") as f:
+                for raw in f:
+                    if not raw.endswith(b"\n"):      # 기록 도중 끊긴 마지막 줄
+                        print(f"[Journal] 잘린 마지막 줄 무시 (offset={good})")
+                        break
+                    try:
+                        op = json.loads(raw.decode("utf-8"))
+                    except (UnicodeDecodeError, ValueError):
+                        print(f"[Journal] 손상된 줄 이후 무시 (offset={good})")
+                        break
+                    good += len(raw)
+                    if op["seq"] <= self.seq:
+                        continue
+                    if op.get("floor") not in FLOOR_TO_GRAPH_MAP:
+                        print(f"[Journal] 알 수 없는 층 op 건너뜀: seq={op['seq']}, floor={op.get('floor')}")
+                    else:
+                        self.apply(op)
+                    self.seq = op["seq"]
+                    replayed += 1
+            if good != os.path.getsize(self.journal_path):
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(good)
+        if replayed or not os.path.exists(self.snapshot_path):
+            self.snapshot()
+        return replayed
+
+    def close(self):
+        if self.seq != self.snap_seq:
+            self.snapshot()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
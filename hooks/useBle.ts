@@ -71,10 +71,14 @@ export function useBle(opts?: UseBleOptions) {
 
   const managerRef = useRef(new BleManager());
   const wsRef = useRef<WebSocket | null>(null);
+  // 서버가 발급한 세션 토큰: 재연결 시 resume으로 보내 윈도우/경로를 이어받는다
+  const sessionRef = useRef<string | null>(null);
 
   const [ready, setReady] = useState(false);
   const [isScanning, setIsScanning] = useState(false);
   const [currentFloor, setCurrentFloor] = useState<FloorKey | null>(null);
+  // 서버가 과부하/제한을 알리면 권장 전송 주기로 늦춘다(null이면 기본값)
+  const [serverEmitMs, setServerEmitMs] = useState<number | null>(null);
 
   // latest map & EMA state
   const latestMap = useRef<Map<number, Reading>>(new Map());
@@ -88,13 +92,28 @@ export function useBle(opts?: UseBleOptions) {
     function connect() {
       ws = new WebSocket(wsUrl);
       wsRef.current = ws;
-      ws.onopen = () => {/* no-op */};
+      ws.onopen = () => {
+        const token = sessionRef.current;
+        if (token) {
+          try { ws?.send(JSON.stringify({ kind: "resume", token })); } catch {}
+        }
+      };
       ws.onerror = () => {/* no-op */};
       ws.onclose = () => {
         wsRef.current = null;
         if (!closed) setTimeout(connect, 1000);
       };
-      ws.onmessage = () => {/* ignore */};
+      ws.onmessage = (e) => {
+        try {
+          const msg = JSON.parse(String(e.data));
+          if (msg?.kind === "session" && typeof msg.token === "string") {
+            sessionRef.current = msg.token;
+          } else if (msg?.kind === "server_load") {
+            const ms = Number(msg.emit_interval_ms);
+            setServerEmitMs(Number.isFinite(ms) && ms > 0 ? ms : null);
+          }
+        } catch {/* ignore */}
+      };
     }
     connect();
 
@@ -207,9 +226,9 @@ export function useBle(opts?: UseBleOptions) {
       if (ws && ws.readyState === 1) {
         try { ws.send(JSON.stringify(msg)); } catch {}
       }
-    }, emitIntervalMs);
+    }, Math.max(emitIntervalMs, serverEmitMs ?? 0));
     return () => clearInterval(t);
-  }, [ready, emitIntervalMs, currentFloor]);
+  }, [ready, emitIntervalMs, serverEmitMs, currentFloor]);
 
   const latestList: Reading[] = useMemo(() => {
     return Array.from(latestMap.current.values())
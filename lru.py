@@ -0,0 +1,43 @@
+# lru.py
+"""
+크기 제한 LRU 캐시 + 적중/실패 카운터 (server.py 측위/경로 메모이제이션용).
+"""
+from collections import OrderedDict
+from typing import Any, Hashable
+
+_MISS = object()
+
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default=None):
+        v = self.data.get(key, _MISS)
+        if v is _MISS:
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return v
+
+    def put(self, key: Hashable, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.data.clear()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"size": len(self.data), "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0, "evictions": self.evictions}
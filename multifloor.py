@@ -0,0 +1,161 @@
+# multifloor.py
+"""
+건물 단위 통합 그래프(계단실로 층 연결) + 층별 '계단 → 최종 탈출구' 비용표.
+
+- 노드: (층, x, y). 층 내부 간선은 현재 층 그래프, 층 사이는 STAIRWELLS로 연결
+- 비용 단위는 홉(BFS와 동일). 계단 한 층 이동 = STAIR_HOPS_PER_FLOOR 홉
+- 대피 시 계단은 GROUND_FLOOR 방향으로만 이동(지하는 위로, 지상층은 아래로)
+- 최종 탈출구 = 각 층 TARGETS_MAP 1순위, 계단 = 2순위 목표
+- 층 그래프는 GraphJournal의 CSRGraph(원본 + alive 마스크)
+- 증분 갱신: 층 그래프가 바뀌면 그 층의 포털(계단/탈출구) 간 거리만 다시 BFS로 구하고,
+  포털 수십 개짜리 축약 그래프에서 비용표를 다시 푼다 → 다른 층 그래프는 건드리지 않음
+- 조회: table(층)[계단 노드] → O(1). inf면 그 계단 너머로는 나갈 수 없음(아래층 막힘 등)
+- STAIRWELLS_VERIFIED가 False면 비용표를 만들지 않고 table()은 빈 dict
+  → find_best_path는 stair_cost 없이 돌 때와 같은 결과(기존 동작)
+"""
+import math, heapq, time
+from typing import Dict, List, Tuple
+
+from final import FLOOR_TO_GRAPH_MAP, TARGETS_MAP, original_filename
+from csr_graph import CSRGraph
+
+# ====== 계단실 설정 ======
+# 계단실 이름 → {층: 그 층의 계단 노드}. 층 순서(FLOOR_ORDER)상 인접한 층끼리만 연결.
+# 노드는 TARGETS_MAP 2순위(비상계단) 기준이며, 층 간 대응은 도면으로 확인 필요
+# (예: S2/S3가 둘 다 1F (2, 1)로 이어짐). 확인 전에는 STAIRWELLS_VERIFIED = False로 두어
+# 실제 경로 안내에 쓰이지 않게 한다.
+STAIRWELLS_VERIFIED = False
+STAIRWELLS: Dict[str, Dict[str, Tuple[int, int]]] = {
+    "S1": {"B2": (18, 3), "B1": (14, 13), "1F": (4, 13)},
+    "S2": {"B2": (30, 1), "B1": (26, 9),  "1F": (2, 1)},
+    "S3": {"B1": (26, 5), "1F": (2, 1)},
+}
+FLOOR_ORDER = ["B2", "B1", "1F", "4F"]   # 아래 → 위 (2F/3F 데이터 없음)
+GROUND_FLOOR = "1F"                      # 계단 대피 방향 기준층
+STAIR_HOPS_PER_FLOOR = 3                 # 계단 한 층 이동 비용(홉 환산)
+
+Portal = Tuple[str, Tuple[int, int]]     # (층, 노드)
+
+def final_exits(floor: str) -> List[Tuple[int, int]]:
+    return list(TARGETS_MAP.get(original_filename(FLOOR_TO_GRAPH_MAP[floor]), {}).get(1, []))
+
+def stair_links() -> List[Tuple[Portal, Portal]]:
+    """계단실 안에서 인접 층 계단 노드 쌍 (양방향)"""
+    links = []
+    for floors in STAIRWELLS.values():
+        present = [f for f in FLOOR_ORDER if f in floors]
+        for a, b in zip(present, present[1:]):
+            if abs(FLOOR_ORDER.index(a) - FLOOR_ORDER.index(b)) == 1:
+                links.append(((a, floors[a]), (b, floors[b])))
+    return links
+
+def _toward_ground(src: str, dst: str) -> bool:
+    g = FLOOR_ORDER.index(GROUND_FLOOR)
+    return abs(FLOOR_ORDER.index(dst) - g) < abs(FLOOR_ORDER.index(src) - g)
+
+def evac_stair_links() -> List[Tuple[Portal, Portal]]:
+    """대피 방향(기준층 쪽)으로의 계단 이동 (출발, 도착)"""
+    out = []
+    for a, b in stair_links():
+        out.append((a, b) if _toward_ground(a[0], b[0]) else (b, a))
+    return out
+
+def unified_graph(graphs: Dict[str, CSRGraph]) -> Dict[Tuple[str, int, int], List[Tuple[str, int, int]]]:
+    """층별 그래프 + 계단 연결을 하나의 건물 그래프로"""
+    ug = {}
+    for floor, g in graphs.items():
+        for n, nbrs in g.to_dict().items():
+            ug[(floor, *n)] = [(floor, *v) for v in nbrs]
+    for (fa, a), (fb, b) in stair_links():
+        if a in graphs.get(fa, {}) and b in graphs.get(fb, {}):
+            ug[(fa, *a)].append((fb, *b))
+            ug[(fb, *b)].append((fa, *a))
+    return ug
+
+class StairExitTable:
+    """층별 계단 노드 → 최종 탈출구까지 최소 비용(홉). 층 그래프 변경 시 그 층만 재계산"""
+    def __init__(self):
+        self.portal_dist: Dict[str, Dict[Tuple[int, int], Dict[Tuple[int, int], int]]] = {}
+        self.cost: Dict[Portal, float] = {}
+        self.tables: Dict[str, Dict[Tuple[int, int], float]] = {}
+        self.updates = 0
+
+    def _portals(self, floor: str) -> List[Tuple[int, int]]:
+        nodes = set(final_exits(floor))
+        nodes.update(fl[floor] for fl in STAIRWELLS.values() if floor in fl)
+        return sorted(nodes)
+
+    def _update_floor(self, floor: str, graph: CSRGraph):
+        # 포털에서 같은 층 다른 포털까지 거리 (방향 그래프라 포털마다 BFS)
+        table = {}
+        portals = self._portals(floor)
+        ids = {q: graph.node_id(q) for q in portals}
+        for p in portals:
+            if p not in graph:
+                continue
+            d, _ = graph.bfs([ids[p]])
+            table[p] = {q: int(d[i]) for q, i in ids.items() if q != p and i >= 0 and d[i] >= 0}
+        self.portal_dist[floor] = table
+
+    def _solve(self):
+        """축약 그래프(포털만)에서 최종 탈출구 기준 역방향 Dijkstra"""
+        rev: Dict[Portal, List[Tuple[Portal, float]]] = {}
+        for floor, table in self.portal_dist.items():
+            for p, outs in table.items():
+                for q, d in outs.items():
+                    rev.setdefault((floor, q), []).append(((floor, p), d))
+        for a, b in evac_stair_links():
+            if a[1] in self.portal_dist.get(a[0], {}) and b[1] in self.portal_dist.get(b[0], {}):
+                rev.setdefault(b, []).append((a, STAIR_HOPS_PER_FLOOR))
+
+        cost: Dict[Portal, float] = {}
+        heap = []
+        for floor, table in self.portal_dist.items():
+            for e in final_exits(floor):
+                if e in table:
+                    cost[(floor, e)] = 0
+                    heap.append((0, (floor, e)))
+        heapq.heapify(heap)
+        while heap:
+            d, v = heapq.heappop(heap)
+            if d > cost.get(v, math.inf):
+                continue
+            for u, w in rev.get(v, ()):
+                if d + w < cost.get(u, math.inf):
+                    cost[u] = d + w
+                    heapq.heappush(heap, (d + w, u))
+        self.cost = cost
+
+        # 층별 조회표: 계단으로 다른 층에 간 뒤 최종 탈출구까지 비용 (계단 노드 자체 비용 아님)
+        tables: Dict[str, Dict[Tuple[int, int], float]] = {}
+        for (f, s), other in evac_stair_links():
+            t = tables.setdefault(f, {})
+            t[s] = min(t.get(s, math.inf), STAIR_HOPS_PER_FLOOR + cost.get(other, math.inf))
+        self.tables = tables
+
+    def rebuild(self, graphs: Dict[str, CSRGraph]):
+        if not STAIRWELLS_VERIFIED:
+            print("[Stairs] 계단실 층 간 대응 미확인 → 계단 비용표 사용 안 함")
+            return
+        for floor, g in graphs.items():
+            self._update_floor(floor, g)
+        self._solve()
+
+    def update(self, floor: str, graph: CSRGraph):
+        """한 층 그래프가 바뀌었을 때 그 층만 갱신"""
+        if not STAIRWELLS_VERIFIED:
+            return
+        t0 = time.perf_counter()
+        old = self.tables
+        self._update_floor(floor, graph)
+        self._solve()
+        self.updates += 1
+        changed = {f"{f}{s}": v for f, t in self.tables.items() for s, v in t.items()
+                   if old.get(f, {}).get(s) != v}
+        print(f"[Stairs] {floor} 갱신 ({(time.perf_counter()-t0)*1000:.2f}ms) changed={changed}")
+
+    def table(self, floor: str) -> Dict[Tuple[int, int], float]:
+        """이 층 계단 노드 → 계단을 타고 나간 뒤 최종 탈출구까지 비용(홉), 나갈 수 없으면 inf"""
+        if not STAIRWELLS_VERIFIED:
+            return {}
+        return self.tables.get(floor, {})
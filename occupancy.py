@@ -0,0 +1,74 @@
+# occupancy.py
+"""
+층/구역별 재실 인원 집계 (대시보드용).
+
+- 측위 한 번마다 그 사람의 (층, 구역)이 바뀐 경우에만 카운터 ±1 → O(변경)
+- 마지막 측위 시각 순으로 OrderedDict를 유지해 오래된 사람은 앞에서부터만 제거
+  (전체 인원을 훑지 않음)
+- version은 카운터가 바뀔 때마다 증가 → 발행 측은 바뀐 경우에만 스냅샷을 만든다
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+UNKNOWN_AREA = "unknown"   # 구역 판정 실패(None) 인원 집계 이름
+
+class OccupancyTracker:
+    def __init__(self):
+        self.where: "OrderedDict[Hashable, tuple]" = OrderedDict()   # key → (층, 구역, ts), ts 오름차순
+        self.floors: Dict[str, int] = {}
+        self.areas: Dict[str, Dict[str, int]] = {}
+        self.version = 0
+
+    def _inc(self, floor: str, area: str, n: int):
+        self.floors[floor] = self.floors.get(floor, 0) + n
+        a = self.areas.setdefault(floor, {})
+        a[area] = a.get(area, 0) + n
+        if a[area] <= 0:
+            del a[area]
+            if not a:
+                del self.areas[floor]
+        if self.floors[floor] <= 0:
+            del self.floors[floor]
+
+    def update(self, key: Hashable, floor: str, area: Optional[str], ts: float = None):
+        """key의 최신 위치 반영. 층/구역이 같으면 시각만 갱신"""
+        ts = time.time() if ts is None else ts
+        area = area or UNKNOWN_AREA
+        prev = self.where.pop(key, None)
+        self.where[key] = (floor, area, ts)
+        if prev is not None and prev[:2] == (floor, area):
+            return
+        if prev is not None:
+            self._inc(prev[0], prev[1], -1)
+        self._inc(floor, area, 1)
+        self.version += 1
+
+    def remove(self, key: Hashable) -> bool:
+        prev = self.where.pop(key, None)
+        if prev is None:
+            return False
+        self._inc(prev[0], prev[1], -1)
+        self.version += 1
+        return True
+
+    def expire(self, max_age: float, now: float = None) -> int:
+        """max_age 동안 갱신이 없는 인원 제거. return: 제거 수"""
+        now = time.time() if now is None else now
+        n = 0
+        while self.where:
+            key, (_, _, ts) = next(iter(self.where.items()))
+            if now - ts <= max_age:
+                break
+            self.remove(key)
+            n += 1
+        return n
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "kind": "occupancy",
+            "version": self.version,
+            "ts": round(time.time(), 3),
+            "total": len(self.where),
+            "floors": {f: {"count": n, "areas": dict(self.areas.get(f, {}))} for f, n in self.floors.items()},
+        }
@@ -0,0 +1,111 @@
+# outbox.py
+"""
+연결별 송신 큐 + 전송 태스크.
+
+broadcast에서 c.send()를 모두 await하면 느린 폰 하나가 전체 전달을 붙잡고,
+fire_alert가 live_update 뒤에 줄을 선다. 여기서는 연결마다 writer 태스크 1개가
+아래 순서로 꺼내 보낸다 (넣는 쪽은 기다리지 않음).
+- high  : 화재/위험구역/graph_ack 등 제어 메시지. 항상 먼저
+- latest: 위치/경로처럼 최신 것만 의미 있는 메시지. key가 같으면 덮어씀(latest-wins)
+- normal: 그 외(이미지 중계 등). 순서 유지
+큐가 넘치거나, 가장 오래 기다린 메시지가 OUTBOX_MAX_LAG를 넘거나, send 하나가
+OUTBOX_SEND_TIMEOUT 안에 끝나지 않으면 느린 소비자로 보고 연결을 끊는다.
+"""
+import asyncio, time
+from collections import deque, OrderedDict
+from typing import Any, Hashable, Optional
+
+# ====== 송신 큐 설정 ======
+OUTBOX_HIGH_MAX     = 256    # high 큐 상한(넘치면 끊음 — 제어 메시지는 버리지 않는다)
+OUTBOX_NORMAL_MAX   = 64     # normal 큐 상한(넘치면 끊음)
+OUTBOX_MAX_LAG      = 5.0    # 큐에서 이보다 오래 기다린 메시지가 있으면 끊음(초)
+OUTBOX_SEND_TIMEOUT = 5.0    # send 1건 대기 한도(초). 소켓 버퍼가 안 빠지면 여기서 걸림
+SLOW_CLOSE_CODE     = 1013   # 끊을 때 close code (앱은 재접속 후 세션 resume)
+
+class Outbox:
+    def __init__(self, ws):
+        self.ws = ws
+        self.high: deque = deque()
+        self.normal: deque = deque()
+        self.latest: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.sent = 0
+        self.coalesced = 0       # latest-wins로 덮어써 보내지 않은 수
+        self.closed_reason: Optional[str] = None
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._writer())
+        return self
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def put(self, msg: Any, lane: str = "normal", key: Hashable = None) -> bool:
+        """메시지 적재(기다리지 않음). 이미 끊기로 한 연결이면 False"""
+        if self.closed_reason is not None:
+            return False
+        item = (time.monotonic(), msg)
+        if key is not None:
+            if key in self.latest:
+                self.coalesced += 1
+                # 처음 들어온 시각을 유지해야 계속 덮어써지는 키도 지연 판정에 걸린다
+                item = (self.latest[key][0], msg)
+            self.latest[key] = item
+        elif lane == "high":
+            if len(self.high) >= OUTBOX_HIGH_MAX:
+                self._drop("high 큐 초과")
+                return False
+            self.high.append(item)
+        else:
+            if len(self.normal) >= OUTBOX_NORMAL_MAX:
+                self._drop("normal 큐 초과")
+                return False
+            self.normal.append(item)
+        self._wake.set()
+        return True
+
+    def pending(self) -> int:
+        return len(self.high) + len(self.latest) + len(self.normal)
+
+    def _next(self):
+        if self.high:
+            return self.high.popleft()
+        if self.latest:
+            return self.latest.popitem(last=False)[1]
+        if self.normal:
+            return self.normal.popleft()
+        return None
+
+    def _drop(self, reason: str):
+        """느린 소비자: 큐를 비우고 연결 종료(handle의 수신 루프가 끝나며 정리됨)"""
+        if self.closed_reason is not None:
+            return
+        self.closed_reason = reason
+        print(f"[Outbox] 느린 소비자 끊음: {reason} (pending={self.pending()}, sent={self.sent})")
+        self.high.clear()
+        self.normal.clear()
+        self.latest.clear()
+        asyncio.ensure_future(self.ws.close(code=SLOW_CLOSE_CODE, reason="slow consumer"))
+
+    async def _writer(self):
+        while True:
+            item = self._next()
+            if item is None:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            ts, msg = item
+            if time.monotonic() - ts > OUTBOX_MAX_LAG:
+                self._drop(f"지연 {time.monotonic() - ts:.1f}s")
+                return
+            try:
+                await asyncio.wait_for(self.ws.send(msg), OUTBOX_SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                self._drop("send 시간 초과")
+                return
+            except Exception:
+                return      # 이미 끊긴 연결
+            self.sent += 1
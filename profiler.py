@@ -0,0 +1,150 @@
+# profiler.py
+"""
+실행 중 서버용 온디맨드 프로파일러 (측위 파이프라인 구간).
+
+- server에서 측위 구간을 `with PROFILER.section():`으로 감싼다. 꺼져 있으면 재사용
+  nullcontext 하나만 돌려줌 → 속성 조회 + with 한 번 수준의 비용
+- mode="cprofile": 구간 진입/이탈마다 cProfile enable/disable (구간 밖 코드는 측정 안 함)
+  → <이름>.prof(pstats) + <이름>.txt(누적 시간 순 정렬)
+- mode="sample": 별도 스레드가 SAMPLE_INTERVAL마다 대상 스레드 스택을 떠서 집계
+  → <이름>.collapsed(flamegraph.pl / speedscope 입력 형식) + <이름>.txt(함수별 샘플 수 정렬)
+- scope="pipeline"은 구간 안에서만, "all"은 대상 스레드 전체(이벤트 루프 대기 포함)를 기록
+  (구간이 수 ms로 짧으면 GIL 때문에 샘플이 적게 잡힘 → 이때는 cprofile 쪽이 정확)
+"""
+import os, io, sys, time, threading, cProfile, pstats
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import List, Optional
+
+# ====== 프로파일 설정 ======
+SAMPLE_INTERVAL = 0.005   # 샘플링 주기(초)
+SAMPLE_MAX_DEPTH = 128    # 스택 최대 깊이(넘으면 바깥쪽 잘림)
+STATS_TOP = 60            # 정렬 통계 파일에 남길 상위 함수 수
+
+_NULL = nullcontext()
+
+def _label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+class Profiler:
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        self.active = False
+        self.mode = None
+        self.scope = None
+        self.started = 0.0
+        self.depth = 0
+        self._prof: Optional[cProfile.Profile] = None
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._tid = None
+
+    # ---- 측정 구간 ----
+    def section(self):
+        """꺼져 있으면 공유 nullcontext, 켜져 있으면 측정 구간"""
+        return self._section() if self.active else _NULL
+
+    @contextmanager
+    def _section(self):
+        self.depth += 1
+        prof = self._prof if self.scope == "pipeline" else None
+        if prof is not None and self.depth == 1:
+            prof.enable()
+        try:
+            yield
+        finally:
+            if prof is not None and self.depth == 1:
+                prof.disable()
+            self.depth -= 1
+
+    # ---- 세션 ----
+    def start(self, mode: str = "sample", scope: str = "pipeline") -> bool:
+        """호출한 스레드(이벤트 루프)를 대상으로 세션 시작. 이미 실행 중이면 False"""
+        if self.active:
+            return False
+        if mode not in ("sample", "cprofile") or scope not in ("pipeline", "all"):
+            raise ValueError(f"알 수 없는 프로파일 설정: mode={mode}, scope={scope}")
+        self.mode, self.scope = mode, scope
+        self.started = time.time()
+        self.depth = 0
+        self._tid = threading.get_ident()
+        if mode == "cprofile":
+            self._prof = cProfile.Profile()
+            if scope == "all":
+                self._prof.enable()
+        else:
+            self._stacks = Counter()
+            self._samples = 0
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sampler, name="profiler-sampler", daemon=True)
+            self._thread.start()
+        self.active = True
+        print(f"[Profile] 시작 mode={mode}, scope={scope}")
+        return True
+
+    def stop(self) -> List[str]:
+        """세션 종료 후 결과 파일 기록. return: 기록한 파일 경로"""
+        if not self.active:
+            return []
+        self.active = False
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, time.strftime("profile_%Y%m%d_%H%M%S", time.localtime(self.started)))
+        if self.mode == "cprofile":
+            if self.scope == "all":
+                self._prof.disable()
+            paths = self._dump_cprofile(base)
+            self._prof = None
+        else:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            paths = self._dump_samples(base)
+        print(f"[Profile] 종료 ({time.time()-self.started:.1f}s) → {', '.join(paths)}")
+        return paths
+
+    def status(self) -> dict:
+        return {"active": self.active, "mode": self.mode, "scope": self.scope,
+                "elapsed_s": round(time.time() - self.started, 1) if self.active else 0.0}
+
+    # ---- 샘플러 ----
+    def _sampler(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            if self.scope == "pipeline" and self.depth == 0:
+                continue
+            frame = sys._current_frames().get(self._tid)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < SAMPLE_MAX_DEPTH:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            self._stacks[";".join(reversed(stack))] += 1
+            self._samples += 1
+
+    # ---- 결과 기록 ----
+    def _dump_cprofile(self, base: str) -> List[str]:
+        self._prof.dump_stats(base + ".prof")
+        buf = io.StringIO()
+        pstats.Stats(self._prof, stream=buf).sort_stats("cumulative").print_stats(STATS_TOP)
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(buf.getvalue())
+        return [base + ".prof", base + ".txt"]
+
+    def _dump_samples(self, base: str) -> List[str]:
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            for stack, n in self._stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        own, total = Counter(), Counter()
+        for stack, n in self._stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += n
+            for fn in set(frames):
+                total[fn] += n
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(f"samples={self._samples}, interval={SAMPLE_INTERVAL*1000:.1f}ms, scope={self.scope}\n")
+            f.write(f"{'self':>8} {'total':>8}  function\n")
+            for fn, n in total.most_common(STATS_TOP):
+                f.write(f"{own[fn]:>8} {n:>8}  {fn}\n")
+        return [base + ".collapsed", base + ".txt"]
@@ -1,20 +1,30 @@
 # server.py
-import asyncio, json, time
+import asyncio, json, time, os, math, secrets
+_BOOT_T0 = time.perf_counter()   # 콜드 스타트 측정 기준(인터프리터 기동 제외)
 from typing import List, Dict, Any, Tuple
-from collections import deque
+from collections import OrderedDict
+import numpy as np
 import websockets
 import datetime as dt
 
 # final.py에서 공용 로직/데이터 사용
 from final import (
-    beacon_coords,
+    beacon_coords, rssi_to_distance, PATH_LOSS_DIV,
     trilaterate_from_top3,
-    compute_best_path,
     classify_area,
-    FLOOR_TO_GRAPH_MAP, graph_filename, original_filename,
-    load_graph, save_graph, ensure_files,
-    parse_node, remove_node, ORIGINAL_GRAPHS,
+    FLOOR_TO_GRAPH_MAP, original_filename, init_files,
+    parse_node, FLOORS, TARGETS_MAP,
+    map_area_to_node,
+    BUILDING,
 )
+from graph_journal import GraphJournal
+from evac_flow import assign_routes
+from multifloor import StairExitTable
+from occupancy import OccupancyTracker
+from profiler import Profiler
+from outbox import Outbox
+from lru import LRUCache
+import batch_fix
 
 # ====== 서버 설정 ======
 HOST = "172.20.6.45"      # IPv4 주소 수정
@@ -24,6 +34,22 @@ PORT = 8000
 COUNT_TRIGGER   = 10      # Top3 각 비콘의 유효 샘플(>-99) 최소 개수
 MAX_WINDOW_AGE  = 10.0    # 오래된 배치 버리는 최대 보관 시간(초)
 RSSI_MIN_VALID  = -99     # 유효 RSSI 하한(이하 값은 제외)
+RING_CAPACITY   = 512     # 연결당 보관할 RSSI 샘플 수 상한(비콘 9개 × 10Hz 기준 약 5.7초, 약 9KB)
+
+# ====== 적응형 트리거(추정 품질 기반) ======
+TRIGGER_MODE      = "adaptive"  # "adaptive": 위치 불확도 기반 / "count": 기존 COUNT_TRIGGER + 윈도우 초기화
+FIX_WINDOW_SEC    = 2.0     # 슬라이딩 윈도우 길이(초). 측위 후에도 비우지 않는다
+FIX_MIN_SAMPLES   = 3       # Top3 각 비콘 최소 유효 샘플 수(Hampel 필터 후)
+FIX_UNCERTAINTY_M = 1.5     # 추정 위치 1σ 불확도(m)가 이 미만이면 바로 측위
+FIX_MIN_INTERVAL  = 0.3     # 연속 측위 최소 간격(초)
+HAMPEL_K          = 3.0     # |x - median| > K·MAD(σ 환산) 샘플은 다중경로 스파이크로 보고 제거
+RSSI_STD_FLOOR    = 1.0     # RSSI 표준편차 하한(dB). 샘플이 적거나 값이 같을 때 과신 방지
+
+# ====== 틱 기반 일괄 측위 (TRIGGER_MODE="adaptive"에서만) ======
+FIX_SCHEDULER = "inline"  # "inline"(연결마다 즉시 측위) | "tick"(FIX_TICK_SEC마다 준비된 연결 일괄 처리)
+FIX_TICK_SEC  = 0.15      # 일괄 측위 주기(초) = 측위 지연 상한
+FIX_PENDING: Dict[Any, dict] = {}   # ws → {"window", "floor"} 다음 틱에 검사할 연결
+LAST_FIX_TS: Dict[Any, float] = {}  # ws → 마지막 측위 시각(FIX_MIN_INTERVAL 적용)
 
 # ====== 화재 발생 노드 영구 삭제 ======
 # fire_alert 직후 이 시간 내 delete_node면 화재 유발 삭제로 간주(초)
@@ -38,82 +64,282 @@ FIRE_BLOCKED_NODES: Dict[str, set] = {"B2": set(), "B1": set(), "1F": set(), "4F
 
 clients = set()
 
+# 🔥 감지기(fire_detect 업링크) 연결: 이 경로로 접속하면 일반 클라이언트가 아님
+#    (세션 토큰/live_update 브로드캐스트/접속 수 제한 대상에서 제외)
+DETECTOR_PATH = "/detector"
+DETECTORS = set()
+
 # 🔥 화재 알림 옵션
 DROP_FIRE_IMAGE = True    # fire_alert payload에서 base64 이미지 제거
 ADD_TIMESTAMP   = True    # fire_alert에 ISO 시간스탬프(ts) 추가
 HAZARDS = {"B2": set(), "B1": set(), "1F": set(), "4F": set()}
 
-# ====== 유틸 ======
-def compress_batch_for_log(batch: Dict[str, Any]) -> list:
-    out = []
-    for r in batch.get("readings", []):
-        val = r.get("filtered", r.get("rssi"))
-        try:
-            v = None if val is None else round(float(val), 1)
-        except Exception:
-            v = None
-        out.append((r.get("id"), v))
-    return out
+# 그래프/화재 차단/위험구역/화재 시각 변경 저널 (startup에서 복원)
+JOURNAL = GraphJournal(FIRE_BLOCKED_NODES, HAZARDS, RECENT_FIRE_TS)
+
+# 층별 계단 → 최종 탈출구 비용표 (그래프 변경 시 해당 층만 증분 갱신)
+STAIRS = StairExitTable()
+
+# 📷 바이너리 이미지 프레임(fire_detect ALERT_IMAGE_MODE="binary")
+# 형식: FIRE_IMAGE_MAGIC(4B) + image_id(16B, uuid) + JPEG 바이트. fire_alert에는 image_id만 담긴다.
+FIRE_IMAGE_MAGIC   = b"FIMG"
+FIRE_IMAGE_HEADER  = len(FIRE_IMAGE_MAGIC) + 16
+FORWARD_FIRE_IMAGE = False    # 받은 이미지 프레임을 다른 클라이언트에 그대로 중계
+SAVE_FIRE_IMAGES   = True     # FIRE_IMAGE_DIR/<image_id>.jpg 로 저장
+FIRE_IMAGE_DIR     = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fire_images")
+FIRE_IMAGE_KEEP    = 32       # 메모리에 보관할 최근 이미지 수
+FIRE_IMAGES: "OrderedDict[str, bytes]" = OrderedDict()
+
+# ====== 접속/부하 제어 ======
+MAX_CLIENTS           = 500     # 동시 접속 상한(초과 시 1013 Try Again Later로 거부)
+BLE_RATE_PER_SEC      = 12.0    # 연결당 BLE 프레임 허용 속도(토큰 보충/초). 앱 기본 100ms → 10/s
+BLE_BURST             = 20      # 토큰 버킷 크기(순간 몰림 허용량)
+MAX_READINGS_PER_MSG  = 32      # readings/list 길이 상한(초과분은 잘라냄)
+OVERLOAD_SAMPLE_SEC   = 0.1     # 이벤트 루프 지연 측정 주기(초)
+OVERLOAD_ENTER_LAG    = 0.25    # 루프 지연 EMA가 이 이상이면 과부하 진입(초)
+OVERLOAD_EXIT_LAG     = 0.05    # 이 이하로 내려오면 과부하 해제(히스테리시스)
+OVERLOAD_RATE_FACTOR  = 0.3     # 과부하 중 BLE 허용 속도 배율(다운샘플링)
+THROTTLE_NOTICE_SEC   = 5.0     # 한 연결에 제한 안내를 다시 보내기까지 최소 간격(초)
+
+LOAD_STATE = {"overload": False, "lag": 0.0, "shed": 0}
+
+# 연결별 송신 큐(outbox.py). 모든 전송은 _send/_broadcast로 넣기만 하고 기다리지 않는다
+OUTBOXES: Dict[Any, Outbox] = {}
+
+# ====== 혼잡 고려 대피 경로 ======
+ROUTING_MODE       = "nearest"     # "nearest"(개인별 최단) | "congestion"(층 단위 일괄 배정, evac_flow)
+ROUTE_INTERVAL     = 2.0     # 층별 일괄 재배정 주기(초)
+OCCUPANT_STALE_SEC = 15.0    # 이 시간 동안 측위가 없으면 점유 인원에서 제외(초)
+OCCUPANTS: Dict[Any, dict] = {}   # ws → {"floor", "node", "ts"} 마지막 측위 시작 노드
+ROUTES: Dict[Any, dict] = {}      # ws → {"floor", "start", "path", "eta"} 마지막 배정 경로
+
+# ====== 재실 인원 집계 (대시보드) ======
+OCCUPANCY_PUBLISH_SEC = 1.0   # 구독 대시보드에 층/구역 인원 스냅샷 발행 주기(초)
+OCCUPANCY = OccupancyTracker()  # 측위마다 (층, 구역) 변경분만 반영, OCCUPANT_STALE_SEC 지나면 제외
+DASHBOARDS = set()              # {"kind": "subscribe_occupancy"} 연결: 개별 측위 대신 스냅샷만 받음
+
+# ====== 온디맨드 프로파일링 ======
+# {"kind": "profile", "action": "start"|"stop"|"status", "mode": "sample"|"cprofile",
+#  "scope": "pipeline"|"all", "duration": 초, "token": PROFILE_ADMIN_TOKEN} 또는 환경변수로 시작
+PROFILE_ENV         = "EVAC_PROFILE"  # 예: EVAC_PROFILE=sample:30, cprofile:60:all → 서버 시작과 함께 측정
+PROFILE_DIR         = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+PROFILE_DEFAULT_SEC = 30.0     # duration 생략 시 측정 시간(초)
+PROFILE_MAX_SEC     = 600.0    # 측정 시간 상한(초)
+PROFILE_ADMIN_TOKEN = ""       # 비어 있으면 로컬(127.0.0.1/::1) 연결만 profile 명령 허용
+PROFILER = Profiler(PROFILE_DIR)
+_PROFILE_TIMER = None          # 자동 종료 타이머(loop.call_later 핸들)
+
+# ====== 세션 재개 ======
+# 접속 시 {"kind": "session", "token"} 발급 → 재접속 후 {"kind": "resume", "token"}이면
+# 윈도우/층/마지막 측위/경로를 복원하고 현재 경로를 바로 다시 보낸다
+SESSION_TTL_SEC = 30.0        # 끊긴 뒤 이 시간 안에 resume해야 복원(초)
+SESSIONS: "OrderedDict[str, dict]" = OrderedDict()   # token → 끊긴 연결의 보관 상태(만료 순)
+# 살아 있는 연결: token → (ws, 상태 조회 함수). Wi-Fi가 끊겨도 서버는 ping 타임아웃(최대 ~40초)까지
+# 옛 연결을 살아 있다고 보므로, 그 사이 온 resume은 옛 연결의 상태를 넘겨받고 옛 연결을 닫는다
+LIVE_SESSIONS: Dict[str, tuple] = {}
+LAST_FIX: Dict[Any, dict] = {}   # ws → 마지막 측위 payload
+
+# ====== 측위/경로 메모이제이션 ======
+# 제자리에 있는 폰은 거의 같은 RSSI를 계속 보내므로 같은 계산을 반복하지 않는다
+FIX_CACHE_BIN_DB    = 1.0     # RSSI 양자화 폭(dB). 1dB ≈ 거리 12% (PATH_LOSS_DIV=20)
+FIX_CACHE_SIZE      = 2048    # 층별 (비콘 id, RSSI 구간) 서명 → 좌표/구역 캐시 크기
+ROUTE_CACHE_SIZE    = 4096    # (층, 그래프 버전, 시작 노드) → 경로 캐시 크기
+FIX_CACHE: Dict[str, LRUCache] = {}
+ROUTE_CACHE = LRUCache(ROUTE_CACHE_SIZE)
+GRAPH_VERSION = 0             # 그래프 변경(_graph_changed)마다 증가. 계단 비용이 층을 넘나들어 전 층 공통
+EXIT_FIELDS: Dict[str, tuple] = {}   # 층 → (그래프 버전, ExitField). 탈출구에서 역방향 BFS 한 번으로 전 노드 경로
+
+# ====== 부하 제어 ======
+class TokenBucket:
+    """연결당 BLE 프레임 속도 제한. factor로 과부하 시 보충 속도를 낮춘다"""
+    __slots__ = ("rate", "burst", "tokens", "ts")
+    def __init__(self, rate: float = BLE_RATE_PER_SEC, burst: float = BLE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.ts = time.monotonic()
+
+    def allow(self, now: float, factor: float = 1.0) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate * factor)
+        self.ts = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
 
+def _recommended_emit_ms() -> int:
+    """현재 허용 속도로 버킷을 비우지 않는 전송 주기(ms)"""
+    factor = OVERLOAD_RATE_FACTOR if LOAD_STATE["overload"] else 1.0
+    return int(math.ceil(1000.0 / (BLE_RATE_PER_SEC * factor)))
+
+def _server_load_msg(throttled: bool = False) -> str:
+    overload = LOAD_STATE["overload"]
+    return json.dumps({
+        "kind": "server_load",
+        "overload": overload,
+        "throttled": throttled,
+        "emit_interval_ms": _recommended_emit_ms() if (overload or throttled) else None,
+    })
+
+async def _load_monitor():
+    """이벤트 루프 지연(EMA)으로 과부하 판정, 상태가 바뀌면 모든 클라이언트에 통지"""
+    loop = asyncio.get_running_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(OVERLOAD_SAMPLE_SEC)
+        lag = max(0.0, loop.time() - t0 - OVERLOAD_SAMPLE_SEC)
+        LOAD_STATE["lag"] += 0.3 * (lag - LOAD_STATE["lag"])
+
+        was = LOAD_STATE["overload"]
+        if not was and LOAD_STATE["lag"] >= OVERLOAD_ENTER_LAG:
+            LOAD_STATE["overload"] = True
+        elif was and LOAD_STATE["lag"] <= OVERLOAD_EXIT_LAG:
+            LOAD_STATE["overload"] = False
+        if LOAD_STATE["overload"] != was:
+            print(f"[Load] overload={LOAD_STATE['overload']} lag={LOAD_STATE['lag']*1000:.0f}ms "
+                  f"clients={len(clients)} shed={LOAD_STATE['shed']}")
+            _broadcast(clients, _server_load_msg(), key="server_load")
+
+# ====== 송신 ======
+def _send(ws, msg, lane: str = "normal", key=None):
+    """ws의 송신 큐에 적재. lane="high"는 화재/위험구역/ack, key가 있으면 같은 key끼리 최신 것만 전송"""
+    ob = OUTBOXES.get(ws)
+    if ob is not None:
+        ob.put(msg, lane, key)
+
+def _broadcast(targets, msg, lane: str = "normal", key=None):
+    for c in list(targets):
+        _send(c, msg, lane, key)
+
+def _fix_key(ws):
+    # 위치/경로 갱신은 측위 대상(사람)별 latest-wins: 같은 사람의 이전 갱신만 덮어씀
+    return ("fix", id(ws))
+
+# ====== 유틸 ======
 def _is_valid(v):
     try:
         return v is not None and float(v) > RSSI_MIN_VALID
     except Exception:
         return False
 
-def prune_old(window: deque, max_age: float = MAX_WINDOW_AGE):
-    """너무 오래된 배치는 버려서 메모리/추정 왜곡 방지"""
-    now = time.time()
-    while window and (now - window[0]["ts"] > max_age):
-        window.popleft()
-
-def push_batch(window: deque, lst: list):
-    readings = []
-    for r in lst:
-        readings.append({
-            "id": r.get("id"),
-            "filtered": r.get("filtered"),
-            "rssi": r.get("rssi"),
-        })
-    window.append({"ts": time.time(), "readings": readings})
+def _valid_or_nan(v) -> float:
+    return float(v) if _is_valid(v) else math.nan
 
-# ====== 집계/Top3 ======
-def aggregate_window(window: deque) -> Dict[int, Dict[str, float]]:
+# ====== 연결별 RSSI 링 버퍼 ======
+class RssiRing:
     """
-    윈도우에 쌓인 배치들에서 비콘별 평균/카운트 계산.
-    - avg_filtered: filtered 평균 (>-99만 집계)
-    - avg_rssi: raw 평균 (>-99만 집계)
-    - count: 유효 샘플 수(둘 중 큰 값)
+    고정 용량 샘플 링 버퍼: (ts, 비콘 id, filtered, raw) 열 배열.
+    - append O(1), 가득 차면 가장 오래된 샘플을 덮어씀 → 연결당 메모리 고정
+    - 유효하지 않은 RSSI(<= RSSI_MIN_VALID)는 NaN으로 저장
+    - ts는 단조 증가하므로 만료는 searchsorted 한 번
     """
-    acc: Dict[int, Dict[str, float]] = {}
-    for b in window:
-        for r in b.get("readings", []):
+    __slots__ = ("cap", "ts", "bid", "fil", "raw", "head", "size")
+
+    def __init__(self, capacity: int = RING_CAPACITY):
+        self.cap = capacity
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.bid = np.zeros(capacity, dtype=np.int16)
+        self.fil = np.full(capacity, np.nan, dtype=np.float32)
+        self.raw = np.full(capacity, np.nan, dtype=np.float32)
+        self.head = 0    # 가장 오래된 샘플 위치
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, ts: float, bid: int, fil: float, raw: float):
+        i = (self.head + self.size) % self.cap
+        self.ts[i] = ts
+        self.bid[i] = bid
+        self.fil[i] = fil
+        self.raw[i] = raw
+        if self.size < self.cap:
+            self.size += 1
+        else:
+            self.head = (self.head + 1) % self.cap
+
+    def push_readings(self, readings: list, ts: float = None):
+        """앱 배치([{id, filtered, rssi}, ...])에서 등록된 비콘만 적재"""
+        ts = time.time() if ts is None else ts
+        for r in readings:
+            if not isinstance(r, dict):
+                continue
             bid = r.get("id")
             if bid not in beacon_coords:
                 continue
-            fil = r.get("filtered")
-            raw = r.get("rssi")
-
-            # 이상치 드랍(하한 -99), useBle.ts 버그 방지
-            if not _is_valid(fil): fil = None
-            if not _is_valid(raw): raw = None
-
-            if bid not in acc:
-                acc[bid] = {"sum_fil": 0.0, "cnt_fil": 0, "sum_raw": 0.0, "cnt_raw": 0}
-            if fil is not None:
-                acc[bid]["sum_fil"] += float(fil); acc[bid]["cnt_fil"] += 1
-            if raw is not None:
-                acc[bid]["sum_raw"] += float(raw); acc[bid]["cnt_raw"] += 1
+            self.append(ts, bid, _valid_or_nan(r.get("filtered")), _valid_or_nan(r.get("rssi")))
+
+    def _ordered(self, arr):
+        end = self.head + self.size
+        if end <= self.cap:
+            return arr[self.head:end]            # 복사 없는 view
+        return np.concatenate((arr[self.head:], arr[:end - self.cap]))
+
+    def arrays(self):
+        """오래된 순서의 (ts, bid, filtered, raw) 배열"""
+        return (self._ordered(self.ts), self._ordered(self.bid),
+                self._ordered(self.fil), self._ordered(self.raw))
+
+    def expire(self, max_age: float, now: float = None):
+        now = time.time() if now is None else now
+        cutoff = now - max_age
+        if not self.size or self.ts[self.head] >= cutoff:
+            return
+        k = int(np.searchsorted(self._ordered(self.ts), cutoff, side="left"))
+        self.head = (self.head + k) % self.cap
+        self.size -= k
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+
+    def summary(self) -> Dict[int, list]:
+        """로그/디버그용 요약: 비콘 id → [샘플 수, 마지막 filtered]"""
+        _, bid, fil, _ = self.arrays()
+        out: Dict[int, list] = {}
+        for b, v in zip(bid.tolist(), fil.tolist()):
+            ent = out.setdefault(b, [0, None])
+            ent[0] += 1
+            if v == v:      # NaN 제외
+                ent[1] = round(v, 1)
+        return out
+
+def prune_old(window: RssiRing, max_age: float = MAX_WINDOW_AGE):
+    """너무 오래된 샘플은 버려서 추정 왜곡 방지"""
+    window.expire(max_age)
+
+def push_batch(window: RssiRing, lst: list):
+    window.push_readings(lst)
 
+# ====== 집계/Top3 ======
+def aggregate_window(window: RssiRing) -> Dict[int, Dict[str, float]]:
+    """
+    윈도우에 쌓인 샘플에서 비콘별 평균/카운트 계산.
+    - avg_filtered: filtered 평균 (>-99만 집계)
+    - avg_rssi: raw 평균 (>-99만 집계)
+    - count: 유효 샘플 수(둘 중 큰 값)
+    """
+    _, bid, fil, raw = window.arrays()
     out: Dict[int, Dict[str, float]] = {}
-    for bid, d in acc.items():
-        avg_fil = d["sum_fil"]/d["cnt_fil"] if d["cnt_fil"]>0 else None
-        avg_raw = d["sum_raw"]/d["cnt_raw"] if d["cnt_raw"]>0 else None
-        cnt = max(d["cnt_fil"], d["cnt_raw"])
-        out[bid] = {"avg_filtered": avg_fil, "avg_rssi": avg_raw, "count": cnt}
+    if not len(bid):
+        return out
+
+    # 이상치(하한 -99)는 적재 시 NaN 처리됨
+    fil_ok, raw_ok = ~np.isnan(fil), ~np.isnan(raw)
+    n = int(bid.max()) + 1
+    cnt_fil = np.bincount(bid, weights=fil_ok, minlength=n)
+    cnt_raw = np.bincount(bid, weights=raw_ok, minlength=n)
+    sum_fil = np.bincount(bid, weights=np.where(fil_ok, fil, 0.0), minlength=n)
+    sum_raw = np.bincount(bid, weights=np.where(raw_ok, raw, 0.0), minlength=n)
+
+    for b in np.unique(bid).tolist():
+        cf, cr = int(cnt_fil[b]), int(cnt_raw[b])
+        avg_fil = float(sum_fil[b] / cf) if cf > 0 else None
+        avg_raw = float(sum_raw[b] / cr) if cr > 0 else None
+        out[b] = {"avg_filtered": avg_fil, "avg_rssi": avg_raw, "count": max(cf, cr)}
     return out
 
-def pick_top3_ready_by_count(window: deque, min_count: int = COUNT_TRIGGER):
+def pick_top3_ready_by_count(window: RssiRing, min_count: int = COUNT_TRIGGER):
     """
     시간 무관, 유효 샘플 수로 트리거:
     - 집계 후 Top3 후보를 고르고,
@@ -162,134 +388,613 @@ def pick_top3_ready_by_count(window: deque, min_count: int = COUNT_TRIGGER):
         })
     return top3
 
+# ====== 강건 통계 / 적응형 트리거 ======
+def robust_window_stats(window: RssiRing) -> Dict[int, Dict[str, float]]:
+    """
+    비콘별 Hampel 필터(중앙값 ± K·MAD) 후 평균/표준편차/개수.
+    값은 filtered 우선, 없으면 raw.
+    """
+    _, bid, fil, raw = window.arrays()
+    vals_all = np.where(np.isnan(fil), raw, fil)
+    ok = ~np.isnan(vals_all)
+    bid, vals_all = bid[ok], vals_all[ok]
+    samples = {b: vals_all[bid == b] for b in np.unique(bid).tolist()}
+
+    out: Dict[int, Dict[str, float]] = {}
+    for bid, vals in samples.items():
+        arr = vals.astype(float)
+        med = float(np.median(arr))
+        mad = max(float(np.median(np.abs(arr - med))) * 1.4826, RSSI_STD_FLOOR)
+        inl = arr[np.abs(arr - med) <= HAMPEL_K * mad]
+        std = float(inl.std(ddof=1)) if len(inl) > 1 else 0.0
+        out[bid] = {
+            "median": med,
+            "mean": float(inl.mean()),
+            "std": max(std, RSSI_STD_FLOOR),
+            "count": int(len(inl)),
+            "outliers": int(len(arr) - len(inl)),
+        }
+    return out
+
+def fix_uncertainty(top3, x: float, y: float) -> float:
+    """
+    거리 오차를 선형화해 위치 공분산 (JᵀWJ)⁻¹ 의 √trace (m, 1σ).
+    σ_d = d·ln10/PATH_LOSS_DIV·σ_rssi/√n
+    """
+    H = np.zeros((2, 2))
+    for t in top3:
+        bx, by = beacon_coords[t["id"]]
+        d = rssi_to_distance(t["filtered"])
+        sd = d * math.log(10) / PATH_LOSS_DIV * t["std"] / math.sqrt(max(t["count"], 1))
+        dx, dy = x - bx, y - by
+        rng = math.hypot(dx, dy) or 1e-6
+        u = np.array([dx / rng, dy / rng])
+        H += np.outer(u, u) / max(sd, 1e-6) ** 2
+    try:
+        cov = np.linalg.inv(H)
+    except np.linalg.LinAlgError:
+        return math.inf
+    tr = float(np.trace(cov))
+    return math.sqrt(tr) if tr > 0 else math.inf
+
+def pick_top3_adaptive(window: RssiRing, max_uncertainty: float = FIX_UNCERTAINTY_M):
+    """
+    Top3(강건 평균 RSSI 기준, 각 FIX_MIN_SAMPLES 이상)로 위치를 가추정하고
+    불확도가 max_uncertainty 미만이면 (top3, 불확도) 반환, 아니면 (None, 불확도).
+    """
+    stats = robust_window_stats(window)
+    cand = [(bid, d) for bid, d in stats.items() if d["count"] >= FIX_MIN_SAMPLES]
+    if len(cand) < 3:
+        return None, None
+    cand.sort(key=lambda kv: kv[1]["mean"], reverse=True)
+
+    top3 = []
+    for bid, d in cand[:3]:
+        top3.append({
+            "id": bid,
+            "filtered": d["mean"],
+            "rssi": d["median"],
+            "distance": None,
+            "count": d["count"],
+            "std": d["std"],
+        })
+    try:
+        x, y, _ = trilaterate_from_top3(top3, use_filtered=True)
+    except Exception:
+        return None, None
+    unc = fix_uncertainty(top3, x, y)
+    if unc < max_uncertainty:
+        return top3, unc
+    return None, unc
+
+def pick_top3(window: RssiRing, force: bool = False):
+    """TRIGGER_MODE에 따른 Top3 선택. force=True(그래프 변경 재계산)면 품질 기준 없이 가능한 Top3"""
+    if TRIGGER_MODE == "adaptive":
+        top3, _ = pick_top3_adaptive(window, math.inf if force else FIX_UNCERTAINTY_M)
+        return top3
+    return pick_top3_ready_by_count(window, COUNT_TRIGGER)
+
 # ====== 그래프 조작 ======
-def _restore_node_in_graph(floor: str, node) -> bool:
+async def _restore_node_in_graph(floor: str, node) -> bool:
     """원본 그래프에서 해당 node의 이웃을 가져와 현재 그래프에 복구. 단, 화재 유발 삭제 노드는 복구 불가."""
     if floor not in FLOOR_TO_GRAPH_MAP: return False
-    num = FLOOR_TO_GRAPH_MAP[floor]
-    if not ensure_files(num): return False
 
     # 화재 유발 삭제 노드면 복구 금지
     if floor in FIRE_BLOCKED_NODES and node in FIRE_BLOCKED_NODES[floor]:
         print(f"[Graph] restore_node 차단: {node} (floor={floor}) is FIRE-BLOCKED")
         return False
-    
-    gfile = graph_filename(num)
-    ofile = original_filename(num)
-
-    graph = load_graph(gfile)
-    orig = ORIGINAL_GRAPHS.get(ofile, {})
 
-    if node not in orig:
+    if FLOORS[floor].node_index(node) < 0:
         return False
-
-    # 노드 및 양방향 간선 복구(이웃이 현재 그래프에 존재하는 경우에 한해 연결)
-    neighbors = [n for n in orig[node] if n in graph or n in orig]
-    if node not in graph:
-        graph[node] = []
-
-    for nb in neighbors:
-        if nb not in graph:
-            continue
-        if nb not in graph[node]:
-            graph[node].append(nb)
-        if node not in graph[nb]:
-            graph[nb].append(node)
-
-    save_graph(graph, gfile)
-    return True
+    ok = await JOURNAL.record({"op": "restore_node", "floor": floor, "node": list(node)})
+    _graph_changed(floor)
+    return ok
+
+def _graph_changed(floor: str):
+    """층 그래프 변경 후 계단 비용표 증분 갱신(다른 층 계단 경로에도 반영) + 경로 캐시 무효화"""
+    global GRAPH_VERSION
+    STAIRS.update(floor, JOURNAL.graphs[floor])
+    GRAPH_VERSION += 1
+    ROUTE_CACHE.clear()
+    EXIT_FIELDS.clear()
+
+# ====== 측위/경로 캐시 ======
+def _top3_rssi(t) -> float:
+    """Top3 항목의 대표 RSSI: filtered가 없거나 None(count 모드)이면 rssi"""
+    v = t.get("filtered")
+    return t["rssi"] if v is None else v
+
+def _fix_signature(top3) -> tuple:
+    """Top3를 (비콘 id, RSSI 구간) 서명으로 양자화(비콘 순서 무관)"""
+    return tuple(sorted((t["id"], int(math.floor(_top3_rssi(t) / FIX_CACHE_BIN_DB))) for t in top3))
+
+def _exit_field(floor: str):
+    """층의 탈출구 경로장 (그래프 버전이 바뀔 때만 다시 계산)"""
+    cached = EXIT_FIELDS.get(floor)
+    if cached and cached[0] == GRAPH_VERSION:
+        return cached[1]
+    targets = TARGETS_MAP.get(original_filename(FLOOR_TO_GRAPH_MAP[floor]), {})
+    field = JOURNAL.graphs[floor].exit_field(targets, STAIRS.table(floor))
+    EXIT_FIELDS[floor] = (GRAPH_VERSION, field)
+    return field
+
+def _route_for(floor: str, x: float, y: float, area, start=None):
+    """compute_best_path와 같은 규칙으로 시작 노드/경로. 경로는 (층, 그래프 버전, 시작 노드)로 캐시"""
+    if floor not in FLOOR_TO_GRAPH_MAP:
+        raise ValueError(f"unknown floor: {floor}")
+    graph = JOURNAL.graphs[floor]
+    if start is None:
+        node = map_area_to_node(area, floor) if area else None
+        if node and node in graph:
+            start = node
+        else:
+            i = graph.nearest((x, y))
+            if i < 0:
+                raise RuntimeError("그래프 노드가 없습니다.")
+            start = graph.coord(i)
+    key = (floor, GRAPH_VERSION, start)
+    path = ROUTE_CACHE.get(key)
+    if path is None:
+        path = _exit_field(floor).path(start)[0]
+        ROUTE_CACHE.put(key, path)
+    return start, path
+
+def _cache_stats() -> dict:
+    return {"fix": {f: c.stats() for f, c in FIX_CACHE.items()}, "route": ROUTE_CACHE.stats(),
+            "graph_version": GRAPH_VERSION}
 
 # ====== 즉시 계산/브로드캐스트 ======
-async def _emit_with_top3(top3, floor: str, window: deque, tag: str = ""):
-    try:
-        x, y, method = trilaterate_from_top3(top3, use_filtered=True)
-    except Exception as e:
-        print("[Tri] 실패:", e)
+def _emit_with_top3(top3, floor: str, window: RssiRing, tag: str = "", ws=None):
+    with PROFILER.section():
+        payload = _compute_fix(top3, floor, window, tag, ws)
+    if payload is None:
         return
+    if ws is not None:
+        LAST_FIX[ws] = payload
+    _broadcast(clients - DASHBOARDS, json.dumps(payload, ensure_ascii=False), key=_fix_key(ws))
+
+def _compute_fix(top3, floor: str, window: RssiRing, tag: str = "", ws=None):
+    """Top3 → 좌표/구역/경로 계산 후 전송할 payload (실패 시 None)"""
+    cache = FIX_CACHE.get(floor)
+    if cache is None:
+        cache = FIX_CACHE[floor] = LRUCache(FIX_CACHE_SIZE)
+    sig = _fix_signature(top3)
+    hit = cache.get(sig)
+    if hit is not None:
+        x, y, method, area, start, version = hit
+        if version != GRAPH_VERSION:
+            start = None        # 그래프가 바뀌었으면 시작 노드부터 다시
+    else:
+        try:
+            x, y, method = trilaterate_from_top3(top3, use_filtered=True)
+        except Exception as e:
+            print("[Tri] 실패:", e)
+            return None
+        try:
+            area = classify_area((x, y), floor, strict=False)
+        except Exception:
+            area = None
+        start = None
 
     try:
-        area = classify_area((x, y), floor, strict=False)
-    except Exception:
-        area = None
-
-    try:
-        start_node, best_path = compute_best_path(floor, x, y)
+        start_node, best_path = _route_for(floor, x, y, area, start)
     except Exception as e:
         print("[Path] 계산 실패:", e)
-        return
+        return None
+    cache.put(sig, (x, y, method, area, start_node, GRAPH_VERSION))
 
-    window_log = [compress_batch_for_log(b) for b in list(window)]
-    top3_log = [(t["id"], round(t.get("filtered", t.get("rssi", -999)), 2), t["count"]) for t in top3]
+    best_path = _track_route(ws, floor, start_node, best_path, area)
+
+    window_log = window.summary()
+    top3_log = [(t["id"], round(_top3_rssi(t), 2), t["count"]) for t in top3]
     print(f"[Tri{tag}] floor={floor}, method={method}, TAG=({x:.2f}, {y:.2f}) | top3={top3_log}")
     print(f"[RSSI window] {window_log}")
     print(f"[Area] floor={floor}, area={area}")
     print(f"[Path] start={start_node}, path_len={len(best_path)}")
 
-    payload = {
+    return _fix_payload(floor, start_node, best_path, method, area, top3, x, y, window_log)
+
+def _track_route(ws, floor: str, start_node, best_path, area=None):
+    """점유 위치 기록. 혼잡 배정 경로가 같은 시작 노드 기준이면 그 경로를 사용(개인 최단경로로 되돌아가 깜빡이지 않게)"""
+    if ws is None:
+        return best_path
+    OCCUPANTS[ws] = {"floor": floor, "node": start_node, "ts": time.time()}
+    OCCUPANCY.update(ws, floor, area)
+    r = ROUTES.get(ws)
+    if ROUTING_MODE == "congestion" and r and r["floor"] == floor and r["start"] == start_node and r["path"]:
+        return r["path"]
+    return best_path
+
+def _fix_payload(floor, start_node, best_path, method, area, top3, x, y, window_log) -> dict:
+    return {
         "floor": floor,
         "snapped_list": [list(start_node)],
         "best_path": [list(pt) for pt in best_path],
         "note": "live_update",
         "method": method,
         "area": area,
-        "debug": { "top3": top3, "tag_xy": [x, y], "recent_batches": list(window) },
+        "debug": { "top3": top3, "tag_xy": [x, y], "window": window_log },
     }
-    await asyncio.gather(
-        *[c.send(json.dumps(payload, ensure_ascii=False)) for c in list(clients)]
-    )
+
+# ====== 틱 기반 일괄 측위 ======
+def _run_fix_batch(items):
+    """
+    준비 후보 연결들을 한 번에 측위: 그룹 통계/Top3/삼변측량/불확도/구역/시작 노드는 배치 연산,
+    경로는 ROUTE_CACHE로 (층, 그래프 버전, 시작 노드)별 한 번만 계산. return: [(ws, payload)]
+    """
+    cid, bid, val = [], [], []
+    for i, (_, p) in enumerate(items):
+        _, b, f, r = p["window"].arrays()
+        v = np.where(np.isnan(f), r, f)
+        ok = ~np.isnan(v)
+        cid.append(np.full(int(ok.sum()), i))
+        bid.append(b[ok].astype(np.int64))
+        val.append(v[ok])
+    if not any(len(c) for c in cid):
+        return []
+    st = batch_fix.robust_stats_batch(np.concatenate(cid), np.concatenate(bid), np.concatenate(val),
+                                      HAMPEL_K, RSSI_STD_FLOOR)
+    has3, idx = batch_fix.select_top3_batch(st, len(items), FIX_MIN_SAMPLES)
+    idx = np.where(idx >= 0, idx, 0)
+    bids = st["bid"][idx]
+    xy = batch_fix.beacon_xy(bids)
+    d = batch_fix.rssi_to_distance_np(st["mean"][idx])
+    x, y, direct = batch_fix.trilaterate_batch(xy, d)
+    # 세 원이 교차하지 않는 행은 least_squares 폴백도 배치로(scipy 단건 호출 대신)
+    ls = np.nonzero(has3 & ~direct)[0]
+    if len(ls):
+        x[ls], y[ls] = batch_fix.least_squares_batch(xy[ls], d[ls])
+    unc = batch_fix.uncertainty_batch(xy, d, st["std"][idx], st["count"][idx], x, y)
+
+    fixes = []    # (i, top3, x, y, method)
+    for i in np.nonzero(has3)[0].tolist():
+        top3 = [{"id": int(bids[i, k]), "filtered": float(st["mean"][idx[i, k]]),
+                 "rssi": float(st["median"][idx[i, k]]), "distance": None,
+                 "count": int(st["count"][idx[i, k]]), "std": float(st["std"][idx[i, k]])} for k in range(3)]
+        if unc[i] < FIX_UNCERTAINTY_M:
+            fixes.append((i, top3, float(x[i]), float(y[i]), "direct" if direct[i] else "least_squares"))
+
+    by_floor: Dict[str, list] = {}
+    for fx in fixes:
+        by_floor.setdefault(items[fx[0]][1]["floor"], []).append(fx)
+
+    out = []
+    for floor, fl in by_floor.items():
+        graph = JOURNAL.graphs.get(floor)
+        if graph is None or floor not in FLOOR_TO_GRAPH_MAP or not graph.alive.any():
+            continue
+        fx_x = np.array([f[2] for f in fl])
+        fx_y = np.array([f[3] for f in fl])
+        areas = batch_fix.classify_batch(floor, fx_x, fx_y)
+        ids = graph.alive_ids()
+        nearest = batch_fix.nearest_nodes_batch(graph.nodes[ids].astype(float), fx_x, fx_y)
+        for (i, top3, xi, yi, method), area, ni in zip(fl, areas, nearest.tolist()):
+            node = map_area_to_node(area, floor) if area else None
+            start, path = _route_for(floor, xi, yi, area, node if node and node in graph else graph.coord(ids[ni]))
+            ws, p = items[i]
+            best_path = _track_route(ws, floor, start, path, area)
+            out.append((ws, _fix_payload(floor, start, best_path, method, area, top3, xi, yi,
+                                         p["window"].summary())))
+    return out
+
+async def _fix_scheduler():
+    """FIX_TICK_SEC마다 대기 중인 연결을 모아 한 번에 측위하고 결과를 내보낸다"""
+    while True:
+        await asyncio.sleep(FIX_TICK_SEC)
+        if not FIX_PENDING:
+            continue
+        now = time.time()
+        items = [(ws, p) for ws, p in FIX_PENDING.items()
+                 if now - LAST_FIX_TS.get(ws, 0.0) >= FIX_MIN_INTERVAL]
+        for ws, _ in items:
+            FIX_PENDING.pop(ws, None)
+        if not items:
+            continue
+        t0 = time.perf_counter()
+        with PROFILER.section():
+            results = _run_fix_batch(items)
+        for ws, payload in results:
+            LAST_FIX_TS[ws] = now
+            LAST_FIX[ws] = payload
+        if results:
+            print(f"[Tick] candidates={len(items)}, fixes={len(results)}, "
+                  f"{(time.perf_counter()-t0)*1000:.1f}ms")
+            targets = clients - DASHBOARDS
+            for ws, payload in results:
+                _broadcast(targets, json.dumps(payload, ensure_ascii=False), key=_fix_key(ws))
+
+# ====== 혼잡 고려 일괄 재배정 ======
+async def _congestion_router():
+    """ROUTE_INTERVAL마다 층별 점유 인원 전체를 한 번에 배정하고, 경로가 바뀐 사람에게만 전송"""
+    while True:
+        await asyncio.sleep(ROUTE_INTERVAL)
+        if ROUTING_MODE != "congestion":
+            continue
+        now = time.time()
+        for ws, o in list(OCCUPANTS.items()):
+            if now - o["ts"] > OCCUPANT_STALE_SEC:
+                OCCUPANTS.pop(ws, None)
+                ROUTES.pop(ws, None)
+
+        by_floor: Dict[str, dict] = {}
+        for ws, o in OCCUPANTS.items():
+            by_floor.setdefault(o["floor"], {})[ws] = o["node"]
+
+        for floor, occ in by_floor.items():
+            graph = JOURNAL.graphs.get(floor)
+            if graph is None or not graph.alive.any():
+                continue
+            # 계단 너머가 막힌 2순위 이하 목표(비용 inf)는 제외
+            stair_cost = STAIRS.table(floor)
+            targets = {p: [t for t in ts if p == 1 or stair_cost.get(t, 0) != math.inf]
+                       for p, ts in TARGETS_MAP.get(original_filename(FLOOR_TO_GRAPH_MAP[floor]), {}).items()}
+            t0 = time.perf_counter()
+            assigned, worst = assign_routes(graph, occ, targets)
+            rerouted = 0
+            for ws, (path, eta) in assigned.items():
+                prev = ROUTES.get(ws)
+                ROUTES[ws] = {"floor": floor, "start": occ[ws], "path": path, "eta": eta}
+                if not path or (prev and prev["path"] == path):
+                    continue
+                rerouted += 1
+                _send(ws, json.dumps({
+                    "floor": floor,
+                    "snapped_list": [list(occ[ws])],
+                    "best_path": [list(pt) for pt in path],
+                    "note": "congestion_update",
+                    "eta_s": round(eta, 1),
+                }, ensure_ascii=False), key=_fix_key(ws))
+            if rerouted:
+                print(f"[Flow] floor={floor}, occupants={len(occ)}, eta={worst:.1f}s, "
+                      f"rerouted={rerouted} ({(time.perf_counter()-t0)*1000:.1f}ms)")
+
+# ====== 재실 인원 스냅샷 발행 ======
+async def _occupancy_publisher():
+    """OCCUPANCY_PUBLISH_SEC마다 오래된 인원을 정리하고, 바뀐 경우에만 구독 대시보드에 스냅샷 전송"""
+    sent_version = OCCUPANCY.version   # 구독 시점 스냅샷은 구독 응답으로 이미 보냄
+    while True:
+        await asyncio.sleep(OCCUPANCY_PUBLISH_SEC)
+        expired = OCCUPANCY.expire(OCCUPANT_STALE_SEC)
+        if expired:
+            print(f"[Occupancy] stale 제외 {expired}명, total={len(OCCUPANCY.where)}")
+        if not DASHBOARDS or OCCUPANCY.version == sent_version:
+            continue
+        sent_version = OCCUPANCY.version
+        _broadcast(DASHBOARDS, json.dumps(OCCUPANCY.snapshot(), ensure_ascii=False), key="occupancy")
+
+# ====== 세션 재개 ======
+def _sweep_sessions(now: float):
+    # TTL이 모두 같아 넣은 순서 = 만료 순서 → 앞에서부터만 확인
+    while SESSIONS:
+        token, s = next(iter(SESSIONS.items()))
+        if s["expires"] > now:
+            break
+        SESSIONS.popitem(last=False)
+
+def _session_state(ws, window: RssiRing, floor: str, last_fix_ts: float) -> dict:
+    return {
+        "window": window,
+        "floor": floor,
+        "last_fix_ts": last_fix_ts,
+        "tick_fix_ts": LAST_FIX_TS.get(ws),
+        "fix": LAST_FIX.get(ws),
+        "occupant": OCCUPANTS.get(ws),
+        "route": ROUTES.get(ws),
+    }
+
+def _park_session(token: str, ws, window: RssiRing, floor: str, last_fix_ts: float):
+    """끊긴 연결의 상태를 SESSION_TTL_SEC 동안 보관"""
+    now = time.time()
+    _sweep_sessions(now)
+    SESSIONS[token] = dict(_session_state(ws, window, floor, last_fix_ts), expires=now + SESSION_TTL_SEC)
+
+def _take_over(old):
+    """끊김을 아직 감지 못한 옛 연결을 브로드캐스트/재실 집계에서 빼고 닫는다 (정리는 옛 handle()의 finally)"""
+    clients.discard(old)
+    OCCUPANCY.remove(old)
+    asyncio.create_task(old.close(code=1000, reason="session resumed"))
+
+def _resume_session(token: str, ws):
+    """보관 상태(또는 아직 살아 있는 옛 연결의 상태)를 새 연결(ws)로 옮긴다. return: 상태(없거나 만료면 None)"""
+    live = LIVE_SESSIONS.get(token)
+    if live is not None and live[0] is not ws:
+        old, state = live
+        s = _session_state(old, *state())
+        _take_over(old)
+        print("[Session] 끊김 감지 전 resume → 옛 연결 상태 인계")
+    else:
+        _sweep_sessions(time.time())
+        s = SESSIONS.pop(token, None)
+    if s is None:
+        return None
+    if s["tick_fix_ts"] is not None:
+        LAST_FIX_TS[ws] = s["tick_fix_ts"]
+    if s["occupant"] is not None:
+        OCCUPANTS[ws] = s["occupant"]
+    if s["route"] is not None:
+        ROUTES[ws] = s["route"]
+    fix = s["fix"]
+    if fix is not None:
+        LAST_FIX[ws] = fix
+        OCCUPANCY.update(ws, fix["floor"], fix.get("area"))
+    return s
+
+def _resume_payload(ws):
+    """마지막 측위 payload에 현재 배정 경로를 반영해 재전송용으로"""
+    fix = LAST_FIX.get(ws)
+    if fix is None:
+        return None
+    payload = dict(fix, note="session_resume")
+    r = ROUTES.get(ws)
+    if r and r["path"] and r["floor"] == fix["floor"] and [list(r["start"])] == fix["snapped_list"]:
+        payload["best_path"] = [list(pt) for pt in r["path"]]
+    return payload
+
+def _session_msg(token: str, resumed: bool = False) -> str:
+    return json.dumps({"kind": "session", "token": token, "ttl_s": SESSION_TTL_SEC, "resumed": resumed})
+
+# ====== 온디맨드 프로파일링 ======
+def _profile_start(mode: str = "sample", scope: str = "pipeline", duration: float = PROFILE_DEFAULT_SEC) -> bool:
+    """프로파일 세션 시작 + duration 뒤 자동 종료 예약 (이벤트 루프 스레드에서 호출)"""
+    global _PROFILE_TIMER
+    if not PROFILER.start(mode, scope):
+        return False
+    duration = min(max(float(duration), 1.0), PROFILE_MAX_SEC)
+    _PROFILE_TIMER = asyncio.get_running_loop().call_later(duration, _profile_stop)
+    return True
+
+def _profile_stop() -> list:
+    global _PROFILE_TIMER
+    if _PROFILE_TIMER is not None:
+        _PROFILE_TIMER.cancel()
+        _PROFILE_TIMER = None
+    return PROFILER.stop()
+
+def _profile_allowed(ws, msg: dict) -> bool:
+    if PROFILE_ADMIN_TOKEN:
+        return msg.get("token") == PROFILE_ADMIN_TOKEN
+    addr = getattr(ws, "remote_address", None) or ("",)
+    return addr[0] in ("127.0.0.1", "::1")
+
+def _profile_from_env():
+    """EVAC_PROFILE=<mode>[:<초>[:<scope>]] 이면 시작과 함께 측정"""
+    spec = os.environ.get(PROFILE_ENV, "").strip()
+    if not spec:
+        return
+    parts = spec.split(":")
+    try:
+        _profile_start(parts[0] or "sample",
+                       parts[2] if len(parts) > 2 else "pipeline",
+                       float(parts[1]) if len(parts) > 1 and parts[1] else PROFILE_DEFAULT_SEC)
+    except ValueError as e:
+        print(f"[Profile] {PROFILE_ENV} 무시: {e}")
+
+# ====== 화재 이미지 프레임 ======
+def _save_fire_image(image_id: str, jpg: bytes):
+    os.makedirs(FIRE_IMAGE_DIR, exist_ok=True)
+    with open(os.path.join(FIRE_IMAGE_DIR, f"{image_id}.jpg"), "wb") as f:
+        f.write(jpg)
+
+async def _handle_image_frame(sender, data: bytes):
+    """바이너리 이미지 프레임: JSON/JPEG 디코딩 없이 보관·저장·중계만 한다"""
+    if len(data) <= FIRE_IMAGE_HEADER or not data.startswith(FIRE_IMAGE_MAGIC):
+        print(f"[Image] 알 수 없는 바이너리 프레임 무시 ({len(data)} bytes)")
+        return
+    image_id = data[len(FIRE_IMAGE_MAGIC):FIRE_IMAGE_HEADER].hex()
+    jpg = data[FIRE_IMAGE_HEADER:]
+
+    FIRE_IMAGES[image_id] = jpg
+    while len(FIRE_IMAGES) > FIRE_IMAGE_KEEP:
+        FIRE_IMAGES.popitem(last=False)
+    print(f"[Image] received image_id={image_id} ({len(jpg)} bytes)")
+
+    if SAVE_FIRE_IMAGES:
+        try:
+            await asyncio.to_thread(_save_fire_image, image_id, jpg)
+        except Exception as e:
+            print("[Image] 저장 실패:", e)
+    if FORWARD_FIRE_IMAGE:
+        _broadcast([c for c in clients if c is not sender], data)
 
 # ====== 메인 핸들러 ======
+def _is_detector(ws) -> bool:
+    req = getattr(ws, "request", None)           # websockets ≥ 13 (새 asyncio 구현)
+    path = getattr(req, "path", None) or getattr(ws, "path", "") or ""
+    return path.split("?", 1)[0].rstrip("/") == DETECTOR_PATH
+
 async def handle(ws):
-    clients.add(ws)
-    window = deque()            # 길이 제한 제거 (count 트리거)
+    detector = _is_detector(ws)
+    if detector:
+        DETECTORS.add(ws)
+        print(f"[Detector] connected (detectors={len(DETECTORS)})")
+    elif len(clients) >= MAX_CLIENTS:
+        print(f"[Load] 접속 거부: clients={len(clients)} >= {MAX_CLIENTS}")
+        await ws.close(code=1013, reason="server full")
+        return
+    else:
+        clients.add(ws)
+    OUTBOXES[ws] = Outbox(ws).start()
+    window = RssiRing()         # 고정 용량 링 버퍼(가득 차면 오래된 샘플부터 덮어씀)
     last_floor = "B2"
+    bucket = TokenBucket()
+    last_notice = 0.0
+    last_fix_ts = 0.0
+    token = secrets.token_urlsafe(16)
+    state = lambda: (window, last_floor, last_fix_ts)   # resume 인계용(항상 현재 값)
+    if not detector:
+        LIVE_SESSIONS[token] = (ws, state)
 
     try:
+        if not detector:
+            _send(ws, _session_msg(token), "high")
+        if LOAD_STATE["overload"]:
+            _send(ws, _server_load_msg(), key="server_load")
+
         async for text in ws:
-            # 🔥 화재 알림: 즉시 브로드캐스트
-            try:
-                maybe_json = json.loads(text)
-                if (maybe_json.get("kind") or "") == "fire_alert":
-                    floor = maybe_json.get("floor")
-                    conf = maybe_json.get("confidence")
-                    print(f"🔥 fire_alert received: floor={floor}, conf={conf}")
-
-                    # 층별 최근 화재 시각 기록
-                    if isinstance(floor, str) and floor in RECENT_FIRE_TS:
-                        RECENT_FIRE_TS[floor] = time.time()
-                    if DROP_FIRE_IMAGE:
-                        maybe_json.pop("image", None)
-                    if ADD_TIMESTAMP:
-                        maybe_json["ts"] = dt.datetime.now().isoformat(timespec="seconds")
-
-                    fire_text = json.dumps(maybe_json, ensure_ascii=False)
-                    if clients:
-                        await asyncio.gather(
-                            *[c.send(fire_text) for c in list(clients)],
-                            return_exceptions=True
-                        )
-                    continue
-            except Exception:
-                pass
+            # 📷 바이너리 프레임은 화재 이미지
+            if isinstance(text, (bytes, bytearray)):
+                await _handle_image_frame(ws, bytes(text))
+                continue
 
-            # ====== BLE / 그래프 조작 처리 ======
             try:
                 msg = json.loads(text)
             except Exception:
                 continue
+            if not isinstance(msg, dict):
+                continue
 
             kind = (msg.get("kind") or "").strip()
 
+            # 🔥 화재 알림: 즉시 브로드캐스트
+            if kind == "fire_alert":
+                floor = msg.get("floor")
+                conf = msg.get("confidence")
+                print(f"🔥 fire_alert received: floor={floor}, conf={conf}, image_id={msg.get('image_id')}")
+
+                # 층별 최근 화재 시각 기록
+                if isinstance(floor, str) and floor in RECENT_FIRE_TS:
+                    await JOURNAL.record({"op": "fire", "floor": floor, "ts": time.time()})
+                if DROP_FIRE_IMAGE:
+                    msg.pop("image", None)
+                if ADD_TIMESTAMP:
+                    msg["ts"] = dt.datetime.now().isoformat(timespec="seconds")
+
+                _broadcast(clients, json.dumps(msg, ensure_ascii=False), "high")
+                continue
+
+            # 🔥 진행 중 화재 conf 갱신/해제: 그래프는 그대로 두고 중계만
+            if kind in ("fire_update", "fire_clear"):
+                if ADD_TIMESTAMP:
+                    msg["ts"] = dt.datetime.now().isoformat(timespec="seconds")
+                print(f"🔥 {kind}: floor={msg.get('floor')}, conf={msg.get('confidence')}, incident={msg.get('incident_id')}")
+                _broadcast(clients, json.dumps(msg, ensure_ascii=False), "high")
+                continue
+
             # ====== BLE 수신 ======
+            # 화재/그래프 메시지는 제한하지 않고, BLE 배치만 토큰 버킷으로 거른다
+            if kind in ("rssi_batch", "ble_readings"):
+                now = time.monotonic()
+                factor = OVERLOAD_RATE_FACTOR if LOAD_STATE["overload"] else 1.0
+                if not bucket.allow(now, factor):
+                    LOAD_STATE["shed"] += 1
+                    if now - last_notice >= THROTTLE_NOTICE_SEC:
+                        last_notice = now
+                        _send(ws, _server_load_msg(throttled=True), key="server_load")
+                    continue
+
             if kind == "rssi_batch":
                 last_floor = msg.get("floor", last_floor)
                 readings = msg.get("readings", [])
-                window.append({"ts": time.time(), "readings": readings})
+                if not isinstance(readings, list):
+                    continue
+                window.push_readings(readings[:MAX_READINGS_PER_MSG])
 
             elif kind == "ble_readings":
                 last_floor = msg.get("floor", last_floor)
                 lst = msg.get("list", [])
-                push_batch(window, lst)
+                if not isinstance(lst, list):
+                    continue
+                push_batch(window, lst[:MAX_READINGS_PER_MSG])
 
             elif kind == "floor_detected":
                 f = msg.get("floor")
@@ -312,58 +1017,38 @@ async def handle(ws):
                 if now_ts - last_fire_ts <= FIRE_DELETE_WINDOW:
                     fire_related = True
 
-                num = FLOOR_TO_GRAPH_MAP.get(floor)
-                if num is None or not ensure_files(num):
-                    print("[Graph] delete 실패: ensure_files")
+                if floor not in FLOOR_TO_GRAPH_MAP:
+                    print("[Graph] delete 실패: unknown floor", floor)
                     continue
 
-                gfile = graph_filename(num)
-                graph = load_graph(gfile)
-                remove_node(graph, node)
-                save_graph(graph, gfile)
+                # 삭제 + (화재 유발이면) 복구 금지 등록을 저널 한 줄로 기록
+                await JOURNAL.record({"op": "delete", "floor": floor, "node": list(node), "block": fire_related})
+                _graph_changed(floor)
                 print(f"[Graph] deleted {node} on {floor}")
 
-                # 화재 유발 노드면 복구 금지 목록에 등록
-                if fire_related:
-                    FIRE_BLOCKED_NODES.setdefault(floor, set()).add(node)
-
-                await ws.send(json.dumps({"kind":"graph_ack","op":"delete","floor":floor,"node":list(node),"fire_related":fire_related}))
+                _send(ws, json.dumps({"kind":"graph_ack","op":"delete","floor":floor,"node":list(node),"fire_related":fire_related}), "high")
                 # 그래프 변경 즉시 재계산
-                top3 = pick_top3_ready_by_count(window, COUNT_TRIGGER)
+                top3 = pick_top3(window, force=True)
                 if top3:
-                    await _emit_with_top3(top3, floor, window, tag="*")
+                    _emit_with_top3(top3, floor, window, tag="*", ws=ws)
                 continue
 
             elif kind in ("graph_restore", "restore_graph"):
                 floor = msg.get("floor", last_floor)
-                num = FLOOR_TO_GRAPH_MAP.get(floor)
-                if num is None or not ensure_files(num):
-                    print("[Graph] restore 실패: ensure_files")
+                if floor not in FLOOR_TO_GRAPH_MAP:
+                    print("[Graph] restore 실패: unknown floor", floor)
                     continue
 
-                ofile = original_filename(num)
-                gfile = graph_filename(num)
-                orig = ORIGINAL_GRAPHS.get(ofile, {}).copy()  # dict copy
-
-                # FIRE_BLOCKED_NODES에 등록된 노드는 원상복구하지 않음
+                # 원본으로 되돌리되 FIRE_BLOCKED_NODES에 등록된 노드는 원상복구하지 않음
                 blocked = FIRE_BLOCKED_NODES.get(floor, set())
-                if blocked:
-                    for bn in list(blocked):
-                        if bn in orig:
-                            # 노드 키 제거
-                            orig.pop(bn, None)
-                    # 양방향 간선에서 차단 노드 제거
-                    for k, neigh in orig.items():
-                        if isinstance(neigh, list):
-                            orig[k] = [x for x in neigh if x not in blocked]
-
-                save_graph(orig, gfile)  # 원본(차단 제외)으로 덮기
+                await JOURNAL.record({"op": "restore_all", "floor": floor})
+                _graph_changed(floor)
                 print(f"[Graph] restored ALL on {floor} (blocked_excluded={len(blocked)})")
 
-                await ws.send(json.dumps({"kind":"graph_ack","op":"restore_all","floor":floor,"blocked_excluded":len(blocked)}))
-                top3 = pick_top3_ready_by_count(window, COUNT_TRIGGER)
+                _send(ws, json.dumps({"kind":"graph_ack","op":"restore_all","floor":floor,"blocked_excluded":len(blocked)}), "high")
+                top3 = pick_top3(window, force=True)
                 if top3:
-                    await _emit_with_top3(top3, floor, window, tag="*")
+                    _emit_with_top3(top3, floor, window, tag="*", ws=ws)
                 continue
 
             elif kind in ("graph_restore_node", "restore_node"):
@@ -375,12 +1060,65 @@ async def handle(ws):
                     print("[Graph] restore_node 실패: node 파싱 오류:", node_payload)
                     continue
 
-                ok = _restore_node_in_graph(floor, node)
+                ok = await _restore_node_in_graph(floor, node)
                 print(f"[Graph] restore_node {node} on {floor} -> {ok}")
-                await ws.send(json.dumps({"kind":"graph_ack","op":"restore_node","floor":floor,"node":list(node),"ok":ok}))
-                top3 = pick_top3_ready_by_count(window, COUNT_TRIGGER)
+                _send(ws, json.dumps({"kind":"graph_ack","op":"restore_node","floor":floor,"node":list(node),"ok":ok}), "high")
+                top3 = pick_top3(window, force=True)
                 if top3:
-                    await _emit_with_top3(top3, floor, window, tag="*")
+                    _emit_with_top3(top3, floor, window, tag="*", ws=ws)
+                continue
+
+            # ====== 세션 재개 ======
+            elif kind == "resume":
+                old = msg.get("token")
+                s = _resume_session(old, ws) if isinstance(old, str) else None
+                if s is None:
+                    _send(ws, _session_msg(token), "high")
+                    continue
+                if LIVE_SESSIONS.get(token, (None,))[0] is ws:
+                    LIVE_SESSIONS.pop(token)
+                token = old
+                LIVE_SESSIONS[token] = (ws, state)
+                # 보관 윈도우로 교체(재접속 후 resume 전에 받은 샘플은 뒤에 이어 붙임)
+                for t, b, f, r in zip(*window.arrays()):
+                    s["window"].append(t, int(b), f, r)
+                window = s["window"]
+                last_floor = s["floor"]
+                last_fix_ts = s["last_fix_ts"]
+                _send(ws, _session_msg(token, resumed=True), "high")
+                payload = _resume_payload(ws)
+                print(f"[Session] resume floor={last_floor}, samples={window.size}, route={'yes' if payload else 'no'}")
+                if payload is not None:
+                    _broadcast(clients - DASHBOARDS, json.dumps(payload, ensure_ascii=False), key=_fix_key(ws))
+                continue
+
+            # ====== 대시보드 구독 ======
+            elif kind == "subscribe_occupancy":
+                DASHBOARDS.add(ws)
+                _send(ws, json.dumps(OCCUPANCY.snapshot(), ensure_ascii=False), key="occupancy")
+                continue
+
+            elif kind == "unsubscribe_occupancy":
+                DASHBOARDS.discard(ws)
+                continue
+
+            # ====== 프로파일링 제어 ======
+            elif kind == "profile":
+                if not _profile_allowed(ws, msg):
+                    print("[Profile] 권한 없는 요청 무시")
+                    continue
+                action = msg.get("action", "status")
+                files = []
+                try:
+                    if action == "start":
+                        _profile_start(msg.get("mode", "sample"), msg.get("scope", "pipeline"),
+                                       msg.get("duration", PROFILE_DEFAULT_SEC))
+                    elif action == "stop":
+                        files = _profile_stop()
+                except (ValueError, TypeError) as e:
+                    print("[Profile] 요청 오류:", e)
+                _send(ws, json.dumps({"kind": "profile_state", **PROFILER.status(), "files": files,
+                                      "caches": _cache_stats()}, ensure_ascii=False), "high")
                 continue
 
             elif kind == "hazard":
@@ -393,12 +1131,12 @@ async def handle(ws):
                 except Exception:
                     print("[Hazard] node 파싱 오류:", node_payload)
                     continue
+                if floor not in FLOOR_TO_GRAPH_MAP:
+                    print("[Hazard] 실패: unknown floor", floor)
+                    continue
 
+                await JOURNAL.record({"op": "hazard", "floor": floor, "node": list(node), "active": active})
                 s = HAZARDS.setdefault(floor, set())
-                if active:
-                    s.add(node)
-                else:
-                    s.discard(node)
 
                 # 현재 상태를 모두에게 방송
                 state = {
@@ -406,31 +1144,88 @@ async def handle(ws):
                     "floor": floor,
                     "hazard_nodes": [list(n) for n in s],
                 }
-                await asyncio.gather(
-                    *[c.send(json.dumps(state, ensure_ascii=False)) for c in list(clients)],
-                    return_exceptions=True
-                )
+                _broadcast(clients, json.dumps(state, ensure_ascii=False), "high")
                 continue
 
             else:
                 continue
 
+            # ====== 적응형 트리거: 슬라이딩 윈도우, 불확도가 충분히 작아지면 바로 측위 ======
+            if TRIGGER_MODE == "adaptive":
+                prune_old(window, FIX_WINDOW_SEC)
+                if FIX_SCHEDULER == "tick":
+                    FIX_PENDING[ws] = {"window": window, "floor": last_floor}
+                    continue
+                now = time.time()
+                if now - last_fix_ts < FIX_MIN_INTERVAL:
+                    continue
+                with PROFILER.section():
+                    top3, unc = pick_top3_adaptive(window)
+                if top3 is not None:
+                    last_fix_ts = now
+                    _emit_with_top3(top3, last_floor, window, tag=f"~{unc:.2f}m", ws=ws)
+                continue
+
             # ====== "개수 트리거" 검사 ======
             prune_old(window, MAX_WINDOW_AGE)
             top3 = pick_top3_ready_by_count(window, COUNT_TRIGGER)
             if top3 is not None:
-                await _emit_with_top3(top3, last_floor, window)
+                _emit_with_top3(top3, last_floor, window, ws=ws)
                 # 다음 사이클 시작을 위해 윈도우 초기화
                 window.clear()
 
     finally:
+        OUTBOXES.pop(ws).stop()
+        # 새 연결이 이미 넘겨받았으면(resume) 보관하지 않음
+        if LIVE_SESSIONS.get(token, (None,))[0] is ws:
+            LIVE_SESSIONS.pop(token)
+            if window.size or ws in LAST_FIX:
+                _park_session(token, ws, window, last_floor, last_fix_ts)
         clients.discard(ws)
+        DETECTORS.discard(ws)
+        OCCUPANTS.pop(ws, None)
+        ROUTES.pop(ws, None)
+        FIX_PENDING.pop(ws, None)
+        LAST_FIX_TS.pop(ws, None)
+        DASHBOARDS.discard(ws)
+        OCCUPANCY.remove(ws)
+        LAST_FIX.pop(ws, None)
 
 # ====== 메인 ======
+def startup():
+    """시작 시 1회 초기화: 층별 그래프 파일 준비/검증 + 콜드 스타트 시간 출력"""
+    t_import = time.perf_counter() - _BOOT_T0
+    t0 = time.perf_counter()
+    status = init_files()
+    print(f"[Building] {BUILDING.name}: {BUILDING.path}, floors={list(FLOORS)}")
+    replayed = JOURNAL.recover()
+    STAIRS.rebuild(JOURNAL.graphs)
+    print(f"[Journal] 복원 완료: seq={JOURNAL.seq}, replayed={replayed}, "
+          f"blocked={ {f: len(s) for f, s in FIRE_BLOCKED_NODES.items()} }, "
+          f"hazards={ {f: len(s) for f, s in HAZARDS.items()} }")
+    print(f"[Startup] import {t_import*1000:.0f}ms, init {(time.perf_counter()-t0)*1000:.0f}ms, graphs={status}")
+    return status
+
 async def main():
-    print(f"WebSocket server listening on ws://{HOST}:{PORT}")
+    startup()
     async with websockets.serve(handle, HOST, PORT, ping_interval=20, ping_timeout=20):
-        await asyncio.Future()
+        print(f"WebSocket server listening on ws://{HOST}:{PORT} "
+              f"(cold start {(time.perf_counter()-_BOOT_T0)*1000:.0f}ms)")
+        monitor = asyncio.create_task(_load_monitor())
+        router = asyncio.create_task(_congestion_router())
+        ticker = asyncio.create_task(_fix_scheduler())
+        occupancy = asyncio.create_task(_occupancy_publisher())
+        _profile_from_env()
+        try:
+            await asyncio.Future()
+        finally:
+            monitor.cancel()
+            router.cancel()
+            ticker.cancel()
+            occupancy.cancel()
+            _profile_stop()
+            JOURNAL.close()
+            print(f"[Cache] {_cache_stats()}")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file